@@ -0,0 +1,485 @@
+#!/usr/bin/env python3
+"""
+Converter Benchmark / コンバーター性能測定
+==========================================
+Generates synthetic configs far larger than config/pages (hundreds of pages,
+full 4x8 grids) and times each phase of yaml-to-companion.py on them:
+load_all_pages, validate_all, build_connections, build_page and
+write_json_output, plus the peak traced memory of each phase.
+
+Buttons are sampled from the real page YAML in config/pages, so the mix of
+ProPresenter/OBS/ATEM/Yamaha actions and feedbacks matches this project;
+some are turned into multi-step buttons and most get unique labels so the
+control dedupe cache sees a realistic hit rate.
+
+Usage:
+    python3 scripts/benchmark-converter.py                      # 100 and 300 pages
+    python3 scripts/benchmark-converter.py --pages 50 500       # Custom scales
+    python3 scripts/benchmark-converter.py --save-baseline      # Record a new baseline
+    python3 scripts/benchmark-converter.py --threshold 0.1      # Flag >10% slowdowns
+    python3 scripts/benchmark-converter.py --keep /tmp/synth    # Keep generated configs
+    python3 scripts/benchmark-converter.py --serializers        # Compare output formats instead
+
+Results are compared against output/benchmark-baseline.json (if present);
+the script exits 1 when any phase regresses beyond the threshold. Baselines
+are machine-specific, so record one on the machine you compare on.
+
+--serializers instead writes the export for config/ and each synthetic size
+with every available --serializer backend and --compress method, and
+reports write time and file size for each (no baseline involved).
+
+Requirements:
+    PyYAML >= 6.0  (install with: pip install pyyaml)
+"""
+
+import argparse
+import copy
+import importlib.util
+import json
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import yaml
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+CONVERTER_PATH = SCRIPT_DIR / "yaml-to-companion.py"
+DEFAULT_BASELINE = PROJECT_ROOT / "output" / "benchmark-baseline.json"
+
+BENCHMARK_VERSION = 1
+PHASES = ["load_all_pages", "validate_all", "build_connections", "build_page", "write_json_output"]
+
+# Fraction of generated buttons made multi-step / given a unique label.
+MULTI_STEP_RATE = 0.15
+UNIQUE_LABEL_RATE = 0.7
+# Time deltas below this are treated as noise, whatever the percentage.
+NOISE_FLOOR_SECONDS = 0.005
+
+
+def load_converter():
+    """Import yaml-to-companion.py (its file name isn't a valid module name)."""
+    spec = importlib.util.spec_from_file_location("yaml_to_companion", CONVERTER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# =============================================================================
+# Synthetic config generation
+# =============================================================================
+
+def load_palette(conv, pages_dir):
+    """Collect every button from the real page files to sample from.
+
+    Pages are loaded through the converter, so buttons that use templates
+    (extends:) are sampled fully expanded.
+    """
+    palette = []
+    for _page_file, data in conv.load_all_pages(pages_dir):
+        palette.extend(b for b in (data or {}).get("buttons", []) if b.get("position"))
+    if not palette:
+        print(f"ERROR: No buttons found in {pages_dir}", file=sys.stderr)
+        sys.exit(1)
+    return palette
+
+
+def _retarget_set_page(actions, page_count, rng):
+    for action in actions or []:
+        if action.get("action") == "set_page":
+            action.setdefault("options", {})["page"] = rng.randint(1, page_count)
+
+
+def synthetic_button(palette, rng, page_num, row, col, page_count, grid_cols):
+    button = copy.deepcopy(rng.choice(palette))
+    button["position"] = [row, col]
+    button.pop("notes", None)
+    style = button.setdefault("style", {})
+    if rng.random() < UNIQUE_LABEL_RATE:
+        style["text_bottom"] = f"P{page_num} {row * grid_cols + col + 1}"
+
+    press = button.setdefault("actions", {}).setdefault("press", [])
+    _retarget_set_page(press, page_count, rng)
+    if button.get("step_count", 1) < 2 and press and rng.random() < MULTI_STEP_RATE:
+        second = copy.deepcopy(rng.choice(palette).get("actions", {}).get("press", []))
+        if second:
+            button["step_count"] = 2
+            button["step_2_timeout_ms"] = 3000
+            button["step_2_style"] = {"text_top": "CONFIRM?", "color_bg": "#CCCC00"}
+            button["step_2_actions"] = {"press": second}
+    _retarget_set_page(button.get("step_2_actions", {}).get("press"), page_count, rng)
+    return button
+
+
+def generate_config(conv, dest, source_config, page_count, grid_rows, grid_cols, seed=1):
+    """Write a synthetic config directory with page_count full pages.
+
+    connections.yaml, variables.yaml and parameters.yaml are copied from
+    source_config. Returns the number of buttons generated.
+    """
+    dest = Path(dest)
+    pages_dir = dest / "pages"
+    pages_dir.mkdir(parents=True, exist_ok=True)
+    for name in ("connections.yaml", "variables.yaml", "parameters.yaml"):
+        if (source_config / name).is_file():
+            shutil.copyfile(source_config / name, dest / name)
+
+    palette = load_palette(conv, source_config / "pages")
+    rng = random.Random(seed)
+    width = max(4, len(str(page_count)))
+    buttons = 0
+    for page_num in range(1, page_count + 1):
+        page = {
+            "page": {"number": page_num, "name": f"Synthetic {page_num}"},
+            "buttons": [
+                synthetic_button(palette, rng, page_num, row, col, page_count, grid_cols)
+                for row in range(grid_rows)
+                for col in range(grid_cols)
+            ],
+        }
+        buttons += len(page["buttons"])
+        with open(pages_dir / f"page{page_num:0{width}d}-synthetic.yaml", "w", encoding="utf-8") as f:
+            yaml.dump(page, f, Dumper=getattr(yaml, "CSafeDumper", yaml.SafeDumper),
+                      allow_unicode=True, sort_keys=False)
+    return buttons
+
+
+# =============================================================================
+# Phase timing
+# =============================================================================
+
+def run_phases(conv, config_dir, output_path, trace_memory=False):
+    """Run the converter phases once; return {phase: (seconds, peak_bytes)}."""
+    results = {}
+
+    def phase(name, fn):
+        if trace_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        value = fn()
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] - base if trace_memory else None
+        results[name] = (seconds, peak)
+        return value
+
+    connections = conv.load_yaml_file(config_dir / "connections.yaml").get("connections", [])
+    variables = conv.load_yaml_file(config_dir / "variables.yaml").get("custom_variables", [])
+    params = conv.load_parameters(config_dir / "parameters.yaml")
+
+    pages = phase("load_all_pages", lambda: conv.load_all_pages(config_dir / "pages"))
+    result = conv.ValidationResult()
+    phase("validate_all", lambda: conv.validate_all(pages, connections, variables, result))
+    if result.has_errors:
+        print(f"ERROR: Synthetic config failed validation: {result.errors[0]}", file=sys.stderr)
+        sys.exit(1)
+    instances, connection_map, connection_module_map = phase(
+        "build_connections", lambda: conv.build_connections(connections, params)
+    )
+
+    def build_pages():
+        built = {}
+        for _page_file, page_data in pages:
+            number = page_data["page"]["number"]
+            built[str(number)] = conv.build_page(page_data, connection_map, connection_module_map)
+        return built
+
+    built = phase("build_page", build_pages)
+    export = conv.build_full_export(built, instances, conv.build_custom_variables(variables))
+    phase("write_json_output", lambda: conv.write_json_output(export, str(output_path)))
+    return results
+
+
+def benchmark_scale(conv, config_dir, output_path, repeat):
+    """Median time per phase over `repeat` runs, plus one traced run for memory."""
+    timings = {name: [] for name in PHASES}
+    for _ in range(repeat):
+        for name, (seconds, _peak) in run_phases(conv, config_dir, output_path).items():
+            timings[name].append(seconds)
+
+    tracemalloc.start()
+    try:
+        traced = run_phases(conv, config_dir, output_path, trace_memory=True)
+        overall_peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    phases = {
+        name: {"seconds": statistics.median(timings[name]), "peak_bytes": traced[name][1]}
+        for name in PHASES
+    }
+    return {
+        "phases": phases,
+        "total_seconds": sum(p["seconds"] for p in phases.values()),
+        "peak_bytes": overall_peak,
+    }
+
+
+# =============================================================================
+# Serializer comparison (--serializers)
+# =============================================================================
+
+def build_export(conv, config_dir):
+    """Build the full export for config_dir without timing anything."""
+    connections = conv.load_yaml_file(config_dir / "connections.yaml").get("connections", [])
+    variables = conv.load_yaml_file(config_dir / "variables.yaml").get("custom_variables", [])
+    params = conv.load_parameters(config_dir / "parameters.yaml")
+    instances, connection_map, connection_module_map = conv.build_connections(connections, params)
+    built = {}
+    for _page_file, page_data in conv.load_all_pages(config_dir / "pages"):
+        number = page_data["page"]["number"]
+        built[str(number)] = conv.build_page(page_data, connection_map, connection_module_map)
+    return conv.build_full_export(built, instances, conv.build_custom_variables(variables))
+
+
+def _median_seconds(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def benchmark_serializers(conv, export, work_dir, repeat):
+    """Median write time and size per serializer, plain and compressed.
+
+    Compressed rows include the JSON write, since that is what --compress
+    adds to a run. Returns a list of row dicts.
+    """
+    work_dir.mkdir(parents=True, exist_ok=True)
+    rows = []
+    for name in conv.SERIALIZERS:
+        if conv.missing_backend(name):
+            rows.append({"serializer": name, "compress": None, "skipped": conv.missing_backend(name)})
+            continue
+        serializer = conv.get_serializer(name)
+        path = work_dir / f"{name}.companionconfig"
+
+        def write():
+            path.unlink(missing_ok=True)
+            conv.write_json_output(export, str(path), serializer)
+
+        write_seconds = _median_seconds(write, repeat)
+        rows.append({"serializer": name, "compress": None,
+                     "seconds": write_seconds, "bytes": path.stat().st_size})
+        for method in conv.COMPRESSION_SUFFIXES:
+            if conv.missing_backend(method):
+                rows.append({"serializer": name, "compress": method,
+                             "skipped": conv.missing_backend(method)})
+                continue
+
+            def compress():
+                conv.compressed_path(path, method).unlink(missing_ok=True)
+                conv.write_compressed_copy(path, method)
+
+            seconds = write_seconds + _median_seconds(compress, repeat)
+            rows.append({"serializer": name, "compress": method, "seconds": seconds,
+                         "bytes": conv.compressed_path(path, method).stat().st_size})
+    return rows
+
+
+def print_serializers(title, rows):
+    print(f"\n{title}")
+    print(f"  {'serializer':<10} {'compress':<9} {'write':>10} {'size':>10} {'vs pretty':>10}")
+    pretty = next(r["bytes"] for r in rows if r["serializer"] == "pretty" and not r["compress"])
+    for row in rows:
+        label = f"  {row['serializer']:<10} {row['compress'] or '-':<9}"
+        if "skipped" in row:
+            print(f"{label} skipped: {row['skipped']}")
+            continue
+        print(f"{label} {row['seconds'] * 1000:>7.1f} ms {row['bytes'] / 1024:>7.0f} KB"
+              f" {row['bytes'] / pretty:>9.0%}")
+
+
+def run_serializer_comparison(conv, source_config, work_root, page_counts, repeat, seed):
+    export = build_export(conv, source_config)
+    print_serializers(f"Output formats: {source_config} ({len(export['pages'])} pages)",
+                      benchmark_serializers(conv, export, work_root / "formats-config", repeat))
+    for page_count in page_counts:
+        config_dir = work_root / f"synthetic-{page_count}"
+        if config_dir.exists():
+            shutil.rmtree(config_dir)
+        buttons = generate_config(conv, config_dir, source_config, page_count,
+                                  conv.GRID_ROWS, conv.GRID_COLS, seed)
+        export = build_export(conv, config_dir)
+        print_serializers(f"Output formats: synthetic {page_count} pages, {buttons} buttons",
+                          benchmark_serializers(conv, export, config_dir / "formats", repeat))
+
+
+# =============================================================================
+# Baselines and reporting
+# =============================================================================
+
+def compare(current, baseline, threshold):
+    """Return {phase: (ratio, regressed)} for phases present in both results."""
+    changes = {}
+    for name, now in current["phases"].items():
+        before = baseline.get("phases", {}).get(name)
+        if not before or not before["seconds"]:
+            continue
+        ratio = now["seconds"] / before["seconds"]
+        regressed = (ratio > 1 + threshold
+                     and now["seconds"] - before["seconds"] > NOISE_FLOOR_SECONDS)
+        if before.get("peak_bytes") and now["peak_bytes"] > before["peak_bytes"] * (1 + threshold):
+            regressed = True
+        changes[name] = (ratio, regressed)
+    return changes
+
+
+def _mb(n):
+    return f"{n / (1024 * 1024):.1f} MB"
+
+
+def print_scale(scale, baseline, threshold):
+    print(f"\nSynthetic config: {scale['pages']} pages, {scale['buttons']} buttons (seed {scale['seed']})")
+    changes = compare(scale, baseline, threshold) if baseline else {}
+    print(f"  {'phase':<20} {'median':>10} {'peak mem':>10} {'baseline':>10} {'change':>8}")
+    for name in PHASES:
+        now = scale["phases"][name]
+        line = f"  {name:<20} {now['seconds'] * 1000:>7.1f} ms {_mb(now['peak_bytes']):>10}"
+        if name in changes:
+            ratio, regressed = changes[name]
+            before = baseline["phases"][name]["seconds"]
+            line += f" {before * 1000:>7.1f} ms {(ratio - 1) * 100:>+7.1f}%"
+            if regressed:
+                line += "  REGRESSION"
+        print(line)
+    print(f"  {'total':<20} {scale['total_seconds'] * 1000:>7.1f} ms {_mb(scale['peak_bytes']):>10}")
+    return [name for name, (_ratio, regressed) in changes.items() if regressed]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Benchmark yaml-to-companion.py on synthetic configs.\n"
+        "合成設定でyaml-to-companion.pyの性能を測定します。",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--pages",
+        type=int,
+        nargs="+",
+        default=[100, 300],
+        metavar="N",
+        help="Synthetic config sizes to benchmark, in pages (default: 100 300)",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Timed runs per size; the median is reported (default: 3)",
+    )
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for generation (default: 1)")
+    parser.add_argument(
+        "--config-dir",
+        default=str(PROJECT_ROOT / "config"),
+        help="Config to take connections, variables and button palette from",
+    )
+    parser.add_argument(
+        "--baseline",
+        default=str(DEFAULT_BASELINE),
+        help=f"Baseline results file (default: {DEFAULT_BASELINE.relative_to(PROJECT_ROOT)})",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Write these results to the baseline file instead of comparing",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Flag phases slower (or using more memory) than baseline by this fraction (default: 0.2)",
+    )
+    parser.add_argument(
+        "--serializers",
+        action="store_true",
+        help="Compare write time and size of every output serializer and compression method",
+    )
+    parser.add_argument(
+        "--keep",
+        default=None,
+        metavar="DIR",
+        help="Generate configs under DIR and keep them (default: temporary directory)",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    conv = load_converter()
+    source_config = Path(args.config_dir)
+
+    baseline = {}
+    baseline_path = Path(args.baseline)
+    if not args.save_baseline and baseline_path.is_file():
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("benchmark_version") != BENCHMARK_VERSION:
+            print(f"Ignoring baseline {baseline_path}: written by a different benchmark version")
+            baseline = {}
+
+    work_root = Path(args.keep) if args.keep else Path(tempfile.mkdtemp(prefix="companion-bench-"))
+    if args.serializers:
+        try:
+            run_serializer_comparison(conv, source_config, work_root, args.pages,
+                                      args.repeat, args.seed)
+        finally:
+            if not args.keep:
+                shutil.rmtree(work_root, ignore_errors=True)
+        return
+
+    results = {
+        "benchmark_version": BENCHMARK_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "yaml_loader": conv.YamlLoader.__name__,
+        "recorded": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scales": {},
+    }
+    regressions = []
+    try:
+        for page_count in args.pages:
+            config_dir = work_root / f"synthetic-{page_count}"
+            if config_dir.exists():
+                shutil.rmtree(config_dir)
+            buttons = generate_config(conv, config_dir, source_config, page_count,
+                                      conv.GRID_ROWS, conv.GRID_COLS, args.seed)
+            scale = benchmark_scale(conv, config_dir, config_dir / "out.companionconfig", args.repeat)
+            scale.update(pages=page_count, buttons=buttons, seed=args.seed)
+            results["scales"][str(page_count)] = scale
+
+            base_scale = baseline.get("scales", {}).get(str(page_count))
+            if base_scale and base_scale.get("seed") != args.seed:
+                base_scale = None
+            regressions += [f"{page_count} pages: {name}"
+                            for name in print_scale(scale, base_scale, args.threshold)]
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_root, ignore_errors=True)
+
+    print()
+    if args.save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {baseline_path} / ベースラインを保存しました。")
+    elif not baseline:
+        print(f"No baseline at {baseline_path}; run with --save-baseline to record one.")
+    elif regressions:
+        print(f"Performance regressions (>{args.threshold:.0%}) / 性能低下を検出:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    else:
+        print("No regressions against baseline. / ベースラインからの性能低下はありません。")
+
+
+if __name__ == "__main__":
+    main()
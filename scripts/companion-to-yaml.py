@@ -0,0 +1,728 @@
+#!/usr/bin/env python3
+"""
+Companion to YAML Importer / Companion→YAML 変換
+================================================
+Reverse of yaml-to-companion.py: turns a Companion export (.companionconfig,
+full or single-page) into page YAML files in this project's format, so a
+hand-built configuration from another site can be brought under the specs.
+
+The export is read incrementally, one page at a time, so a multi-megabyte
+export never has to be loaded as a whole. Actions and feedbacks are mapped
+back to their YAML names through the converter's own tables
+(MODULE_ACTION_MAP, MODULE_FEEDBACK_MAP, INTERNAL_ACTION_MAP, including the
+Yamaha MIXER:Current/... IDs and internal instance_status feedbacks). Every
+mapping is checked by resolving it forward again; anything that does not come
+back exactly is kept under its raw definitionId (and still converts to the
+same thing).
+
+Connection UUIDs are named after the matching entry in
+config/connections.yaml (same label, or the only connection with that
+module). Connections with no match are listed at the end, with the id the
+pages use for them, so they can be added to connections.yaml.
+
+Usage:
+    python3 scripts/companion-to-yaml.py site.companionconfig           # -> output/imported/pages/
+    python3 scripts/companion-to-yaml.py site.companionconfig --output-dir ../other-site
+    python3 scripts/companion-to-yaml.py page04.companionconfig --force # Overwrite existing files
+    python3 scripts/companion-to-yaml.py site.companionconfig --connections other/connections.yaml
+
+Re-converting the generated pages with the same connections gives back the
+same actions, feedbacks and styles. Button release actions, extra steps and
+non-button controls (page up/down, page number) have no YAML equivalent; they
+are skipped and reported.
+
+Requirements:
+    PyYAML >= 6.0  (install with: pip install pyyaml)
+"""
+
+import argparse
+import importlib.util
+import json
+import re
+import sys
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+CONVERTER_PATH = SCRIPT_DIR / "yaml-to-companion.py"
+DEFAULT_CONNECTIONS = PROJECT_ROOT / "config" / "connections.yaml"
+DEFAULT_OUTPUT_DIR = PROJECT_ROOT / "output" / "imported"
+
+# Characters read from the export at a time. A value that doesn't fit (a
+# large page) grows the buffer; consumed input is dropped as reading goes on.
+CHUNK_SIZE = 1 << 20
+
+# Yamaha RCP dynamic IDs, as generated by _yamaha_resolve_action/_feedback
+YAMAHA_FADER_ID = re.compile(r"MIXER:Current/([^/]+)/Fader/(On|Level)$")
+
+
+def load_converter():
+    """Import yaml-to-companion.py (its file name isn't a valid module name)."""
+    spec = importlib.util.spec_from_file_location("yaml_to_companion", CONVERTER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# =============================================================================
+# Incremental export reader
+# =============================================================================
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_DECODER = json.JSONDecoder()
+
+
+class ExportReader:
+    """Reads a Companion export one top-level member at a time.
+
+    Values are decoded with json's C decoder (raw_decode) from a buffer that
+    holds only the unread part of the file, and the full export's "pages"
+    member is produced page by page, so memory use follows the largest page
+    rather than the whole file.
+    """
+
+    def __init__(self, path, chunk_size=CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self._file = None
+        self._buf = ""
+        self._pos = 0
+        self._offset = 0  # characters dropped from the front of the buffer
+        self._eof = False
+
+    def _fill(self):
+        """Read more of the file into the buffer; False at end of file."""
+        if self._eof:
+            return False
+        if self._pos:
+            self._offset += self._pos
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        # Read at least as much as is buffered, so a value spanning many
+        # chunks is re-scanned a logarithmic number of times
+        chunk = self._file.read(max(self.chunk_size, len(self._buf)))
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf += chunk
+        return True
+
+    def _error(self, message):
+        return ValueError(f"{self.path}: {message} at character {self._offset + self._pos}")
+
+    def _peek(self):
+        """Skip whitespace and return the next character ("" at end of file)."""
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ""
+
+    def _expect(self, chars):
+        c = self._peek()
+        if not c or c not in chars:
+            raise self._error(f"expected {' or '.join(repr(x) for x in chars)}, found {c!r}")
+        self._pos += 1
+        return c
+
+    def _value(self):
+        """Decode the next complete JSON value."""
+        self._peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError as e:
+                if self._fill():
+                    continue
+                raise self._error(f"invalid JSON ({e.msg})") from None
+            # A number that ends exactly at the buffer end may continue
+            if end == len(self._buf) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def _pages(self):
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            yield key, self._value()
+            if self._expect(",}") == "}":
+                return
+
+    def members(self):
+        """Yield (key, value) for each top-level member of the export.
+
+        For "pages" the value is an iterator of (page number, page); whatever
+        the caller doesn't consume is skipped before the next member is read.
+        """
+        with open(self.path, "r", encoding="utf-8") as self._file:
+            self._buf, self._pos, self._offset, self._eof = "", 0, 0, False
+            self._expect("{")
+            if self._peek() == "}":
+                return
+            while True:
+                key = self._value()
+                self._expect(":")
+                if key == "pages" and self._peek() == "{":
+                    pages = self._pages()
+                    yield key, pages
+                    for _ in pages:
+                        pass
+                else:
+                    yield key, self._value()
+                if self._expect(",}") == "}":
+                    return
+
+
+def read_export(path, handle_page):
+    """Call handle_page(meta, number, page) for every page in the export.
+
+    meta holds the export's other top-level members (instances, type, ...).
+    Pages are converted while reading when the instances come first;
+    otherwise (Companion and this converter write them last) the first pass
+    only collects the small members and a second pass converts the pages.
+    Returns the number of passes made.
+    """
+    meta = {}
+    deferred = False
+    for key, value in ExportReader(path).members():
+        if key in ("pages", "page"):
+            if "instances" not in meta:
+                deferred = True
+                continue
+            _dispatch(meta, key, value, handle_page)
+        else:
+            meta[key] = value
+    if not deferred:
+        return 1
+    for key, value in ExportReader(path).members():
+        if key in ("pages", "page"):
+            _dispatch(meta, key, value, handle_page)
+    return 2
+
+
+def _dispatch(meta, key, value, handle_page):
+    if key == "pages":
+        for number, page in value:
+            handle_page(meta, number, page)
+    else:
+        handle_page(meta, meta.get("oldPageNumber", 1), value)
+
+
+# =============================================================================
+# Connections
+# =============================================================================
+
+def slugify(text, fallback):
+    slug = re.sub(r"[^a-z0-9]+", "-", str(text).lower()).strip("-")
+    return slug or fallback
+
+
+def name_connections(instances, yaml_connections):
+    """Give every exported connection a friendly id.
+
+    Returns ({uuid: friendly id}, [(friendly id, module, label) not found in
+    yaml_connections]).
+    """
+    by_label = {}
+    by_module = {}
+    for conn in yaml_connections:
+        if "id" not in conn:
+            continue
+        by_label.setdefault(str(conn.get("label", "")).lower(), conn["id"])
+        by_module.setdefault(conn.get("module", ""), []).append(conn["id"])
+
+    names = {}
+    unmatched = []
+    taken = set()
+    for conn_uuid, inst in instances.items():
+        module = inst.get("instance_type", "")
+        label = inst.get("label", "")
+        match = by_label.get(str(label).lower())
+        if match is None and len(by_module.get(module, ())) == 1:
+            match = by_module[module][0]
+        if match is not None and match not in taken:
+            names[conn_uuid] = match
+            taken.add(match)
+            continue
+        base = slugify(label, slugify(module, "connection")).replace("-", "_")
+        name, n = base, 2
+        while name in taken or name in by_label.values() or name == "internal":
+            name, n = f"{base}_{n}", n + 1
+        names[conn_uuid] = name
+        taken.add(name)
+        unmatched.append((name, module, label))
+    return names, unmatched
+
+
+# =============================================================================
+# Reverse mapping
+# =============================================================================
+
+def hex_color(value):
+    return f"#{value:06X}"
+
+
+def is_color(value):
+    return type(value) is int and 0 <= value <= 0xFFFFFF
+
+
+def split_text(text, keep_empty=False):
+    """Companion text -> {text_top, text_bottom} (split on the literal \\n)."""
+    top, sep, bottom = text.partition("\\n")
+    if sep and (keep_empty or (top and bottom)):
+        return {"text_top": top, "text_bottom": bottom}
+    return {"text_top": text}
+
+
+class ReverseMapper:
+    """Maps exported actions, feedbacks and buttons back to YAML.
+
+    Candidates come from inverting the converter's mapping tables; each is
+    resolved forward with the converter's EntityResolver and kept only if
+    it gives back the exported connectionId, definitionId and options.
+    """
+
+    def __init__(self, conv, instances, names):
+        self.conv = conv
+        self.names = names
+        self.connection_map = {"internal": "internal"}
+        self.module_map = {}
+        for conn_uuid, inst in instances.items():
+            self.connection_map[names[conn_uuid]] = conn_uuid
+            self.module_map[names[conn_uuid]] = inst.get("instance_type", "")
+        self.resolver = conv.EntityResolver(self.connection_map, self.module_map)
+        self.size_names = {v: k for k, v in conv.FONT_SIZE_MAP.items()}
+        self.raw_count = 0
+
+        # definitionId -> [(YAML name, option map, default options)]
+        self.internal_actions = {}
+        for name, def_id in conv.INTERNAL_ACTION_MAP.items():
+            inverse = {v: k for k, v in conv.INTERNAL_OPTION_MAP.get(name, {}).items()}
+            self.internal_actions.setdefault(def_id, []).append((name, inverse))
+        self.module_actions = {}
+        for module, actions in conv.MODULE_ACTION_MAP.items():
+            for name, action_def in actions.items():
+                if action_def["definitionId"] is not None:
+                    self.module_actions.setdefault((module, action_def["definitionId"]), []).append(
+                        (name, action_def.get("default_options", {})))
+        self.feedbacks = {}
+        for name, fb_mapping in conv.MODULE_FEEDBACK_MAP.items():
+            if fb_mapping.get("definitionId") is not None and not fb_mapping.get("redirect_to_internal"):
+                self.feedbacks.setdefault(fb_mapping["definitionId"], []).append(
+                    (name, fb_mapping.get("module")))
+
+    def connection_name(self, conn_id):
+        if conn_id == "internal":
+            return "internal"
+        return self.names.get(conn_id, conn_id)
+
+    # --- options ---
+
+    def _module_options(self, module, options):
+        """Undo the per-module option remaps (ATEM me/black, OBS scene_name)."""
+        inverse = {v: k for k, v in self.conv.MODULE_OPTION_MAP.get(module, {}).items()}
+        result = {}
+        for k, v in options.items():
+            if module == "bmd-atem" and k == "input" and type(v) is int and v == 0:
+                v = "black"
+            result[inverse.get(k, k)] = v
+        return result
+
+    @staticmethod
+    def _without_defaults(options, defaults):
+        return {k: v for k, v in options.items() if k not in defaults or defaults[k] != v}
+
+    @staticmethod
+    def _yamaha_channel(ch_type, options):
+        index = options.get("X", 0)
+        if type(index) is not int:
+            return None
+        if ch_type == "St" and index == 0:
+            return "stereo_out"
+        return f"{ch_type}/{index + 1:03d}"
+
+    # --- actions ---
+
+    def _action_candidates(self, conn, def_id, options):
+        if conn == "internal":
+            for name, inverse in self.internal_actions.get(def_id, ()):
+                opts = {inverse.get(k, k): v for k, v in options.items()}
+                if name in ("connection_enable", "connection_disable"):
+                    opts.pop("enable", None)
+                    if "connection_id" in opts:
+                        opts["connection_id"] = self.connection_name(opts["connection_id"])
+                yield name, opts
+            return
+
+        module = self.module_map.get(conn, "")
+        ranked = sorted(
+            self.module_actions.get((module, def_id), ()),
+            key=lambda c: -sum(options.get(k, object()) == v for k, v in c[1].items()),
+        )
+        for name, defaults in ranked:
+            yield name, self._module_options(module, self._without_defaults(options, defaults))
+            yield name, self._module_options(module, options)
+
+        match = YAMAHA_FADER_ID.match(def_id)
+        if module == "yamaha-rcp" and match:
+            ch_type, param = match.groups()
+            channel = self._yamaha_channel(ch_type, options)
+            if channel is not None:
+                rest = {k: v for k, v in options.items() if k not in ("X", "Val")}
+                value = options.get("Val")
+                if param == "On":
+                    if value == "Toggle":
+                        yield "mute_toggle", {"channel": channel, **rest}
+                    elif value in ("Off", "On"):
+                        yield "mute_channel", {"channel": channel, "mute": value == "Off", **rest}
+                elif "Val" in options:
+                    yield "fader_level", {"channel": channel, "level": value, **rest}
+                else:
+                    yield "fader_level", {"channel": channel, **rest}
+
+    def action(self, entity):
+        """Exported action -> YAML action dict."""
+        conn = self.connection_name(entity.get("connectionId", "internal"))
+        def_id = entity.get("definitionId", "")
+        options = entity.get("options") or {}
+        target = (entity.get("connectionId", "internal"), def_id, options)
+
+        fallback = None
+        for name, opts in self._action_candidates(conn, def_id, options):
+            resolved = self.resolver.action(self.conv.Action(conn, name, opts))
+            if resolved == target:
+                if list(resolved[2]) == list(options):
+                    return {"connection": conn, "action": name, "options": opts}
+                fallback = fallback or {"connection": conn, "action": name, "options": opts}
+        if fallback is None:
+            self.raw_count += 1
+            fallback = {"connection": conn, "action": def_id, "options": dict(options)}
+        return fallback
+
+    # --- feedbacks ---
+
+    def _feedback_candidates(self, conn, def_id, options):
+        if conn == "internal" and def_id == "instance_status" and "instance_id" in options:
+            yield self.connection_name(options["instance_id"]), "connection_status", {}
+            return
+        module = self.module_map.get(conn, "")
+        fb_inverse = {v: k for k, v in self.conv.FEEDBACK_OPTION_MAP.get(module, {}).items()}
+        for name, fb_module in self.feedbacks.get(def_id, ()):
+            if fb_module and fb_module != module:
+                continue
+            opts = {}
+            for k, v in options.items():
+                if module == "bmd-atem" and k == "input" and type(v) is int and v == 0:
+                    v = "black"
+                opts[fb_inverse.get(k, k)] = v
+            yield conn, name, opts
+        match = YAMAHA_FADER_ID.match(def_id)
+        if module == "yamaha-rcp" and match and match.group(2) == "On":
+            channel = self._yamaha_channel(match.group(1), options)
+            if channel is not None:
+                rest = {k: v for k, v in options.items() if k != "X"}
+                yield conn, "channel_muted", {"channel": channel, **rest}
+
+    def feedback_style(self, style, notes):
+        yaml_style = {}
+        for key, value in style.items():
+            if key == "bgcolor" and is_color(value):
+                yaml_style["color_bg"] = hex_color(value)
+            elif key == "color" and is_color(value):
+                yaml_style["color_text"] = hex_color(value)
+            elif key == "text" and isinstance(value, str):
+                yaml_style.update(split_text(value, keep_empty=True))
+            else:
+                notes.append(f"feedback style {key}={value!r} not imported")
+        return yaml_style
+
+    def feedback(self, entity, notes):
+        """Exported feedback -> YAML feedback dict."""
+        conn = self.connection_name(entity.get("connectionId", "internal"))
+        def_id = entity.get("definitionId", "")
+        options = entity.get("options") or {}
+        target = (entity.get("connectionId", "internal"), def_id, options)
+
+        chosen = None
+        for fb_conn, name, opts in self._feedback_candidates(conn, def_id, options):
+            resolved = self.resolver.feedback(self.conv.Feedback(fb_conn, name, opts))
+            if resolved == target:
+                candidate = (fb_conn, name, opts)
+                if list(resolved[2]) == list(options):
+                    chosen = candidate
+                    break
+                chosen = chosen or candidate
+        if chosen is None:
+            self.raw_count += 1
+            chosen = (conn, def_id, dict(options))
+
+        fb_conn, name, opts = chosen
+        yaml_feedback = {"connection": fb_conn, "feedback": name, "options": opts}
+        style = self.feedback_style(entity.get("style") or {}, notes)
+        if style:
+            key = "style_when_false" if entity.get("isInverted") else "style_when_true"
+            yaml_feedback[key] = style
+        elif entity.get("isInverted"):
+            notes.append(f"{name}: inverted feedback without a style not imported")
+        return yaml_feedback
+
+    # --- buttons ---
+
+    def button_style(self, style, notes):
+        text = style.get("text", "")
+        yaml_style = split_text(text if isinstance(text, str) else str(text))
+        size = style.get("size", 14)
+        if size in self.size_names:
+            yaml_style["font_size"] = self.size_names[size]
+        else:
+            yaml_style["font_size"] = "14pt"
+            notes.append(f"font size {size!r} not available, using 14pt")
+        for key, yaml_key, default in (("color", "color_text", 0xFFFFFF), ("bgcolor", "color_bg", 0)):
+            value = style.get(key, default)
+            yaml_style[yaml_key] = hex_color(value if is_color(value) else default)
+        return yaml_style
+
+    def step_actions(self, step, label, notes):
+        action_sets = step.get("action_sets") or {}
+        press = [self.action(a) for a in action_sets.get("down") or ()]
+        for set_name, actions in action_sets.items():
+            if set_name != "down" and actions:
+                notes.append(f"{label}: {len(actions)} '{set_name}' action(s) not imported")
+        return press
+
+    def button(self, control, position):
+        """Exported button control -> YAML button dict."""
+        notes = []
+        yaml_button = {"position": position, "style": self.button_style(control.get("style") or {}, notes)}
+        steps = list((control.get("steps") or {}).values())
+        yaml_button["actions"] = {
+            "press": self.step_actions(steps[0], "step 1", notes) if steps else [],
+        }
+        feedbacks = [self.feedback(f, notes) for f in control.get("feedbacks") or ()]
+        if feedbacks:
+            yaml_button["feedbacks"] = feedbacks
+        if len(steps) >= 2:
+            yaml_button["step_count"] = 2
+            yaml_button["step_2_actions"] = {"press": self.step_actions(steps[1], "step 2", notes)}
+            timeout = (control.get("options") or {}).get("stepAutoProgressTimeout")
+            yaml_button["step_2_timeout_ms"] = timeout if type(timeout) is int else 5000
+        if len(steps) > 2:
+            notes.append(f"steps 3-{len(steps)} not imported")
+        if notes:
+            yaml_button["notes"] = "Imported: " + "; ".join(notes)
+        return yaml_button
+
+    def page(self, number, page, warn):
+        """Exported page -> (page YAML data, button count)."""
+        buttons = []
+        for row, cols in (page.get("controls") or {}).items():
+            for col, control in (cols or {}).items():
+                where = f"page {number} [{row}, {col}]"
+                try:
+                    position = [int(row), int(col)]
+                except ValueError:
+                    warn(f"{where}: bad position, skipped")
+                    continue
+                if not (0 <= position[0] < self.conv.GRID_ROWS and 0 <= position[1] < self.conv.GRID_COLS):
+                    warn(f"{where}: outside the {self.conv.GRID_ROWS}x{self.conv.GRID_COLS} grid, skipped")
+                    continue
+                if control.get("type") != "button":
+                    warn(f"{where}: '{control.get('type')}' control has no YAML equivalent, skipped")
+                    continue
+                buttons.append(self.button(control, position))
+        meta = {"number": number, "name": page.get("name") or f"Page {number}"}
+        return {"page": meta, "buttons": buttons}, len(buttons)
+
+
+# =============================================================================
+# YAML output
+# =============================================================================
+
+# Page files are written by a small block-style writer rather than yaml.dump:
+# PyYAML's emitter is pure Python (libyaml's can't indent lists the way the
+# hand-written pages do) and dominated import time on large exports. Strings
+# are written as JSON strings, which are valid double-quoted YAML scalars.
+
+_PLAIN_KEY = re.compile(r"[A-Za-z_][A-Za-z0-9_-]*")
+_RESERVED_KEYS = {"yes", "no", "on", "off", "true", "false", "null"}
+
+
+def _key(key):
+    if isinstance(key, str) and _PLAIN_KEY.fullmatch(key) and key.lower() not in _RESERVED_KEYS:
+        return key
+    return _scalar(key if isinstance(key, str) else str(key))
+
+
+def _scalar(value):
+    if value is None:
+        return "null"
+    if value is True or value is False:
+        return "true" if value else "false"
+    if isinstance(value, float):
+        if value != value:
+            return ".nan"
+        if value in (float("inf"), float("-inf")):
+            return "-.inf" if value < 0 else ".inf"
+        text = repr(value)
+        # YAML 1.1 floats need a dot: 1e-05 would load as a string
+        return text if "." in text or "e" not in text else text.replace("e", ".0e")
+    if isinstance(value, int):
+        return str(value)
+    return json.dumps(str(value), ensure_ascii=False)
+
+
+def _emit(value, indent, lines):
+    """Append the lines for value (a dict or list) at the given indent."""
+    pad = " " * indent
+    if isinstance(value, dict):
+        items = list(value.items())
+    else:
+        items = [(None, v) for v in value]
+    for i, (k, v) in enumerate(items):
+        if isinstance(value, dict):
+            head = f"{pad}{_key(k)}:"
+        else:
+            head = f"{pad}-"
+        if isinstance(v, (dict, list)) and v and not (k == "position" and isinstance(v, list)):
+            if isinstance(value, list) and isinstance(v, dict):
+                # "- first: ..." with the other keys lined up under it
+                sub = []
+                _emit(v, indent + 2, sub)
+                lines.append(f"{head} {sub[0].lstrip()}")
+                lines.extend(sub[1:])
+            else:
+                lines.append(head)
+                _emit(v, indent + 2, lines)
+        elif isinstance(v, dict):
+            lines.append(f"{head} {{}}")
+        elif isinstance(v, list):
+            lines.append(f"{head} [{', '.join(_scalar(x) for x in v)}]")
+        else:
+            lines.append(f"{head} {_scalar(v)}")
+
+
+def dump_yaml(value, indent=0):
+    lines = []
+    _emit(value, indent, lines)
+    return "\n".join(lines) + "\n"
+
+
+def page_filename(number, name):
+    return f"page{number:02d}-{slugify(name, 'imported')}.yaml"
+
+
+def write_page_yaml(path, page_data, source):
+    """Write one page file: header, page: block, then one button at a time."""
+    meta = page_data["page"]
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"# Page {meta['number']}: {meta['name']}\n")
+        f.write(f"# Imported from {source} by scripts/companion-to-yaml.py\n\n")
+        f.write(dump_yaml({"page": meta}))
+        f.write("\nbuttons:\n")
+        for button in page_data["buttons"]:
+            f.write("\n")
+            f.write(dump_yaml([button], indent=2))
+
+
+# =============================================================================
+# CLI
+# =============================================================================
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Convert a Companion export (.companionconfig) back to page YAML.\n"
+        "Companionのエクスポートをページ YAML に変換します。",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "export",
+        help="Full or single-page Companion export (.companionconfig)",
+    )
+    parser.add_argument(
+        "--output-dir",
+        default=str(DEFAULT_OUTPUT_DIR),
+        help="Directory for the pages/ folder (default: output/imported)",
+    )
+    parser.add_argument(
+        "--connections",
+        default=str(DEFAULT_CONNECTIONS),
+        help="connections.yaml used to name connections (default: config/connections.yaml)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Overwrite existing page files",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    conv = load_converter()
+
+    yaml_connections = []
+    if Path(args.connections).is_file():
+        yaml_connections = (conv.load_yaml_file(args.connections) or {}).get("connections", []) or []
+    else:
+        print(f"WARNING: {args.connections} not found; connections are named after their labels")
+
+    pages_dir = Path(args.output_dir) / "pages"
+    pages_dir.mkdir(parents=True, exist_ok=True)
+    source = Path(args.export).name
+    state = {"mapper": None, "unmatched": [], "pages": 0, "buttons": 0, "warnings": 0, "skipped": 0}
+
+    def warn(message):
+        state["warnings"] += 1
+        print(f"  [WARN]  {message}")
+
+    def handle_page(meta, number, page):
+        if state["mapper"] is None:
+            instances = meta.get("instances") or {}
+            names, state["unmatched"] = name_connections(instances, yaml_connections)
+            state["mapper"] = ReverseMapper(conv, instances, names)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            warn(f"page key {number!r} is not a number, skipped")
+            return
+        page_data, count = state["mapper"].page(number, page, warn)
+        path = pages_dir / page_filename(number, page_data["page"]["name"])
+        if path.exists() and not args.force:
+            warn(f"{path} exists, not overwritten (use --force)")
+            state["skipped"] += 1
+            return
+        write_page_yaml(path, page_data, source)
+        state["pages"] += 1
+        state["buttons"] += count
+        print(f"  {path.name}: {count} button(s)")
+
+    print(f"Reading {args.export} / 読み込み中")
+    try:
+        passes = read_export(args.export, handle_page)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"\n{state['pages']} page(s), {state['buttons']} button(s) written to {pages_dir} "
+          f"({passes} pass{'es' if passes > 1 else ''} over the export)")
+    mapper = state["mapper"]
+    if mapper is not None and mapper.raw_count:
+        print(f"  {mapper.raw_count} action(s)/feedback(s) kept under their Companion definitionId")
+    if state["unmatched"]:
+        print("\nConnections not in connections.yaml / connections.yaml にない接続:")
+        for name, module, label in state["unmatched"]:
+            print(f"  - id: {name}   module: {module}   label: {label}")
+        print("Add them to connections.yaml before converting the imported pages.")
+    if state["warnings"]:
+        print(f"\n{state['warnings']} warning(s) / 警告")
+    sys.exit(1 if state["skipped"] else 0)
+
+
+if __name__ == "__main__":
+    main()
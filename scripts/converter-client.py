@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Converter Client / コンバータークライアント
+=========================================
+Thin client for the converter service (yaml-to-companion.py --serve). The
+service keeps the mapping tables, parsed YAML and built pages in memory, so
+validating or rebuilding after an edit takes milliseconds instead of a full
+converter start-up. Handy for editor save hooks and pre-commit checks.
+
+Start the service once, then send requests:
+    python3 scripts/yaml-to-companion.py --serve &
+
+Usage:
+    python3 scripts/converter-client.py validate              # Check the YAML specs
+    python3 scripts/converter-client.py validate --strict     # Warnings count as failures
+    python3 scripts/converter-client.py build                 # Regenerate the output file
+    python3 scripts/converter-client.py build-page 4          # Print page 4 as built (JSON)
+    python3 scripts/converter-client.py status                # Service uptime and caches
+    python3 scripts/converter-client.py shutdown              # Stop the service
+    python3 scripts/converter-client.py --json validate       # Raw JSON response
+    python3 scripts/converter-client.py --fallback validate   # Run the converter if no service
+
+Exit status is 0 on success, 1 if the request failed (e.g. validation
+errors) and 2 if no service is listening on the socket.
+
+Requirements:
+    None (standard library only)
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+CONVERTER_PATH = SCRIPT_DIR / "yaml-to-companion.py"
+# Matches the converter's default: <output dir>/.companion-cache/converter.sock
+DEFAULT_SOCKET = PROJECT_ROOT / "output" / ".companion-cache" / "converter.sock"
+RESPONSE_LIMIT = 64 * 1024 * 1024
+
+
+def send_request(socket_path, request, timeout):
+    """Send one request and return the decoded response."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as reader:
+            line = reader.readline(RESPONSE_LIMIT)
+    if not line:
+        raise ConnectionError("the service closed the connection without a response")
+    return json.loads(line)
+
+
+def print_messages(response, out=sys.stdout):
+    for e in response.get("errors", []):
+        print(f"  [ERROR] {e}", file=out)
+    for w in response.get("warnings", []):
+        print(f"  [WARN]  {w}", file=out)
+
+
+def print_response(command, response):
+    """Human-readable output for each command."""
+    ms = response.get("seconds", 0) * 1000
+    if response.get("error"):
+        print(f"ERROR: {response['error']}", file=sys.stderr)
+        if response.get("log"):
+            print(response["log"], file=sys.stderr)
+        return
+
+    if command == "validate":
+        print_messages(response)
+        print(f"{len(response['errors'])} error(s), {len(response['warnings'])} warning(s) "
+              f"in {response['pages']} page(s) ({ms:.1f} ms)")
+        print("VALID / 検証OK" if response["ok"] else "INVALID / 検証エラー")
+    elif command == "build":
+        print_messages(response)
+        if not response["written"]:
+            print(f"Output not written (fix the errors above) / 出力なし ({ms:.1f} ms)")
+        else:
+            outcome = "updated / 更新" if response["changed"] else "unchanged / 変更なし"
+            print(f"{response['output']}: {outcome}")
+            print(f"  {response['buttons']} button(s) on {response['pages']} page(s); "
+                  f"{response['rebuilt']} rebuilt, {response['reused']} cached ({ms:.1f} ms)")
+    elif command == "build-page":
+        # The page JSON goes to stdout so it can be redirected; messages to stderr
+        print_messages(response, out=sys.stderr)
+        if response["page"] is not None:
+            print(json.dumps(response["page"], indent=2, ensure_ascii=False))
+        print(f"Page {response['number']} ({response['file']}, {response['source']}, "
+              f"{ms:.1f} ms)", file=sys.stderr)
+    elif command == "status":
+        for key in ("pid", "uptime_seconds", "requests", "config_dir", "output",
+                    "cached_pages", "cached_documents"):
+            print(f"  {key}: {response.get(key)}")
+    elif command == "shutdown":
+        print("Converter service stopped. / コンバーターサービスを終了しました。")
+
+
+def run_converter(args):
+    """--fallback: run the converter directly when no service is running."""
+    argv = [sys.executable, str(CONVERTER_PATH)]
+    if args.command == "validate":
+        argv.append("--validate-only")
+    if args.strict:
+        argv.append("--strict")
+    os.execv(sys.executable, argv)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Send a request to the converter service (yaml-to-companion.py --serve).\n"
+        "コンバーターサービスにリクエストを送信します。",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "command",
+        choices=["validate", "build", "build-page", "status", "shutdown"],
+        help="Request to send",
+    )
+    parser.add_argument(
+        "page",
+        nargs="?",
+        type=int,
+        help="Page number (build-page only)",
+    )
+    parser.add_argument(
+        "--socket",
+        default=str(DEFAULT_SOCKET),
+        help="Service socket path (default: output/.companion-cache/converter.sock)",
+    )
+    parser.add_argument(
+        "--strict",
+        action="store_true",
+        help="validate/build: treat warnings as errors",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print the raw JSON response",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60.0,
+        help="Seconds to wait for a response (default: 60)",
+    )
+    parser.add_argument(
+        "--fallback",
+        action="store_true",
+        help="validate/build: run yaml-to-companion.py directly if no service is running",
+    )
+    args = parser.parse_args()
+    if (args.command == "build-page") != (args.page is not None):
+        parser.error("a page number is required for build-page (and only for build-page)")
+    return args
+
+
+def main():
+    args = parse_args()
+    request = {"command": args.command}
+    if args.page is not None:
+        request["page"] = args.page
+    if args.strict:
+        request["strict"] = True
+
+    try:
+        response = send_request(args.socket, request, args.timeout)
+    except (FileNotFoundError, ConnectionRefusedError):
+        if args.fallback and args.command in ("validate", "build"):
+            run_converter(args)
+        print(f"ERROR: No converter service on {args.socket}", file=sys.stderr)
+        print("  Start one with: python3 scripts/yaml-to-companion.py --serve", file=sys.stderr)
+        print("  サービスが起動していません。", file=sys.stderr)
+        sys.exit(2)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(response, indent=2, ensure_ascii=False))
+    else:
+        print_response(args.command, response)
+    sys.exit(0 if response.get("ok") else 1)
+
+
+if __name__ == "__main__":
+    main()
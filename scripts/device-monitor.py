@@ -0,0 +1,584 @@
+#!/usr/bin/env python3
+"""
+Device Health Monitor / デバイス監視
+====================================
+Long-running monitor for the devices in config/parameters.yaml. Where
+device-probe.py answers "is it up right now?", this keeps one persistent
+session open to each device for the whole service and measures
+application-level round trips on a schedule, so flapping links and slow
+devices show up while they happen.
+
+Per device:
+    Yamaha TF (RCP, TCP 49280)      "devinfo productname" request/reply
+    OBS Studio (WebSocket 4455)     obs-websocket v5 GetVersion request
+    ProPresenter API (HTTP)         GET /version on a keep-alive connection
+    ATEM (UDP 9910)                 ack-requested keepalive in an ATEM session
+    anything else with a port       TCP connect time
+
+The last --window round trips per device are kept in a ring buffer, and
+p50/p95/p99, up/down state and failure counters are served in the
+Prometheus text format at http://127.0.0.1:9105/metrics. Up/down changes
+are logged to stdout.
+
+Usage:
+    python3 scripts/device-monitor.py                        # Monitor everything
+    python3 scripts/device-monitor.py --interval 5           # Sample every 5 seconds
+    python3 scripts/device-monitor.py --listen 0.0.0.0:9105  # Serve metrics on the LAN
+
+Requirements:
+    PyYAML >= 6.0  (install with: pip install pyyaml)
+"""
+
+import argparse
+import asyncio
+import base64
+import collections
+import hashlib
+import importlib.util
+import json
+import math
+import os
+import random
+import struct
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+
+QUANTILES = (0.5, 0.95, 0.99)
+MAX_BACKOFF_SECONDS = 30.0
+
+
+def load_script(file_name, module_name):
+    """Import a sibling script whose file name isn't a valid module name."""
+    spec = importlib.util.spec_from_file_location(module_name, SCRIPT_DIR / file_name)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# =============================================================================
+# Latency window
+# =============================================================================
+
+class LatencyWindow:
+    """Bounded ring buffer of round-trip times plus cumulative counters."""
+
+    def __init__(self, size):
+        self.samples = collections.deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+        self.failures = 0
+        self.connects = 0
+        self.up = False
+        self.last_error = ""
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q):
+        """Nearest-rank quantile of the window, or None if empty."""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+# =============================================================================
+# Device sessions
+# =============================================================================
+# Each session keeps its connection open between samples. connect() opens
+# (or re-opens) it, ping() does one application-level round trip, close()
+# drops it. Any exception from connect()/ping() marks the device down.
+
+class TcpConnectSession:
+    """Fallback: time a fresh TCP connect (no application protocol)."""
+
+    def __init__(self, target):
+        self.host = target["ip"]
+        self.port = target["port"]
+
+    async def connect(self):
+        pass
+
+    async def ping(self):
+        _reader, writer = await asyncio.open_connection(self.host, self.port)
+        writer.close()
+
+    def close(self):
+        pass
+
+
+class _StreamSession:
+    def __init__(self, target):
+        self.host = target["ip"]
+        self.port = target["port"]
+        self.config = target.get("config", {})
+        self.reader = None
+        self.writer = None
+
+    async def _open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+class RcpSession(_StreamSession):
+    """Yamaha Remote Control Protocol: newline-terminated text commands."""
+
+    async def connect(self):
+        await self._open()
+
+    async def ping(self):
+        self.writer.write(b"devinfo productname\n")
+        await self.writer.drain()
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                raise ConnectionError("connection closed by mixer")
+            # The mixer also pushes NOTIFY lines for parameter changes
+            if not line.startswith(b"NOTIFY"):
+                if line.startswith(b"ERROR"):
+                    raise ConnectionError(line.decode("utf-8", "replace").strip())
+                return
+
+
+class HttpSession(_StreamSession):
+    """ProPresenter HTTP API: GET /version over one keep-alive connection."""
+
+    path = "/version"
+
+    async def connect(self):
+        await self._open()
+
+    async def ping(self):
+        request = (
+            f"GET {self.path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        )
+        self.writer.write(request.encode("ascii"))
+        await self.writer.drain()
+        status = await self.reader.readline()
+        if not status:
+            raise ConnectionError("connection closed by server")
+        parts = status.split()
+        if len(parts) < 2 or not parts[1].startswith(b"2"):
+            raise ConnectionError(f"HTTP {status.decode('latin-1').strip()}")
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            await self.reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+            await self.connect()
+
+
+class ObsSession(_StreamSession):
+    """obs-websocket v5 over a minimal RFC 6455 client (text frames only)."""
+
+    async def connect(self):
+        await self._open()
+        key = base64.b64encode(os.urandom(16)).decode("ascii")
+        self.writer.write((
+            f"GET / HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+            "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n"
+            "Sec-WebSocket-Protocol: obswebsocket.json\r\n\r\n"
+        ).encode("ascii"))
+        await self.writer.drain()
+        status = await self.reader.readline()
+        if b" 101 " not in status:
+            raise ConnectionError(f"WebSocket upgrade refused: {status.decode('latin-1').strip()}")
+        while (await self.reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+
+        hello = await self._recv_json()
+        identify = {"rpcVersion": 1, "eventSubscriptions": 0}
+        auth = hello.get("d", {}).get("authentication")
+        if auth:
+            password = str(self.config.get("pass", ""))
+            secret = base64.b64encode(
+                hashlib.sha256((password + auth["salt"]).encode("utf-8")).digest()
+            )
+            identify["authentication"] = base64.b64encode(
+                hashlib.sha256(secret + auth["challenge"].encode("utf-8")).digest()
+            ).decode("ascii")
+        await self._send_json({"op": 1, "d": identify})
+        identified = await self._recv_json()
+        if identified.get("op") != 2:
+            raise ConnectionError("OBS did not accept identify (wrong password?)")
+        self._request_id = 0
+
+    async def ping(self):
+        self._request_id += 1
+        request_id = str(self._request_id)
+        await self._send_json({"op": 6, "d": {"requestType": "GetVersion", "requestId": request_id}})
+        while True:
+            message = await self._recv_json()
+            if message.get("op") == 7 and message.get("d", {}).get("requestId") == request_id:
+                return
+
+    async def _send_json(self, data):
+        payload = json.dumps(data).encode("utf-8")
+        mask = os.urandom(4)
+        if len(payload) < 126:
+            header = struct.pack("!BB", 0x81, 0x80 | len(payload))
+        elif len(payload) < 1 << 16:
+            header = struct.pack("!BBH", 0x81, 0x80 | 126, len(payload))
+        else:
+            header = struct.pack("!BBQ", 0x81, 0x80 | 127, len(payload))
+        masked = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        self.writer.write(header + mask + masked)
+        await self.writer.drain()
+
+    async def _recv_json(self):
+        message = b""
+        while True:
+            b0, b1 = await self.reader.readexactly(2)
+            length = b1 & 0x7F
+            if length == 126:
+                (length,) = struct.unpack("!H", await self.reader.readexactly(2))
+            elif length == 127:
+                (length,) = struct.unpack("!Q", await self.reader.readexactly(8))
+            mask = await self.reader.readexactly(4) if b1 & 0x80 else None
+            payload = await self.reader.readexactly(length)
+            if mask:
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+            opcode = b0 & 0x0F
+            if opcode == 0x8:
+                raise ConnectionError("WebSocket closed by OBS")
+            if opcode == 0x9:  # ping -> pong
+                self.writer.write(struct.pack("!BB", 0x8A, 0x80 | len(payload)) + b"\0" * 4 + payload)
+                continue
+            if opcode in (0x0, 0x1, 0x2):
+                message += payload
+                if b0 & 0x80:
+                    return json.loads(message)
+
+
+class AtemSession(asyncio.DatagramProtocol):
+    """Minimal ATEM UDP session: handshake, ack the switcher's packets, and
+    measure round trips with empty ack-requested packets (the protocol's own
+    keepalive). Holds one of the switcher's client slots while running."""
+
+    ACK_REQUEST = 0x01
+    HELLO = 0x02
+    ACK = 0x10
+    HELLO_PACKET = bytes([
+        0x10, 0x14, 0x53, 0xAB, 0x00, 0x00, 0x00, 0x00, 0x00, 0x3A,
+        0x00, 0x00, 0x01, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+    ])
+
+    def __init__(self, target):
+        self.host = target["ip"]
+        self.port = target["port"]
+        self.transport = None
+        self.session_id = 0
+        self.local_id = 0
+        self.hello = None
+        self.pending = {}
+
+    @staticmethod
+    def _header(flags, session_id, ack_id=0, packet_id=0, length=12):
+        return struct.pack("!HHH4xH", (flags << 11) | length, session_id, ack_id, packet_id)
+
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        self.hello = loop.create_future()
+        self.pending = {}
+        self.local_id = 0
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: self, remote_addr=(self.host, self.port)
+        )
+        session_id = random.randint(1, 0x7FFF)
+        self.session_id = session_id
+        self.transport.sendto(self.HELLO_PACKET[:2] + struct.pack("!H", session_id) + self.HELLO_PACKET[4:])
+        reply = await self.hello
+        if len(reply) > 12 and reply[12] != 0x02:
+            raise ConnectionError("ATEM refused the session (no free client slots?)")
+        self.transport.sendto(self._header(self.ACK, self.session_id))
+
+    def datagram_received(self, data, addr):
+        if len(data) < 12:
+            return
+        word, session_id, ack_id, packet_id = struct.unpack_from("!HHH4xH", data)
+        flags = word >> 11
+        if flags & self.HELLO:
+            if self.hello and not self.hello.done():
+                self.hello.set_result(data)
+            return
+        # After the handshake the switcher assigns the session id to use
+        self.session_id = session_id
+        if flags & self.ACK_REQUEST:
+            self.transport.sendto(self._header(self.ACK, session_id, ack_id=packet_id))
+        if flags & self.ACK:
+            future = self.pending.pop(ack_id, None)
+            if future and not future.done():
+                future.set_result(None)
+
+    def error_received(self, exc):
+        for future in [self.hello, *self.pending.values()]:
+            if future and not future.done():
+                future.set_exception(exc)
+
+    async def ping(self):
+        self.local_id = (self.local_id + 1) & 0x7FFF
+        future = asyncio.get_running_loop().create_future()
+        self.pending[self.local_id] = future
+        self.transport.sendto(self._header(self.ACK_REQUEST, self.session_id, packet_id=self.local_id))
+        try:
+            await future
+        finally:
+            self.pending.pop(self.local_id, None)
+
+    def close(self):
+        if self.transport:
+            self.transport.close()
+            self.transport = None
+
+
+SESSION_TYPES = {
+    "yamaha-rcp": RcpSession,
+    "obs-studio": ObsSession,
+    "renewedvision-propresenter-api": HttpSession,
+    "bmd-atem": AtemSession,
+}
+
+
+# =============================================================================
+# Monitor loop
+# =============================================================================
+
+def _log(message):
+    print(f"[{time.strftime('%H:%M:%S')}] {message}", flush=True)
+
+
+def describe_error(exc):
+    """Short operator-facing reason for a failed probe."""
+    if isinstance(exc, asyncio.TimeoutError):
+        return "timed out"
+    if isinstance(exc, ConnectionRefusedError):
+        return "connection refused"
+    if isinstance(exc, asyncio.IncompleteReadError):
+        return "connection closed by device"
+    if isinstance(exc, OSError) and exc.strerror:
+        return exc.strerror
+    return str(exc) or type(exc).__name__
+
+
+async def monitor_device(target, window, interval, timeout):
+    """Sample one device forever, reconnecting with backoff when it drops."""
+    session = SESSION_TYPES.get(target["module"], TcpConnectSession)(target)
+    connected = False
+    backoff = interval
+    while True:
+        started = time.monotonic()
+        try:
+            if not connected:
+                await asyncio.wait_for(session.connect(), timeout)
+                connected = True
+                window.connects += 1
+            t0 = time.perf_counter()
+            await asyncio.wait_for(session.ping(), timeout)
+            rtt = time.perf_counter() - t0
+        except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                ValueError) as e:
+            session.close()
+            connected = False
+            window.failures += 1
+            error = describe_error(e)
+            if window.up or not window.last_error:
+                _log(f"{target['conn_id']} DOWN / 切断 - {target['ip']}:{target['port']} ({error})")
+            window.up = False
+            window.last_error = error
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+            continue
+
+        window.record(rtt)
+        if not window.up:
+            _log(f"{target['conn_id']} UP / 接続 - {target['ip']}:{target['port']} (rtt {rtt * 1000:.1f} ms)")
+        window.up = True
+        window.last_error = ""
+        backoff = interval
+        await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+# =============================================================================
+# Metrics endpoint
+# =============================================================================
+
+def _labels(target):
+    return f'connection="{target["conn_id"]}",module="{target["module"]}",address="{target["ip"]}:{target["port"]}"'
+
+
+def render_metrics(monitored):
+    """Prometheus text exposition (format 0.0.4) for all monitored devices."""
+    lines = [
+        "# HELP church_device_up Whether the device answered its last probe.",
+        "# TYPE church_device_up gauge",
+    ]
+    lines += [f"church_device_up{{{_labels(t)}}} {int(w.up)}" for t, w in monitored]
+    lines += [
+        "# HELP church_device_rtt_seconds Application-level round trip, over the sample window.",
+        "# TYPE church_device_rtt_seconds summary",
+    ]
+    for target, window in monitored:
+        for q in QUANTILES:
+            value = window.quantile(q)
+            if value is not None:
+                lines.append(f'church_device_rtt_seconds{{{_labels(target)},quantile="{q}"}} {value:.6f}')
+        lines.append(f"church_device_rtt_seconds_sum{{{_labels(target)}}} {window.total:.6f}")
+        lines.append(f"church_device_rtt_seconds_count{{{_labels(target)}}} {window.count}")
+    lines += [
+        "# HELP church_device_probe_failures_total Probes that failed or timed out.",
+        "# TYPE church_device_probe_failures_total counter",
+    ]
+    lines += [f"church_device_probe_failures_total{{{_labels(t)}}} {w.failures}" for t, w in monitored]
+    lines += [
+        "# HELP church_device_connects_total Sessions opened (first connect plus reconnects).",
+        "# TYPE church_device_connects_total counter",
+    ]
+    lines += [f"church_device_connects_total{{{_labels(t)}}} {w.connects}" for t, w in monitored]
+    return "\n".join(lines) + "\n"
+
+
+def render_status(monitored):
+    """Human-readable status page / 状態ページ."""
+    lines = ["Device Health / デバイス状態", ""]
+    for target, window in monitored:
+        state = "UP / 接続" if window.up else f"DOWN / 切断 ({window.last_error or 'waiting'})"
+        stats = "  ".join(
+            f"p{int(q * 100)} {window.quantile(q) * 1000:.1f} ms"
+            for q in QUANTILES if window.quantile(q) is not None
+        )
+        lines.append(f"{target['conn_id']:<14} {target['ip']}:{target['port']:<6} {state}  {stats}")
+    return "\n".join(lines) + "\n"
+
+
+async def serve_metrics(monitored, host, port):
+    async def handle(reader, writer):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request.decode("latin-1").split()
+            path = parts[1] if len(parts) > 1 else "/"
+            if path == "/metrics":
+                status, body, ctype = "200 OK", render_metrics(monitored), "text/plain; version=0.0.4"
+            elif path == "/":
+                status, body, ctype = "200 OK", render_status(monitored), "text/plain; charset=utf-8"
+            else:
+                status, body, ctype = "404 Not Found", "not found\n", "text/plain"
+            data = body.encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {ctype}\r\nContent-Length: {len(data)}\r\n"
+                "Connection: close\r\n\r\n".encode("ascii") + data
+            )
+            await writer.drain()
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+async def run(targets, args):
+    monitored = [(t, LatencyWindow(args.window)) for t in targets]
+    host, _, port = args.listen.rpartition(":")
+    server = await serve_metrics(monitored, host or "127.0.0.1", int(port))
+    _log(f"Monitoring {len(targets)} device(s); metrics at http://{args.listen}/metrics")
+    _log(f"{len(targets)}台のデバイスを監視中。Ctrl+C で終了します。")
+    async with server:
+        await asyncio.gather(*(
+            monitor_device(t, w, args.interval, args.timeout) for t, w in monitored
+        ))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Monitor device round-trip latency and serve Prometheus metrics.\n"
+        "デバイスの応答時間を監視し、Prometheus形式で公開します。",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--config-dir",
+        default=str(PROJECT_ROOT / "config"),
+        help="Path to config/ directory (default: auto-detect from script location)",
+    )
+    parser.add_argument(
+        "--params",
+        default=None,
+        help="Path to parameters.yaml (default: config/parameters.yaml)",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=2.0,
+        help="Seconds between samples per device (default: 2)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=1.0,
+        help="Seconds before a connect or round trip counts as failed (default: 1)",
+    )
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=300,
+        help="Round trips kept per device for p50/p95/p99 (default: 300)",
+    )
+    parser.add_argument(
+        "--listen",
+        default="127.0.0.1:9105",
+        metavar="HOST:PORT",
+        help="Address for the metrics endpoint (default: 127.0.0.1:9105)",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    probe = load_script("device-probe.py", "device_probe")
+    conv = probe.load_converter()
+    config_dir = Path(args.config_dir)
+    params_path = args.params or str(config_dir / "parameters.yaml")
+
+    _hosts, ports = probe.resolve_targets(conv, config_dir, params_path)
+    targets = [t for t in ports if not probe.is_placeholder(t["ip"]) and not t.get("error")]
+    for t in ports:
+        if probe.is_placeholder(t["ip"]):
+            print(f"  [SKIP] {t['name']} - {t['ip']}:{t['port']} - IP not configured / IP未設定")
+        elif t.get("error"):
+            print(f"  [SKIP] {t['name']} - {t['ip']}:{t['port']} - {t['error']}")
+    if not targets:
+        print("No devices with configured IPs to monitor. / 監視対象のデバイスがありません。")
+        raise SystemExit(1)
+
+    try:
+        asyncio.run(run(targets, args))
+    except KeyboardInterrupt:
+        print("\nStopped monitoring. / 監視を終了しました。")
+
+
+if __name__ == "__main__":
+    main()
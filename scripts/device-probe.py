@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Device Probe / デバイスチェック
+===============================
+Checks that every machine and device in config/parameters.yaml is reachable
+(ping) and that each connection's port is open, all probes concurrently
+under one global deadline. Replaces running network-test.sh and
+port-check.sh back to back.
+
+Hosts and ports are resolved exactly as yaml-to-companion.py resolves them
+for Companion: machines/assignments give the IP, connection_settings
+override fields, and MODULE_CONFIGS supplies default ports. Modules that
+have no port field use MODULE_PROBE_PORTS below.
+
+Usage:
+    python3 scripts/device-probe.py                       # Probe everything
+    python3 scripts/device-probe.py --deadline 3          # Give up after 3 seconds overall
+    python3 scripts/device-probe.py --no-ping             # Port checks only
+    python3 scripts/device-probe.py --params other.yaml   # Another parameters file
+
+Exit status is 1 if any configured device fails. Placeholder IPs (containing
+"XXX") are skipped, as in the shell scripts.
+
+Requirements:
+    PyYAML >= 6.0  (install with: pip install pyyaml)
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import sys
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+CONVERTER_PATH = SCRIPT_DIR / "yaml-to-companion.py"
+
+# Probe ports for modules whose Companion config has no port field. A "port"
+# under connection_settings in parameters.yaml still takes precedence.
+MODULE_PROBE_PORTS = {
+    "bmd-atem": ("udp", 9910),
+    "yamaha-rcp": ("tcp", 49280),
+}
+
+# Modules that only need the machine to answer ping.
+PING_ONLY_MODULES = {"generic-pingandwake"}
+
+# ATEM switchers answer this handshake packet on UDP 9910.
+ATEM_HELLO = bytes([
+    0x10, 0x14, 0x53, 0xAB, 0x00, 0x00, 0x00, 0x00, 0x00, 0x3A,
+    0x00, 0x00, 0x01, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+])
+UDP_PAYLOADS = {"bmd-atem": ATEM_HELLO}
+
+
+def load_converter():
+    """Import yaml-to-companion.py (its file name isn't a valid module name)."""
+    spec = importlib.util.spec_from_file_location("yaml_to_companion", CONVERTER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# =============================================================================
+# Targets
+# =============================================================================
+
+def resolve_targets(conv, config_dir, params_path):
+    """Return (hosts, ports) to probe.
+
+    hosts is [(name, ip)] with one entry per distinct IP (connections sharing
+    a machine are pinged once); ports is a list of dicts with name, conn_id,
+    module, ip, proto, port and the connection's resolved module config.
+    A port that isn't a valid number is kept as given, with the problem in
+    "error", so that device is reported instead of aborting the probe.
+    """
+    connections = conv.load_yaml_file(config_dir / "connections.yaml").get("connections", [])
+    params = conv.load_parameters(params_path)
+    instances, connection_map, _module_map = conv.build_connections(connections, params)
+
+    machines = (params or {}).get("machines", {}) or {}
+    assignments = (params or {}).get("assignments", {}) or {}
+
+    hosts = {}
+    ports = []
+    for conn_id, conn_uuid in connection_map.items():
+        if conn_id == "internal":
+            continue
+        instance = instances[conn_uuid]
+        module = instance["instance_type"]
+        config = instance["config"]
+        ip_field = conv.MODULE_CONFIGS.get(module, {}).get("ip_field", "host")
+        ip = str(config.get(ip_field, "") or "")
+        if not ip:
+            continue
+        machine = assignments.get(conn_id)
+        name = machine if machine in machines else instance["label"]
+        # Placeholder IPs aren't real addresses; keep one line per machine
+        hosts.setdefault((name, ip) if is_placeholder(ip) else ip, (name, ip))
+        if module in PING_ONLY_MODULES:
+            continue
+
+        proto, port = MODULE_PROBE_PORTS.get(module, ("tcp", None))
+        error = None
+        if config.get("port") not in (None, ""):
+            port = config["port"]
+            try:
+                port = int(port)
+            except (TypeError, ValueError):
+                error = f"invalid port {port!r} in parameters.yaml / ポート設定が不正"
+            else:
+                if not 0 < port < 65536:
+                    error = f"port {port} out of range / ポート範囲外"
+        if port is None:
+            continue
+        ports.append({
+            "name": f"{instance['label']} ({proto.upper()})",
+            "conn_id": conn_id,
+            "module": module,
+            "ip": ip,
+            "proto": proto,
+            "port": port,
+            "config": config,
+            "error": error,
+        })
+    return list(hosts.values()), ports
+
+
+def is_placeholder(ip):
+    return "XXX" in ip
+
+
+# =============================================================================
+# Probes (each returns (ok, detail))
+# =============================================================================
+
+async def ping(ip, timeout):
+    count_flag = "-n" if sys.platform == "win32" else "-c"
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            "ping", count_flag, "1", ip,
+            stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+        )
+    except FileNotFoundError:
+        return None, "ping command not available"
+    try:
+        returncode = await asyncio.wait_for(proc.wait(), timeout)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return False, "no reply"
+    return returncode == 0, None
+
+
+async def tcp_open(ip, port, timeout):
+    try:
+        _reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+    except asyncio.TimeoutError:
+        return False, "timed out"
+    except ConnectionRefusedError:
+        return False, "connection refused"
+    except OSError as e:
+        return False, e.strerror or str(e)
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True, None
+
+
+class _ReplyProtocol(asyncio.DatagramProtocol):
+    def __init__(self, reply):
+        self.reply = reply
+
+    def datagram_received(self, data, addr):
+        if not self.reply.done():
+            self.reply.set_result(data)
+
+    def error_received(self, exc):
+        if not self.reply.done():
+            self.reply.set_exception(exc)
+
+
+async def udp_reply(ip, port, payload, timeout):
+    """Send payload and wait for any reply (UDP has no connection to check)."""
+    loop = asyncio.get_running_loop()
+    reply = loop.create_future()
+    transport = None
+    try:
+        # Name resolution and socket errors surface here, not on send
+        transport, _protocol = await loop.create_datagram_endpoint(
+            lambda: _ReplyProtocol(reply), remote_addr=(ip, port)
+        )
+        transport.sendto(payload)
+        await asyncio.wait_for(reply, timeout)
+        return True, None
+    except asyncio.TimeoutError:
+        return False, "no reply"
+    except OSError as e:
+        return False, e.strerror or str(e)
+    finally:
+        if transport is not None:
+            transport.close()
+
+
+async def _timed(coro):
+    start = time.perf_counter()
+    ok, detail = await coro
+    return ok, detail, time.perf_counter() - start
+
+
+async def run_probes(hosts, ports, timeout, deadline, do_ping=True):
+    """Probe everything concurrently; returns (host_results, port_results).
+
+    Each result is (status, detail, seconds) with status "ok", "fail" or
+    "skip", in the same order as hosts/ports. Probes still running when the
+    global deadline passes are cancelled and reported as failures.
+    """
+    jobs = {}
+    for i, (_name, ip) in enumerate(hosts):
+        if do_ping and not is_placeholder(ip):
+            jobs[("host", i)] = asyncio.ensure_future(_timed(ping(ip, timeout)))
+    for i, target in enumerate(ports):
+        if is_placeholder(target["ip"]) or target.get("error"):
+            continue
+        if target["proto"] == "udp":
+            payload = UDP_PAYLOADS.get(target["module"], b"\0")
+            probe = udp_reply(target["ip"], target["port"], payload, timeout)
+        else:
+            probe = tcp_open(target["ip"], target["port"], timeout)
+        jobs[("port", i)] = asyncio.ensure_future(_timed(probe))
+
+    if jobs:
+        _done, pending = await asyncio.wait(jobs.values(), timeout=deadline)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    def outcome(key, ip, error=None):
+        if is_placeholder(ip):
+            return "skip", "IP not configured / IP未設定", 0.0
+        if error:
+            return "fail", error, 0.0
+        task = jobs.get(key)
+        if task is None:
+            return "skip", "ping disabled", 0.0
+        if task.cancelled():
+            return "fail", f"deadline of {deadline:g}s reached", deadline
+        ok, detail, seconds = task.result()
+        if ok is None:
+            return "skip", detail, seconds
+        return ("ok" if ok else "fail"), detail, seconds
+
+    host_results = [outcome(("host", i), ip) for i, (_name, ip) in enumerate(hosts)]
+    port_results = [outcome(("port", i), t["ip"], t.get("error")) for i, t in enumerate(ports)]
+    return host_results, port_results
+
+
+# =============================================================================
+# Report
+# =============================================================================
+
+TAGS = {"ok": "[ OK ]", "fail": "[FAIL]", "skip": "[SKIP]"}
+
+
+def print_report(hosts, ports, host_results, port_results, elapsed):
+    print("========================================")
+    print("  Device Probe / デバイスチェック")
+    print(f"  {time.strftime('%a %b %d %H:%M:%S %Z %Y')}")
+    print("========================================")
+    print("")
+
+    print("━━━ Network / ネットワーク ━━━")
+    for (name, ip), (status, detail, seconds) in zip(hosts, host_results):
+        if status == "ok":
+            print(f"  {TAGS[status]} {name} ({ip}) - Reachable / 到達可能 ✓ ({seconds * 1000:.0f} ms)")
+        elif status == "fail":
+            print(f"  {TAGS[status]} {name} ({ip}) - Unreachable / 到達不可 ✗ ({detail})")
+        else:
+            print(f"  {TAGS[status]} {name} ({ip}) - {detail}")
+    print("")
+
+    print("━━━ Ports / ポート ━━━")
+    for target, (status, detail, seconds) in zip(ports, port_results):
+        where = f"{target['ip']}:{target['port']}"
+        if status == "ok":
+            print(f"  {TAGS[status]} {target['name']} - {where} - Open / 開放 ✓ ({seconds * 1000:.0f} ms)")
+        elif status == "fail" and target.get("error"):
+            print(f"  {TAGS[status]} {target['name']} - {where} - {detail}")
+        elif status == "fail":
+            print(f"  {TAGS[status]} {target['name']} - {where} - Closed or filtered / 閉鎖 ✗ ({detail})")
+        else:
+            print(f"  {TAGS[status]} {target['name']} - {where} - {detail}")
+
+    results = [r[0] for r in host_results + port_results]
+    passed, failed, skipped = (results.count(s) for s in ("ok", "fail", "skip"))
+    print("")
+    print("----------------------------------------")
+    print(f"  Results: {passed} passed, {failed} failed, {skipped} skipped ({elapsed:.2f} s)")
+
+    placeholders = sum(1 for _name, ip in hosts if is_placeholder(ip))
+    if placeholders:
+        print(f"  NOTE: {placeholders} machine(s) have placeholder IPs.")
+        print("  Update IPs in config/parameters.yaml.")
+        print(f"  注意: {placeholders}台のIPが未設定です。")
+
+    if failed:
+        print("")
+        print(f"  WARNING: {failed} check(s) failed!")
+        print(f"  警告: {failed}件のチェックに失敗しました！")
+        print("")
+        print("  Possible causes / 考えられる原因:")
+        print("  - Device not running / デバイスが起動していない")
+        print("  - Firewall blocking / ファイアウォールでブロック")
+        print("  - Wrong IP address / IPアドレスが間違い")
+        print("  - Service not enabled / サービスが無効")
+        print("----------------------------------------")
+        return False
+
+    print("")
+    print("  All configured devices reachable.")
+    print("  設定済みデバイスすべてに到達可能です。")
+    print("----------------------------------------")
+    return True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Probe all configured devices concurrently.\n"
+        "設定済みのすべてのデバイスを並行してチェックします。",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--config-dir",
+        default=str(PROJECT_ROOT / "config"),
+        help="Path to config/ directory (default: auto-detect from script location)",
+    )
+    parser.add_argument(
+        "--params",
+        default=None,
+        help="Path to parameters.yaml (default: config/parameters.yaml)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=2.0,
+        help="Seconds to wait for each individual probe (default: 2)",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=5.0,
+        help="Overall seconds before unfinished probes are failed (default: 5)",
+    )
+    parser.add_argument(
+        "--no-ping",
+        action="store_true",
+        help="Skip the ping checks (e.g. where ICMP is blocked)",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    conv = load_converter()
+    config_dir = Path(args.config_dir)
+    params_path = args.params or str(config_dir / "parameters.yaml")
+
+    hosts, ports = resolve_targets(conv, config_dir, params_path)
+    start = time.perf_counter()
+    host_results, port_results = asyncio.run(
+        run_probes(hosts, ports, args.timeout, args.deadline, do_ping=not args.no_ping)
+    )
+    ok = print_report(hosts, ports, host_results, port_results, time.perf_counter() - start)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
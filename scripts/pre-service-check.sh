@@ -18,25 +18,34 @@ echo "║  $(date)           ║"
 echo "╚════════════════════════════════════════╝"
 echo ""
 
-# --- Step 1: Network ---
-echo "━━━ Step 1: Network / ネットワーク ━━━"
-if [[ -x "$SCRIPT_DIR/network-test.sh" ]]; then
-    "$SCRIPT_DIR/network-test.sh" || true
+# --- Steps 1 + 2: Network and ports ---
+# device-probe.py checks everything in config/parameters.yaml concurrently;
+# fall back to the shell scripts where Python/PyYAML isn't installed.
+if command -v python3 > /dev/null 2>&1 && python3 -c "import yaml" 2> /dev/null; then
+    echo "━━━ Step 1-2: Network + Ports / ネットワーク + ポート ━━━"
+    python3 "$SCRIPT_DIR/device-probe.py" || true
+    echo ""
 else
-    echo "  [WARN] network-test.sh not found or not executable"
-    echo "  Run: chmod +x scripts/network-test.sh"
-fi
-echo ""
+    # --- Step 1: Network ---
+    echo "━━━ Step 1: Network / ネットワーク ━━━"
+    if [[ -x "$SCRIPT_DIR/network-test.sh" ]]; then
+        "$SCRIPT_DIR/network-test.sh" || true
+    else
+        echo "  [WARN] network-test.sh not found or not executable"
+        echo "  Run: chmod +x scripts/network-test.sh"
+    fi
+    echo ""
 
-# --- Step 2: Ports ---
-echo "━━━ Step 2: Ports / ポート ━━━"
-if [[ -x "$SCRIPT_DIR/port-check.sh" ]]; then
-    "$SCRIPT_DIR/port-check.sh" || true
-else
-    echo "  [WARN] port-check.sh not found or not executable"
-    echo "  Run: chmod +x scripts/port-check.sh"
+    # --- Step 2: Ports ---
+    echo "━━━ Step 2: Ports / ポート ━━━"
+    if [[ -x "$SCRIPT_DIR/port-check.sh" ]]; then
+        "$SCRIPT_DIR/port-check.sh" || true
+    else
+        echo "  [WARN] port-check.sh not found or not executable"
+        echo "  Run: chmod +x scripts/port-check.sh"
+    fi
+    echo ""
 fi
-echo ""
 
 # --- Step 3: Reminder Checklist ---
 echo "━━━ Step 3: Manual Checklist / 手動チェックリスト ━━━"
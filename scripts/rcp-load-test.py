@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Yamaha RCP Load Test / Yamaha RCP負荷テスト
+===========================================
+Replays every Yamaha action in the page YAML against an RCP endpoint and
+reports command throughput and latency percentiles. Every command is checked
+against the mixer's reply, so an address the converter generates that the
+mixer rejects shows up as an error.
+
+The actions are resolved with the converter itself (templates expanded,
+MODULE_ACTION_MAP and _yamaha_resolve_action applied), then sent the way
+the yamaha-rcp module does:
+
+    mute_toggle / dca_mute / master_mute   get the current value, then set the opposite
+    mute_channel (Val On/Off)              set ... 1 / 0
+    fader_level, dca_level (Val)           set ... <value in 1/100 dB>
+    scene_recall / scene_store             ssrecall_ex / ssupdate_ex scene_a <scene>
+
+By default a yamaha-simulator.py instance is started in-process on a free
+port, so the test needs no hardware; --host targets a real TF1 (or a
+simulator on another machine) instead. --latency/--jitter/--drop are passed
+to the in-process simulator.
+
+Usage:
+    python3 scripts/rcp-load-test.py                          # 5 rounds, 1 client, built-in simulator
+    python3 scripts/rcp-load-test.py --clients 4 --rounds 50  # 4 parallel connections
+    python3 scripts/rcp-load-test.py --latency 15 --jitter 5 --drop 0.01
+    python3 scripts/rcp-load-test.py --host 192.168.1.50      # A real mixer (changes its state!)
+    python3 scripts/rcp-load-test.py --list                   # Show the replayed commands only
+
+Exit status is 1 if any command got an ERROR reply.
+
+Requirements:
+    PyYAML >= 6.0  (install with: pip install pyyaml)
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import math
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+DEFAULT_PORT = 49280
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def load_script(file_name, module_name):
+    """Import a sibling script whose file name isn't a valid module name."""
+    spec = importlib.util.spec_from_file_location(module_name, SCRIPT_DIR / file_name)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# =============================================================================
+# Commands from the page YAML
+# =============================================================================
+
+class Command:
+    """One Yamaha action, as the RCP exchange the module would perform."""
+
+    __slots__ = ("source", "kind", "address", "x", "y", "value")
+
+    def __init__(self, source, kind, address, x=0, y=0, value=None):
+        self.source = source    # "page04-audio-core.yaml [1,2] mute_toggle"
+        self.kind = kind        # "set", "toggle", "ssrecall_ex" or "ssupdate_ex"
+        self.address = address
+        self.x = x
+        self.y = y
+        self.value = value
+
+    def describe(self):
+        if self.kind in ("ssrecall_ex", "ssupdate_ex"):
+            return f"{self.kind} {self.address} {self.value}"
+        if self.kind == "toggle":
+            return f"get+set {self.address} {self.x} {self.y} (toggle)"
+        return f"set {self.address} {self.x} {self.y} {self.value}"
+
+
+def rcp_command(source, def_id, options):
+    """Turn a resolved Yamaha action into a Command (None if it has no RCP form)."""
+    if def_id.startswith("MIXER:Lib/Bank/Scene/"):
+        kind = {"Recall": "ssrecall_ex", "Store": "ssupdate_ex"}.get(def_id.rsplit("/", 1)[1])
+        scene = options.get("scene", options.get("Val"))
+        if kind is None or type(scene) is not int:
+            return None
+        return Command(source, kind, "scene_a", value=scene)
+    if not def_id.startswith("MIXER:"):
+        return None
+    x = options.get("X", 0)
+    y = options.get("Y", 0)
+    value = options.get("Val")
+    if value == "Toggle":
+        return Command(source, "toggle", def_id, x, y)
+    if value in ("On", "Off"):
+        value = 1 if value == "On" else 0
+    if type(value) is not int:
+        return None
+    return Command(source, "set", def_id, x, y, value)
+
+
+def page_commands(conv, config_dir):
+    """Every Yamaha action (press and step 2) on every page, in page order.
+
+    Returns (commands, skipped action descriptions).
+    """
+    connections = conv.load_yaml_file(config_dir / "connections.yaml").get("connections", [])
+    params = conv.load_parameters(config_dir / "parameters.yaml")
+    _instances, connection_map, module_map = conv.build_connections(connections, params)
+    resolver = conv.get_resolver(connection_map, module_map)
+    commands = []
+    skipped = []
+    for page_file, page_data in conv.load_all_pages(config_dir / "pages"):
+        for button in page_data.get("buttons") or ():
+            pos = button.get("position", ["?", "?"])
+            for step in ("actions", "step_2_actions"):
+                for yaml_action in (button.get(step) or {}).get("press") or ():
+                    conn = yaml_action.get("connection", "internal")
+                    if module_map.get(conn) != "yamaha-rcp":
+                        continue
+                    source = f"{page_file} [{pos[0]},{pos[1]}] {yaml_action.get('action')}"
+                    _conn_id, def_id, options = resolver.action(conv.Action.from_yaml(yaml_action))
+                    command = rcp_command(source, def_id, options)
+                    if command is None:
+                        skipped.append(f"{source}: {def_id} {options}")
+                    else:
+                        commands.append(command)
+    return commands, skipped
+
+
+# =============================================================================
+# Load test
+# =============================================================================
+
+def quantile(samples, q):
+    """Nearest-rank quantile of a sorted list, or None if empty."""
+    if not samples:
+        return None
+    return samples[max(0, math.ceil(q * len(samples)) - 1)]
+
+
+class RcpClient:
+    """One RCP connection; request() sends a line and waits for its OK/ERROR.
+
+    NOTIFY lines (changes made by other clients) and late replies to
+    commands that already timed out are skipped.
+    """
+
+    def __init__(self, host, port, timeout):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+    async def _reply(self, echo):
+        while True:
+            line = (await self.reader.readline()).decode("utf-8", "replace").strip()
+            if not line:
+                raise ConnectionError("connection closed by mixer")
+            if line.startswith(f"OK {echo}"):
+                return True, line
+            if line.startswith(f"ERROR {echo.split()[0]}"):
+                return False, line
+
+    async def request(self, line, echo=None):
+        """Return (ok, reply line); raises asyncio.TimeoutError."""
+        self.writer.write(f"{line}\n".encode("utf-8"))
+        await self.writer.drain()
+        return await asyncio.wait_for(self._reply(echo or line), self.timeout)
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = []
+        self.by_kind = {}
+        self.errors = []
+        self.timeouts = 0
+        self.exchanges = 0
+
+    def record(self, kind, seconds):
+        self.latencies.append(seconds)
+        self.by_kind.setdefault(kind, []).append(seconds)
+        self.exchanges += 1
+
+
+async def run_command(client, command, stats):
+    """Perform one action; every request/reply pair is timed separately."""
+    async def exchange(kind, line, echo=None):
+        start = time.perf_counter()
+        try:
+            ok, reply = await client.request(line, echo)
+        except asyncio.TimeoutError:
+            stats.timeouts += 1
+            return None
+        stats.record(kind, time.perf_counter() - start)
+        if not ok:
+            stats.errors.append(f"{command.source}: {line} -> {reply}")
+            return None
+        return reply
+
+    if command.kind in ("ssrecall_ex", "ssupdate_ex"):
+        await exchange(command.kind, f"{command.kind} {command.address} {command.value}")
+        return
+    target = f"{command.address} {command.x} {command.y}"
+    value = command.value
+    if command.kind == "toggle":
+        reply = await exchange("get", f"get {target}")
+        if reply is None:
+            return
+        value = 0 if reply.rsplit(" ", 1)[1] != "0" else 1
+    await exchange("set", f"set {target} {value}")
+
+
+async def client_worker(host, port, timeout, commands, rounds, stats, offset):
+    client = RcpClient(host, port, timeout)
+    await client.connect()
+    try:
+        # Clients start at different points in the list, so they don't
+        # all hit the same channel at the same moment
+        n = len(commands)
+        for r in range(rounds):
+            for i in range(n):
+                await run_command(client, commands[(i + offset) % n], stats)
+    finally:
+        client.close()
+
+
+async def run_load_test(args, commands):
+    simulator = None
+    host, port = args.host, args.port
+    if host is None:
+        sim = load_script("yamaha-simulator.py", "yamaha_simulator")
+        simulator = sim.RcpSimulator(latency=args.latency / 1000, jitter=args.jitter / 1000,
+                                     drop=args.drop, seed=args.seed)
+        host, port = await simulator.start("127.0.0.1", 0)
+    stats = LoadStats()
+    offsets = [k * len(commands) // args.clients for k in range(args.clients)]
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            client_worker(host, port, args.timeout / 1000, commands, args.rounds, stats, offset)
+            for offset in offsets
+        ))
+    finally:
+        elapsed = time.perf_counter() - start
+        if simulator:
+            await simulator.close()
+    return stats, elapsed, f"{host}:{port}" + (" (built-in simulator)" if simulator else "")
+
+
+def report(stats, elapsed, target, args, actions):
+    latencies = sorted(stats.latencies)
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 3)
+
+    kinds = {}
+    for kind, samples in stats.by_kind.items():
+        samples.sort()
+        kinds[kind] = {"count": len(samples), **{f"p{int(q * 100)}_ms": ms(quantile(samples, q))
+                                                 for q in QUANTILES}}
+    return {
+        "target": target,
+        "clients": args.clients,
+        "rounds": args.rounds,
+        "actions": actions,
+        "exchanges": stats.exchanges,
+        "seconds": round(elapsed, 3),
+        "commands_per_second": round(stats.exchanges / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            **{f"p{int(q * 100)}": ms(quantile(latencies, q)) for q in QUANTILES},
+            "max": ms(latencies[-1]) if latencies else None,
+            "mean": ms(sum(latencies) / len(latencies)) if latencies else None,
+        },
+        "by_command": kinds,
+        "timeouts": stats.timeouts,
+        "errors": stats.errors,
+    }
+
+
+def print_report(result):
+    lat = result["latency_ms"]
+    print(f"Target: {result['target']}")
+    print(f"  {result['actions']} action(s) x {result['rounds']} round(s) x "
+          f"{result['clients']} client(s): {result['exchanges']} command(s) in {result['seconds']:.2f} s")
+    print(f"  Throughput / スループット: {result['commands_per_second']} commands/s")
+    if lat["p50"] is not None:
+        print(f"  Latency / 遅延: p50 {lat['p50']:.2f} ms, p95 {lat['p95']:.2f} ms, "
+              f"p99 {lat['p99']:.2f} ms, max {lat['max']:.2f} ms")
+    for kind, k in sorted(result["by_command"].items()):
+        print(f"    {kind:<12} {k['count']:>7}  p50 {k['p50_ms']:.2f} ms  p95 {k['p95_ms']:.2f} ms  "
+              f"p99 {k['p99_ms']:.2f} ms")
+    if result["timeouts"]:
+        print(f"  Timeouts (no reply) / タイムアウト: {result['timeouts']}")
+    if result["errors"]:
+        print(f"  ERROR replies / エラー応答: {len(result['errors'])}")
+        for line in sorted(set(result["errors"]))[:20]:
+            print(f"    {line}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Replay the pages' Yamaha actions over RCP and measure throughput and latency.\n"
+        "ページのYamahaアクションをRCPで再生し、スループットと遅延を測定します。",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--config-dir",
+        default=str(PROJECT_ROOT / "config"),
+        help="Config directory with connections.yaml and pages/ (default: config/)",
+    )
+    parser.add_argument(
+        "--host",
+        default=None,
+        help="RCP host to test (default: start yamaha-simulator.py in-process)",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=DEFAULT_PORT,
+        help=f"RCP port with --host (default: {DEFAULT_PORT})",
+    )
+    parser.add_argument(
+        "--clients",
+        type=int,
+        default=1,
+        help="Parallel RCP connections (default: 1)",
+    )
+    parser.add_argument(
+        "--rounds",
+        type=int,
+        default=5,
+        help="Times each client replays the full action list (default: 5)",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=1000.0,
+        help="Milliseconds to wait for each reply (default: 1000)",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="Built-in simulator: delay before each reply, in ms",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        help="Built-in simulator: random +/- variation of the delay, in ms",
+    )
+    parser.add_argument(
+        "--drop",
+        type=float,
+        default=0.0,
+        help="Built-in simulator: fraction of commands dropped, 0-1",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Built-in simulator: random seed for jitter and drops",
+    )
+    parser.add_argument(
+        "--list",
+        action="store_true",
+        help="Print the commands that would be replayed and exit",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print the results as JSON",
+    )
+    args = parser.parse_args()
+    if args.clients < 1 or args.rounds < 1:
+        parser.error("--clients and --rounds must be at least 1")
+    if args.host and (args.latency or args.jitter or args.drop):
+        parser.error("--latency/--jitter/--drop only apply to the built-in simulator (no --host)")
+    return args
+
+
+def main():
+    args = parse_args()
+    conv = load_script("yaml-to-companion.py", "yaml_to_companion")
+    commands, skipped = page_commands(conv, Path(args.config_dir))
+    if args.list:
+        for command in commands:
+            print(f"{command.source:<55} {command.describe()}")
+        for line in skipped:
+            print(f"(skipped) {line}")
+        return
+    if not commands:
+        print("No Yamaha actions found in the pages. / Yamahaアクションがありません。")
+        return
+
+    try:
+        stats, elapsed, target = asyncio.run(run_load_test(args, commands))
+    except OSError as e:
+        print(f"ERROR: cannot reach {args.host}:{args.port}: {e}")
+        raise SystemExit(2)
+    result = report(stats, elapsed, target, args, len(commands))
+    result["skipped"] = skipped
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        print_report(result)
+        if skipped:
+            print(f"  {len(skipped)} action(s) with no RCP form skipped (see --list)")
+    raise SystemExit(1 if stats.errors else 0)
+
+
+if __name__ == "__main__":
+    main()
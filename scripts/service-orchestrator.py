@@ -0,0 +1,735 @@
+#!/usr/bin/env python3
+"""
+Service Orchestrator / 起動・終了オーケストレーター
+==================================================
+Runs the startup and shutdown sequences as a dependency graph instead of a
+fixed list of backgrounded commands:
+
+    startup:   wake machine → reachable → SSH session → launch app → app port ready
+               (devices such as the ATEM and TF1 only wait for their port)
+    shutdown:  quit app → app port closed → power off machine
+
+Steps whose dependencies are met run concurrently, so ProPresenter and OBS
+start in parallel. Each step has its own deadline, and the whole sequence
+also has an overall --deadline. Remote machines get one multiplexed SSH
+connection (OpenSSH ControlMaster), and every command for that machine goes
+through it.
+
+Progress is written to output/service-status.json after every step. The
+"startup_status" custom variable in Companion is set to STARTING and then
+COMPLETE or ERROR, so the STARTUP button turns green when everything really
+answers rather than when the shell script returns. Companion's 20-second
+shell timeout doesn't apply: startup-*.sh and shutdown-graceful.sh start
+this script in the background and return at once.
+
+Machines, IPs and ports come from config/parameters.yaml, resolved the same
+way as yaml-to-companion.py does. App paths and the SSH user can be
+overridden with PP_APP_PATH, OBS_APP_PATH and SSH_USER, as in the shell
+scripts.
+
+Usage:
+    python3 scripts/service-orchestrator.py startup                     # Service type from day of week
+    python3 scripts/service-orchestrator.py startup --service midweek
+    python3 scripts/service-orchestrator.py shutdown --power-off        # Also power off remote machines
+    python3 scripts/service-orchestrator.py startup --plan              # Print the graph, run nothing
+
+Exit status is 0 when every step succeeded or was skipped, 1 otherwise.
+
+Requirements:
+    PyYAML >= 6.0  (install with: pip install pyyaml)
+    OpenSSH client (only for machines other than this one)
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import re
+import socket
+import sys
+import tempfile
+import time
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPT_DIR.parent
+
+LOCAL_HOSTS = ("localhost", "127.0.0.1")
+
+# Apps this script launches and quits, by connection id. Other connections
+# with a port (ATEM, TF1) are hardware: startup only waits for them.
+APPS = {
+    "propresenter": {
+        "label": "ProPresenter",
+        "path_env": "PP_APP_PATH",
+        "path": "/Applications/ProPresenter.app",
+    },
+    "obs": {
+        "label": "OBS",
+        "path_env": "OBS_APP_PATH",
+        "path": "/Applications/OBS.app",
+    },
+}
+
+# Connections used to control machines rather than to run the service.
+CONTROL_CONNECTIONS = {"ssh", "wol"}
+
+# Per-step deadlines in seconds.
+STEP_TIMEOUTS = {
+    "wake": 2,
+    "reach": 120,      # Machine booting after Wake-on-LAN
+    "ssh": 15,
+    "launch": 15,
+    "ready": 90,       # App listening on its port (ProPresenter can be slow)
+    "device": 30,
+    "quit": 15,
+    "stopped": 30,
+    "poweroff": 15,
+}
+
+POLL_SECONDS = 0.5
+SSH_PERSIST_SECONDS = 120
+
+
+def load_script(file_name, module_name):
+    """Import a sibling script whose file name isn't a valid module name."""
+    spec = importlib.util.spec_from_file_location(module_name, SCRIPT_DIR / file_name)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class StepSkipped(Exception):
+    """Raised by a step that has nothing to do here (counts as success)."""
+
+
+class StepFailed(Exception):
+    """Raised by a step that ran and did not succeed."""
+
+
+# =============================================================================
+# Graph
+# =============================================================================
+
+class Step:
+    """One node of the plan: an async action plus the steps it waits for."""
+
+    def __init__(self, name, label, action, deps=(), timeout=30):
+        self.name = name
+        self.label = label
+        self.action = action
+        self.deps = list(deps)
+        self.timeout = timeout
+
+
+def ordered(steps):
+    """Return steps in dependency order; raise ValueError on unknown deps or cycles."""
+    by_name = {step.name: step for step in steps}
+    for step in steps:
+        for dep in step.deps:
+            if dep not in by_name:
+                raise ValueError(f"step {step.name!r} depends on unknown step {dep!r}")
+    waiting = {step.name: len(step.deps) for step in steps}
+    dependents = {step.name: [] for step in steps}
+    for step in steps:
+        for dep in step.deps:
+            dependents[dep].append(step.name)
+    ready = [step.name for step in steps if not step.deps]
+    result = []
+    while ready:
+        name = ready.pop(0)
+        result.append(by_name[name])
+        for child in dependents[name]:
+            waiting[child] -= 1
+            if waiting[child] == 0:
+                ready.append(child)
+    if len(result) != len(steps):
+        cyclic = sorted(name for name, count in waiting.items() if count)
+        raise ValueError(f"dependency cycle between steps: {', '.join(cyclic)}")
+    return result
+
+
+async def run_graph(steps, status, deadline):
+    """Run every step as soon as its dependencies succeed.
+
+    A step whose dependency failed is marked "blocked" without running.
+    Steps still unfinished when the overall deadline passes are failed.
+    """
+    steps = ordered(steps)
+    tasks = {}
+
+    async def run_step(step):
+        for dep in step.deps:
+            await asyncio.shield(tasks[dep])
+        blocked = [dep for dep in step.deps if status.state_of(dep) not in ("ok", "skip")]
+        if blocked:
+            status.finish(step, "blocked", f"needs {', '.join(blocked)}")
+            return
+        status.begin(step)
+        try:
+            detail = await asyncio.wait_for(step.action(), step.timeout)
+        except StepSkipped as e:
+            status.finish(step, "skip", str(e))
+        except asyncio.TimeoutError:
+            status.finish(step, "fail", f"not done within {step.timeout:g}s")
+        except (StepFailed, OSError) as e:
+            status.finish(step, "fail", str(e) or type(e).__name__)
+        else:
+            status.finish(step, "ok", detail)
+
+    for step in steps:
+        tasks[step.name] = asyncio.ensure_future(run_step(step))
+    _done, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    for step in steps:
+        if status.state_of(step.name) == "running":
+            status.finish(step, "fail", f"overall deadline of {deadline:g}s reached")
+    for step in steps:
+        if status.state_of(step.name) == "pending":
+            status.finish(step, "blocked", f"overall deadline of {deadline:g}s reached first")
+
+
+# =============================================================================
+# Actions
+# =============================================================================
+
+async def run_command(argv, timeout=None):
+    """Run a command; return its stripped output or raise StepFailed."""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *argv,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+    except FileNotFoundError:
+        raise StepFailed(f"{argv[0]} command not available")
+    try:
+        output, _ = await asyncio.wait_for(proc.communicate(), timeout)
+    except (asyncio.CancelledError, asyncio.TimeoutError):
+        # Don't leave ssh/osascript running after the step has given up
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+        raise
+    text = output.decode("utf-8", "replace").strip()
+    if proc.returncode != 0:
+        last_line = text.splitlines()[-1] if text else f"exit status {proc.returncode}"
+        raise StepFailed(last_line)
+    return text
+
+
+class SshSessions:
+    """One multiplexed OpenSSH connection per machine, shared by every step."""
+
+    def __init__(self, user, port):
+        self.user = user
+        self.port = port
+        self.control_dir = None
+        self.opened = []
+
+    def _base(self, ip):
+        return [
+            "ssh",
+            "-o", "BatchMode=yes",
+            "-o", "ConnectTimeout=5",
+            "-o", "StrictHostKeyChecking=no",
+            "-o", f"ControlPath={self.control_dir}/%C",
+            "-p", str(self.port),
+        ]
+
+    async def open(self, ip):
+        if self.control_dir is None:
+            self.control_dir = tempfile.mkdtemp(prefix="church-ssh-")
+        await run_command(self._base(ip) + [
+            "-o", "ControlMaster=auto",
+            "-o", f"ControlPersist={SSH_PERSIST_SECONDS}",
+            f"{self.user}@{ip}", "true",
+        ])
+        self.opened.append(ip)
+        return f"connected as {self.user}"
+
+    async def run(self, ip, command):
+        return await run_command(self._base(ip) + [f"{self.user}@{ip}", command])
+
+    async def close_all(self):
+        for ip in self.opened:
+            try:
+                await run_command(self._base(ip) + ["-O", "exit", f"{self.user}@{ip}"], timeout=5)
+            except (StepFailed, asyncio.TimeoutError):
+                pass
+        self.opened = []
+        if self.control_dir is not None:
+            try:
+                os.rmdir(self.control_dir)
+            except OSError:
+                pass
+            self.control_dir = None
+
+
+def magic_packet(mac):
+    digits = re.sub(r"[^0-9A-Fa-f]", "", mac)
+    if len(digits) != 12:
+        raise StepFailed(f"invalid MAC address {mac!r}")
+    return b"\xff" * 6 + bytes.fromhex(digits) * 16
+
+
+async def send_wake(mac):
+    packet = magic_packet(mac)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        for _ in range(3):
+            sock.sendto(packet, ("255.255.255.255", 9))
+            await asyncio.sleep(0.1)
+    return f"magic packet sent to {mac}"
+
+
+async def port_answers(probe, target):
+    if target["proto"] == "udp":
+        payload = probe.UDP_PAYLOADS.get(target["module"], b"\0")
+        ok, _detail = await probe.udp_reply(target["ip"], target["port"], payload, POLL_SECONDS)
+    else:
+        ok, _detail = await probe.tcp_open(target["ip"], target["port"], POLL_SECONDS)
+    return ok
+
+
+async def wait_for_port(probe, target, want_open=True):
+    """Poll until the port answers (or stops answering); the step deadline bounds it."""
+    start = time.monotonic()
+    while await port_answers(probe, target) != want_open:
+        await asyncio.sleep(POLL_SECONDS)
+    state = "answering" if want_open else "closed"
+    waited = time.monotonic() - start
+    return f"{target['proto'].upper()} {target['port']} {state} after {waited:.1f}s"
+
+
+# =============================================================================
+# Plans
+# =============================================================================
+
+def is_local(ip):
+    return ip in LOCAL_HOSTS
+
+
+def resolve_plan_inputs(probe, conv, config_dir, params_path):
+    """Return (machines, apps, devices, ssh_settings) from parameters.yaml.
+
+    machines maps machine name to {"ip", "mac", "apps": [conn_id]} for every
+    machine that runs an app; apps and devices map connection id to the
+    port target dicts from device-probe.resolve_targets.
+    """
+    _hosts, targets = probe.resolve_targets(conv, config_dir, params_path)
+    params = conv.load_parameters(params_path) or {}
+    machine_params = params.get("machines", {}) or {}
+    assignments = params.get("assignments", {}) or {}
+    ssh_settings = (params.get("connection_settings", {}) or {}).get("ssh", {}) or {}
+
+    apps = {}
+    devices = {}
+    for target in targets:
+        if target["conn_id"] in APPS:
+            apps[target["conn_id"]] = target
+        elif target["conn_id"] not in CONTROL_CONNECTIONS:
+            devices[target["conn_id"]] = target
+
+    machines = {}
+    for conn_id, target in apps.items():
+        name = assignments.get(conn_id)
+        entry = machine_params.get(name) if name in machine_params else None
+        if entry is None:
+            name = target["ip"]
+            entry = {}
+        machine = machines.setdefault(name, {
+            "ip": target["ip"],
+            "mac": str(entry.get("mac", "") or ""),
+            "apps": [],
+        })
+        machine["apps"].append(conn_id)
+    return machines, apps, devices, ssh_settings
+
+
+def app_path(conn_id):
+    app = APPS[conn_id]
+    return os.environ.get(app["path_env"], app["path"])
+
+
+async def _skip_placeholder():
+    raise StepSkipped("IP not configured / IP未設定")
+
+
+def machine_steps(name, machine, ssh, probe, ssh_port, waking):
+    """Steps that make a remote machine usable; returns (steps, last step name)."""
+    ip = machine["ip"]
+    if is_local(ip):
+        return [], None
+    if probe.is_placeholder(ip):
+        step = Step(f"ssh:{name}", f"SSH to {name}", _skip_placeholder, timeout=1)
+        return [step], step.name
+
+    steps = []
+    reach_deps = []
+    if waking:
+        mac = machine["mac"]
+
+        async def wake():
+            if not mac:
+                raise StepSkipped("no MAC address in parameters.yaml")
+            return await send_wake(mac)
+
+        steps.append(Step(f"wake:{name}", f"Wake {name}", wake, timeout=STEP_TIMEOUTS["wake"]))
+        reach_deps.append(f"wake:{name}")
+
+        reach_target = {"ip": ip, "port": ssh_port, "proto": "tcp", "module": ""}
+        steps.append(Step(
+            f"reach:{name}", f"{name} reachable",
+            lambda: wait_for_port(probe, reach_target),
+            deps=reach_deps, timeout=STEP_TIMEOUTS["reach"],
+        ))
+        reach_deps = [f"reach:{name}"]
+
+    steps.append(Step(
+        f"ssh:{name}", f"SSH to {name}",
+        lambda: ssh.open(ip),
+        deps=reach_deps, timeout=STEP_TIMEOUTS["ssh"],
+    ))
+    return steps, f"ssh:{name}"
+
+
+def startup_plan(machines, apps, devices, ssh, probe, ssh_port):
+    steps = []
+    for name, machine in machines.items():
+        prepare, ready_step = machine_steps(name, machine, ssh, probe, ssh_port, waking=True)
+        steps.extend(prepare)
+        for conn_id in machine["apps"]:
+            target = apps[conn_id]
+            label = APPS[conn_id]["label"]
+            deps = [ready_step] if ready_step else []
+            steps.append(Step(
+                f"launch:{conn_id}", f"Launch {label}",
+                launch_action(probe, conn_id, machine["ip"], ssh),
+                deps=deps, timeout=STEP_TIMEOUTS["launch"],
+            ))
+            steps.append(Step(
+                f"ready:{conn_id}", f"{label} ready",
+                port_action(probe, target, want_open=True),
+                deps=[f"launch:{conn_id}"], timeout=STEP_TIMEOUTS["ready"],
+            ))
+    for conn_id, target in devices.items():
+        steps.append(Step(
+            f"ready:{conn_id}", f"{target['name']} ready",
+            port_action(probe, target, want_open=True),
+            timeout=STEP_TIMEOUTS["device"],
+        ))
+    return steps
+
+
+def shutdown_plan(machines, apps, ssh, probe, ssh_port, power_off):
+    steps = []
+    for name, machine in machines.items():
+        prepare, ready_step = machine_steps(name, machine, ssh, probe, ssh_port, waking=False)
+        steps.extend(prepare)
+        stopped = []
+        for conn_id in machine["apps"]:
+            target = apps[conn_id]
+            label = APPS[conn_id]["label"]
+            deps = [ready_step] if ready_step else []
+            steps.append(Step(
+                f"quit:{conn_id}", f"Quit {label}",
+                quit_action(probe, conn_id, machine["ip"], ssh),
+                deps=deps, timeout=STEP_TIMEOUTS["quit"],
+            ))
+            steps.append(Step(
+                f"stopped:{conn_id}", f"{label} stopped",
+                port_action(probe, target, want_open=False),
+                deps=[f"quit:{conn_id}"], timeout=STEP_TIMEOUTS["stopped"],
+            ))
+            stopped.append(f"stopped:{conn_id}")
+        if power_off and ready_step and not probe.is_placeholder(machine["ip"]):
+            steps.append(Step(
+                f"poweroff:{name}", f"Power off {name}",
+                poweroff_action(machine["ip"], ssh),
+                deps=[ready_step] + stopped, timeout=STEP_TIMEOUTS["poweroff"],
+            ))
+    return steps
+
+
+def port_action(probe, target, want_open):
+    async def action():
+        if probe.is_placeholder(target["ip"]):
+            raise StepSkipped("IP not configured / IP未設定")
+        return await wait_for_port(probe, target, want_open)
+    return action
+
+
+def launch_action(probe, conn_id, ip, ssh):
+    path = app_path(conn_id)
+
+    async def action():
+        if probe.is_placeholder(ip):
+            raise StepSkipped("IP not configured / IP未設定")
+        if not is_local(ip):
+            await ssh.run(ip, f"open -a '{path}'")
+            return f"opened {path} on {ip}"
+        if sys.platform != "darwin":
+            raise StepSkipped(f"OPEN QUESTION: {APPS[conn_id]['label']} launch command for this OS")
+        await run_command(["open", "-a", path])
+        return f"opened {path}"
+    return action
+
+
+def quit_action(probe, conn_id, ip, ssh):
+    script = f'tell application "{APPS[conn_id]["label"]}" to quit'
+
+    async def action():
+        if probe.is_placeholder(ip):
+            raise StepSkipped("IP not configured / IP未設定")
+        if not is_local(ip):
+            await ssh.run(ip, f"osascript -e '{script}'")
+            return f"asked to quit on {ip}"
+        if sys.platform != "darwin":
+            raise StepSkipped(f"OPEN QUESTION: {APPS[conn_id]['label']} quit command for this OS")
+        await run_command(["osascript", "-e", script])
+        return "asked to quit"
+    return action
+
+
+def poweroff_action(ip, ssh):
+    async def action():
+        await ssh.run(ip, "sudo shutdown -h +1 'Shutdown initiated by church Stream Deck'")
+        return "shutdown scheduled in 1 minute"
+    return action
+
+
+# =============================================================================
+# Status file + Companion variable
+# =============================================================================
+
+class RunStatus:
+    """Tracks step states, logs transitions and mirrors them to the status file."""
+
+    def __init__(self, sequence, service, path, companion_url=None):
+        self.sequence = sequence
+        self.service = service
+        self.path = Path(path) if path else None
+        self.companion_url = companion_url.rstrip("/") if companion_url else None
+        self.started = time.time()
+        self.clock = time.monotonic()
+        self.state = "STARTING" if sequence == "startup" else "STOPPING"
+        self.steps = {}
+        self._companion_warned = False
+
+    def elapsed(self):
+        return time.monotonic() - self.clock
+
+    def add(self, steps):
+        for step in steps:
+            self.steps[step.name] = {
+                "label": step.label,
+                "deps": step.deps,
+                "state": "pending",
+                "detail": "",
+                "started": None,
+                "seconds": None,
+            }
+        self.write()
+
+    def state_of(self, name):
+        return self.steps[name]["state"]
+
+    def begin(self, step):
+        entry = self.steps[step.name]
+        entry["state"] = "running"
+        entry["started"] = round(self.elapsed(), 3)
+        self.write()
+
+    def finish(self, step, state, detail=""):
+        entry = self.steps[step.name]
+        if entry["started"] is not None:
+            entry["seconds"] = round(self.elapsed() - entry["started"], 3)
+        entry["state"] = state
+        entry["detail"] = detail or ""
+        tag = {"ok": "OK", "skip": "SKIP", "fail": "FAIL", "blocked": "BLOCKED"}[state]
+        suffix = f" - {detail}" if detail else ""
+        self.log(f"[{tag}] {step.label}{suffix}")
+        self.write()
+
+    def log(self, message):
+        print(f"[{self.sequence}] +{self.elapsed():5.1f}s {message}", flush=True)
+
+    def ok(self):
+        return all(entry["state"] in ("ok", "skip") for entry in self.steps.values())
+
+    def write(self):
+        if self.path is None:
+            return
+        report = {
+            "sequence": self.sequence,
+            "service": self.service,
+            "state": self.state,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.started)),
+            "elapsed_seconds": round(self.elapsed(), 3),
+            "steps": self.steps,
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n", encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def _post_variable(self, name, value):
+        url = (f"{self.companion_url}/api/custom-variable/{urllib.parse.quote(name)}/value?"
+               + urllib.parse.urlencode({"value": value}))
+        request = urllib.request.Request(url, data=b"", method="POST")
+        with urllib.request.urlopen(request, timeout=2):
+            pass
+
+    async def set_variable(self, name, value):
+        """Set a Companion custom variable; failures are reported once, never fatal."""
+        if not self.companion_url:
+            return
+        try:
+            await asyncio.to_thread(self._post_variable, name, value)
+        except OSError as e:
+            if not self._companion_warned:
+                self.log(f"[WARN] Could not update Companion at {self.companion_url} ({e})")
+                self._companion_warned = True
+
+    async def set_state(self, state):
+        self.state = state
+        self.write()
+        if self.sequence == "startup" or state in ("READY", "ERROR"):
+            await self.set_variable("startup_status", state)
+
+
+# =============================================================================
+# CLI entry point
+# =============================================================================
+
+def default_service():
+    return "sunday" if time.localtime().tm_wday == 6 else "midweek"
+
+
+async def orchestrate(args, steps, ssh, status):
+    status.add(steps)
+    status.log(f"{len(steps)} step(s); service type: {status.service}")
+    await status.set_state(status.state)
+    if args.sequence == "startup":
+        await status.set_variable("service_day", status.service)
+    try:
+        await run_graph(steps, status, args.deadline)
+    finally:
+        await ssh.close_all()
+
+    if status.ok():
+        final = "COMPLETE" if args.sequence == "startup" else "READY"
+    else:
+        final = "ERROR"
+    await status.set_state(final)
+    status.log(f"{final} in {status.elapsed():.1f}s")
+    return final != "ERROR"
+
+
+def print_plan(steps):
+    for step in ordered(steps):
+        deps = f"  ← {', '.join(step.deps)}" if step.deps else ""
+        print(f"  {step.name:<28} {step.timeout:>4g}s  {step.label}{deps}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Run the startup/shutdown sequence as a dependency graph.\n"
+        "起動・終了シーケンスを依存関係グラフとして実行します。",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("sequence", choices=("startup", "shutdown"))
+    parser.add_argument(
+        "--service",
+        choices=("sunday", "midweek"),
+        default=None,
+        help="Service type recorded in the status and service_day (default: from day of week)",
+    )
+    parser.add_argument(
+        "--config-dir",
+        default=str(PROJECT_ROOT / "config"),
+        help="Path to config/ directory (default: auto-detect from script location)",
+    )
+    parser.add_argument(
+        "--params",
+        default=None,
+        help="Path to parameters.yaml (default: config/parameters.yaml)",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=180.0,
+        help="Overall seconds before unfinished steps are failed (default: 180)",
+    )
+    parser.add_argument(
+        "--status-file",
+        default=str(PROJECT_ROOT / "output" / "service-status.json"),
+        help="Where to write step progress (default: output/service-status.json)",
+    )
+    parser.add_argument(
+        "--companion",
+        default=os.environ.get("COMPANION_URL", "http://127.0.0.1:8000"),
+        metavar="URL",
+        help="Companion to update startup_status on (default: $COMPANION_URL or http://127.0.0.1:8000)",
+    )
+    parser.add_argument(
+        "--no-companion",
+        action="store_true",
+        help="Don't set Companion custom variables",
+    )
+    parser.add_argument(
+        "--power-off",
+        action="store_true",
+        default=os.environ.get("SHUTDOWN_REMOTE", "no") == "yes",
+        help="shutdown: also power off remote machines (default: on if SHUTDOWN_REMOTE=yes)",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Print the steps and their dependencies without running anything",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    probe = load_script("device-probe.py", "device_probe")
+    conv = probe.load_converter()
+    config_dir = Path(args.config_dir)
+    params_path = args.params or str(config_dir / "parameters.yaml")
+
+    machines, apps, devices, ssh_settings = resolve_plan_inputs(probe, conv, config_dir, params_path)
+    ssh_user = os.environ.get("SSH_USER") or ssh_settings.get("username") or "tech"
+    ssh_port = int(ssh_settings.get("port") or 22)
+    ssh = SshSessions(ssh_user, ssh_port)
+
+    if args.sequence == "startup":
+        steps = startup_plan(machines, apps, devices, ssh, probe, ssh_port)
+    else:
+        steps = shutdown_plan(machines, apps, ssh, probe, ssh_port, args.power_off)
+
+    if args.plan:
+        print_plan(steps)
+        return
+
+    status = RunStatus(
+        args.sequence,
+        args.service or default_service(),
+        args.status_file,
+        None if args.no_companion else args.companion,
+    )
+    ok = asyncio.run(orchestrate(args, steps, ssh, status))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,10 @@
 # NOTE: Companion has a 20-second timeout for shell commands.
 # Critical operations happen first; power-off is backgrounded.
 #
+# With Python + PyYAML installed, this hands off to service-orchestrator.py,
+# which takes machines and IPs from config/parameters.yaml (PP_HOST and
+# OBS_HOST below are only used by the fallback).
+#
 # Usage:
 #   ./scripts/shutdown-graceful.sh
 #
@@ -32,6 +36,22 @@ SHUTDOWN_REMOTE="${SHUTDOWN_REMOTE:-no}"
 echo "[shutdown] Starting graceful shutdown sequence..."
 echo "[shutdown] Note: TF1 scene save and OBS stop handled by Companion actions"
 
+# --- Dependency-graph orchestrator ---
+# service-orchestrator.py waits until each app has actually quit before
+# powering off its machine, and sets startup_status back to READY. It runs in
+# the background because it can take longer than Companion's 20-second timeout.
+# Without Python/PyYAML, fall back to the fire-and-forget sequence below.
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+if command -v python3 > /dev/null 2>&1 && python3 -c "import yaml" 2> /dev/null; then
+    LOG_DIR="$SCRIPT_DIR/../output"
+    mkdir -p "$LOG_DIR"
+    echo "[shutdown] Handing off to service-orchestrator.py (log: output/service-orchestrator.log)"
+    nohup python3 "$SCRIPT_DIR/service-orchestrator.py" shutdown \
+        >> "$LOG_DIR/service-orchestrator.log" 2>&1 &
+    echo "[shutdown] Remote shutdown: $SHUTDOWN_REMOTE"
+    exit 0
+fi
+
 # --- Quit ProPresenter ---
 quit_propresenter() {
     if [[ "$PP_HOST" == "localhost" || "$PP_HOST" == "127.0.0.1" ]]; then
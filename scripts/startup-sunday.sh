@@ -10,6 +10,10 @@
 # NOTE: Companion has a 20-second timeout for shell commands.
 # Long-running tasks should be backgrounded.
 #
+# With Python + PyYAML installed, this hands off to service-orchestrator.py,
+# which takes machines and IPs from config/parameters.yaml (PP_HOST and
+# OBS_HOST below are only used by the fallback).
+#
 # Usage:
 #   ./scripts/startup-sunday.sh
 #
@@ -38,6 +42,22 @@ echo "[startup] Starting Sunday startup sequence..."
 echo "[startup] Day of week: $DAY_OF_WEEK"
 echo "[startup] Service type: $SERVICE_TYPE"
 
+# --- Dependency-graph orchestrator ---
+# service-orchestrator.py waits until each app and device actually answers
+# and reports progress through the startup_status variable. It runs in the
+# background because it can take longer than Companion's 20-second timeout.
+# Without Python/PyYAML, fall back to the fire-and-forget sequence below.
+SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
+if command -v python3 > /dev/null 2>&1 && python3 -c "import yaml" 2> /dev/null; then
+    LOG_DIR="$SCRIPT_DIR/../output"
+    mkdir -p "$LOG_DIR"
+    echo "[startup] Handing off to service-orchestrator.py (log: output/service-orchestrator.log)"
+    nohup python3 "$SCRIPT_DIR/service-orchestrator.py" startup --service "$SERVICE_TYPE" \
+        >> "$LOG_DIR/service-orchestrator.log" 2>&1 &
+    echo "[startup] Status shows COMPLETE once every system answers."
+    exit 0
+fi
+
 # --- Launch ProPresenter ---
 launch_propresenter() {
     if [[ "$PP_HOST" == "localhost" || "$PP_HOST" == "127.0.0.1" ]]; then
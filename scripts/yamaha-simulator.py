@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+"""
+Yamaha TF RCP Simulator / Yamaha TF RCPシミュレーター
+=====================================================
+A local stand-in for the Yamaha TF1 mixer that speaks the RCP text protocol
+(Remote Control Protocol, TCP 49280), so Companion buttons, device-monitor.py
+and rcp-load-test.py can be exercised without the mixer on the desk.
+
+It keeps the state of every parameter the converter's Yamaha actions address
+(_yamaha_resolve_action and MODULE_ACTION_MAP["yamaha-rcp"]):
+
+    MIXER:Current/{InCh,StInCh,FxRtnCh,St,Mix,DCA}/Fader/On     0 = muted, 1 = on
+    MIXER:Current/{InCh,StInCh,FxRtnCh,St,Mix,DCA}/Fader/Level  1/100 dB, -32768 = -inf
+    MIXER:Current/AuxCh/Fader/On, .../Level                     as the converter names aux buses
+    MIXER:Current/MuteMaster/On                                 mute groups 1-6
+    MIXER:Lib/Bank/Scene/Recall, .../Store                      scene number
+
+Commands and replies follow the mixer's format, one per line:
+
+    set MIXER:Current/InCh/Fader/On 2 0 0   ->  OK set MIXER:Current/InCh/Fader/On 2 0 0
+    get MIXER:Current/InCh/Fader/On 2 0     ->  OK get MIXER:Current/InCh/Fader/On 2 0 0
+    ssrecall_ex scene_a 3                   ->  OK ssrecall_ex scene_a 3
+    ssupdate_ex scene_a 3                   ->  OK ssupdate_ex scene_a 3
+    devinfo productname                     ->  OK devinfo productname "TF1"
+
+Changes are pushed to every other connected client as NOTIFY lines, as the
+mixer does. Bad addresses, indexes and values get ERROR replies. --latency,
+--jitter and --drop add a processing delay and silently drop a fraction of
+commands, to see how Companion and the scripts behave on a slow or lossy link.
+
+Usage:
+    python3 scripts/yamaha-simulator.py                        # Listen on 127.0.0.1:49280
+    python3 scripts/yamaha-simulator.py --listen 0.0.0.0:49280 # Reachable from Companion on the LAN
+    python3 scripts/yamaha-simulator.py --latency 20 --jitter 10 --drop 0.01
+    python3 scripts/yamaha-simulator.py --verbose              # Log every command
+
+Point the yamaha connection at it with a connection_settings entry in
+parameters.yaml (or a --sites file) giving this machine's IP.
+
+Requirements:
+    None (standard library only)
+"""
+
+import argparse
+import asyncio
+import random
+import shlex
+import time
+
+DEFAULT_PORT = 49280
+PRODUCT_NAME = "TF1"
+
+LEVEL_MIN = -32768  # -inf
+LEVEL_MAX = 1000    # +10.00 dB
+SCENE_COUNT = 300   # scenes per bank (TF: banks A and B)
+SCENE_BANKS = ("scene_a", "scene_b")
+
+# Channel type -> number of channels (TF1, plus the converter's AuxCh)
+FADER_CHANNELS = {
+    "InCh": 40,
+    "StInCh": 2,
+    "FxRtnCh": 4,
+    "St": 1,
+    "Mix": 20,
+    "DCA": 8,
+    # The converter's name for the aux (monitor) buses, used by page 5. The
+    # TF console labels these buses AUX; whether RCP addresses them as AuxCh
+    # or Mix is an open question (open-questions.md), so both are accepted.
+    "AuxCh": 20,
+}
+
+
+class Parameter:
+    """One RCP address: X (channel) count, value range and initial value."""
+
+    __slots__ = ("count", "minimum", "maximum", "default")
+
+    def __init__(self, count, minimum, maximum, default):
+        self.count = count
+        self.minimum = minimum
+        self.maximum = maximum
+        self.default = default
+
+
+def tf1_parameters():
+    params = {}
+    for ch_type, count in FADER_CHANNELS.items():
+        params[f"MIXER:Current/{ch_type}/Fader/On"] = Parameter(count, 0, 1, 1)
+        params[f"MIXER:Current/{ch_type}/Fader/Level"] = Parameter(count, LEVEL_MIN, LEVEL_MAX, 0)
+    params["MIXER:Current/MuteMaster/On"] = Parameter(6, 0, 1, 0)
+    return params
+
+
+class RcpError(Exception):
+    """An ERROR reply: str(e) is the error name (e.g. UnknownAddress)."""
+
+
+class MixerState:
+    """Parameter values plus stored scenes."""
+
+    def __init__(self, parameters=None):
+        self.parameters = parameters or tf1_parameters()
+        self.values = {}
+        self.scenes = {}
+        self.current_scene = None
+
+    def _check(self, address, x, y):
+        param = self.parameters.get(address)
+        if param is None:
+            raise RcpError("UnknownAddress")
+        if not (0 <= x < param.count) or y != 0:
+            raise RcpError("InvalidArgument")
+        return param
+
+    def get(self, address, x, y):
+        param = self._check(address, x, y)
+        return self.values.get((address, x, y), param.default)
+
+    def set(self, address, x, y, value):
+        """Set a value; returns True if it changed."""
+        param = self._check(address, x, y)
+        if not (param.minimum <= value <= param.maximum):
+            raise RcpError("InvalidArgument")
+        key = (address, x, y)
+        changed = self.values.get(key, param.default) != value
+        self.values[key] = value
+        return changed
+
+    def store(self, bank, number):
+        self._check_scene(bank, number)
+        self.scenes[(bank, number)] = dict(self.values)
+
+    def recall(self, bank, number):
+        """Recall a scene; returns [(address, x, y, value)] that changed."""
+        self._check_scene(bank, number)
+        stored = self.scenes.get((bank, number), {})
+        changes = []
+        for key in set(self.values) | set(stored):
+            default = self.parameters[key[0]].default
+            old = self.values.get(key, default)
+            new = stored.get(key, default)
+            if old != new:
+                changes.append(key + (new,))
+        self.values = dict(stored)
+        self.current_scene = (bank, number)
+        return changes
+
+    @staticmethod
+    def _check_scene(bank, number):
+        if bank not in SCENE_BANKS or not (0 <= number <= SCENE_COUNT):
+            raise RcpError("InvalidArgument")
+
+
+class RcpSimulator:
+    """asyncio RCP server around a MixerState.
+
+    Each connection's commands are handled in order, after the injected
+    delay; dropped commands get no reply and change nothing.
+    """
+
+    def __init__(self, state=None, latency=0.0, jitter=0.0, drop=0.0, seed=None, verbose=False):
+        self.state = state or MixerState()
+        self.latency = latency
+        self.jitter = jitter
+        self.drop = drop
+        self.random = random.Random(seed)
+        self.verbose = verbose
+        self.clients = set()
+        self.handlers = set()
+        self.commands = 0
+        self.dropped = 0
+        self.errors = 0
+        self.server = None
+
+    async def start(self, host="127.0.0.1", port=DEFAULT_PORT):
+        self.server = await asyncio.start_server(self._serve_client, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        for writer in list(self.clients):
+            writer.close()
+        # Closing a transport ends that handler's readline(); wait for them
+        # so none is left pending when the event loop shuts down
+        await asyncio.gather(*self.handlers, return_exceptions=True)
+
+    def _notify(self, sender, line):
+        data = f"NOTIFY {line}\n".encode("utf-8")
+        for writer in self.clients:
+            if writer is not sender:
+                writer.write(data)
+
+    async def _serve_client(self, reader, writer):
+        self.clients.add(writer)
+        self.handlers.add(asyncio.current_task())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode("utf-8", "replace").strip()
+                if not command:
+                    continue
+                self.commands += 1
+                delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if self.drop and self.random.random() < self.drop:
+                    self.dropped += 1
+                    if self.verbose:
+                        print(f"  (dropped) {command}")
+                    continue
+                reply, notify = self.handle(command)
+                if reply.startswith("ERROR"):
+                    self.errors += 1
+                if self.verbose:
+                    print(f"  {command}  ->  {reply}")
+                writer.write(f"{reply}\n".encode("utf-8"))
+                for note in notify:
+                    self._notify(writer, note)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.clients.discard(writer)
+            self.handlers.discard(asyncio.current_task())
+            writer.close()
+
+    def handle(self, command):
+        """Return (reply line, [lines to NOTIFY other clients]) for one command."""
+        try:
+            words = shlex.split(command)
+        except ValueError:
+            words = command.split()
+        name = words[0]
+        try:
+            if name in ("set", "get"):
+                return self._parameter(name, words)
+            if name in ("ssrecall_ex", "ssupdate_ex"):
+                bank, number = self._scene_args(words)
+                return self._scene(name, bank, number)
+            if name == "devinfo":
+                return self._devinfo(words)
+            if name == "scpmode":
+                return f"OK {command}", []
+            raise RcpError("UnknownCommand")
+        except RcpError as e:
+            return f"ERROR {name} {e}", []
+
+    def _parameter(self, name, words):
+        expected = 5 if name == "set" else 4
+        if len(words) != expected:
+            raise RcpError("WrongFormat")
+        address = words[1]
+        try:
+            x, y = int(words[2]), int(words[3])
+            value = int(words[4]) if name == "set" else None
+        except ValueError:
+            raise RcpError("WrongFormat") from None
+
+        # Scenes can also be addressed as parameters, as the converter's
+        # scene_recall/scene_store definitionIds do
+        if address.startswith("MIXER:Lib/Bank/Scene/") and name == "set":
+            kind = {"Recall": "ssrecall_ex", "Store": "ssupdate_ex"}.get(address.rsplit("/", 1)[1])
+            if kind is None:
+                raise RcpError("UnknownAddress")
+            _reply, notify = self._scene(kind, SCENE_BANKS[0], value)
+            return f"OK set {address} {x} {y} {value}", notify
+
+        if name == "get":
+            value = self.state.get(address, x, y)
+            return f"OK get {address} {x} {y} {value}", []
+        changed = self.state.set(address, x, y, value)
+        line = f"set {address} {x} {y} {value}"
+        return f"OK {line}", [line] if changed else []
+
+    @staticmethod
+    def _scene_args(words):
+        if len(words) != 3:
+            raise RcpError("WrongFormat")
+        try:
+            return words[1], int(words[2])
+        except ValueError:
+            raise RcpError("WrongFormat") from None
+
+    def _scene(self, name, bank, number):
+        if name == "ssupdate_ex":
+            self.state.store(bank, number)
+            return f"OK ssupdate_ex {bank} {number}", []
+        changes = self.state.recall(bank, number)
+        notify = [f"set {a} {x} {y} {v}" for a, x, y, v in sorted(changes)]
+        notify.append(f"sscurrent_ex {bank} {number}")
+        return f"OK ssrecall_ex {bank} {number}", notify
+
+    @staticmethod
+    def _devinfo(words):
+        if len(words) != 2:
+            raise RcpError("WrongFormat")
+        info = {"productname": f'"{PRODUCT_NAME}"', "version": '"V4.10"'}
+        if words[1] not in info:
+            raise RcpError("UnknownAddress")
+        return f"OK devinfo {words[1]} {info[words[1]]}", []
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Local Yamaha TF RCP simulator (TCP 49280) for testing without the mixer.\n"
+        "ミキサーなしでテストするためのYamaha TF RCPシミュレーター。",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument(
+        "--listen",
+        default=f"127.0.0.1:{DEFAULT_PORT}",
+        help=f"Address to listen on (default: 127.0.0.1:{DEFAULT_PORT})",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="Delay before each reply, in ms (default: 0)",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        help="Random +/- variation of the delay, in ms (default: 0)",
+    )
+    parser.add_argument(
+        "--drop",
+        type=float,
+        default=0.0,
+        help="Fraction of commands silently dropped, 0-1 (default: 0)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Random seed for jitter and drops (repeatable runs)",
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Log every command and reply",
+    )
+    args = parser.parse_args()
+    if not 0.0 <= args.drop <= 1.0:
+        parser.error("--drop must be between 0 and 1")
+    return args
+
+
+async def run(args):
+    simulator = RcpSimulator(latency=args.latency / 1000, jitter=args.jitter / 1000,
+                             drop=args.drop, seed=args.seed, verbose=args.verbose)
+    host, port = await simulator.start(*parse_address(args.listen))
+    print(f"Yamaha {PRODUCT_NAME} RCP simulator listening on {host}:{port} / シミュレーター起動")
+    if args.latency or args.jitter or args.drop:
+        print(f"  latency {args.latency:g} ms ± {args.jitter:g} ms, drop {args.drop:.1%}")
+    start = time.monotonic()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        elapsed = time.monotonic() - start
+        print(f"\n{simulator.commands} command(s) in {elapsed:.0f} s, "
+              f"{simulator.errors} error(s), {simulator.dropped} dropped")
+        await simulator.close()
+
+
+def main():
+    args = parse_args()
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        print("Simulator stopped. / シミュレーターを終了しました。")
+
+
+if __name__ == "__main__":
+    main()
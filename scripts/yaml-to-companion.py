@@ -10,6 +10,19 @@ Usage:
     python3 scripts/yaml-to-companion.py --validate-only        # Validate only
     python3 scripts/yaml-to-companion.py --dump-sample          # Generate sample for comparison
     python3 scripts/yaml-to-companion.py --output path/to/file  # Custom output path
+    python3 scripts/yaml-to-companion.py --no-cache             # Force a full rebuild
+    python3 scripts/yaml-to-companion.py --cache-stats          # Report cache hit rates
+    python3 scripts/yaml-to-companion.py --deterministic-ids    # Reproducible IDs (UUIDv5)
+    python3 scripts/yaml-to-companion.py --jobs 4               # Build pages in 4 processes
+    python3 scripts/yaml-to-companion.py --sites config/sites   # One config per site params file
+    python3 scripts/yaml-to-companion.py --watch                # Rebuild on every config change
+    python3 scripts/yaml-to-companion.py --serve                # Converter service (Unix socket)
+    python3 scripts/yaml-to-companion.py --profile              # Phase/page timing + metrics JSON
+    python3 scripts/yaml-to-companion.py --partial              # Also export only the changed pages
+    python3 scripts/yaml-to-companion.py --serializer compact   # Smaller file, no indentation
+    python3 scripts/yaml-to-companion.py --compress gzip        # Plus a .gz archive copy
+    python3 scripts/yaml-to-companion.py --impact obs           # Buttons that need the OBS connection
+    python3 scripts/yaml-to-companion.py --uses yamaha:InCh/003 # Buttons using one mixer channel
 
 Requirements:
     PyYAML >= 6.0  (install with: pip install pyyaml)
@@ -28,10 +41,25 @@ are isolated in FIELD_MAP and the mapping functions for easy tuning.
 """
 
 import argparse
+import cProfile
+import ctypes
+import gzip
+import hashlib
+import io
 import json
 import os
+import pickle
+import re
+import select
+import socket
+import struct
 import sys
+import time
+import tracemalloc
 import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager, redirect_stderr, redirect_stdout
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 try:
@@ -43,14 +71,40 @@ except ImportError:
         "エラー: PyYAMLが必要です。pip install pyyaml でインストールしてください。"
     )
 
+# Prefer the libyaml-backed loader; fall back to the pure-Python one when
+# PyYAML was built without libyaml. Both accept the same safe YAML subset.
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
+
+# Optional output backends (--serializer orjson, --compress zstd).
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
 # =============================================================================
 # SECTION 1: Constants & Configuration
 # =============================================================================
 
 FORMAT_VERSION = 6
 EXPORT_TYPE = "full"
+PAGE_EXPORT_TYPE = "page"
 COMPANION_BUILD = "yaml-converter-v1.0"
 
+# Bump when the layout of the on-disk build cache changes.
+CACHE_VERSION = 4
+CACHE_DIRNAME = ".companion-cache"
+
+# Namespace for --deterministic-ids: every generated ID is a UUIDv5 of its
+# structural path (page/row/col/step/action index, or connection id).
+ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "churchSupport/yaml-to-companion")
+
 GRID_ROWS = 4
 GRID_COLS = 8
 
@@ -487,10 +541,214 @@ FEEDBACK_OPTION_MAP = {
 }
 
 
+# =============================================================================
+# SECTION 1b: Intermediate Representation
+# =============================================================================
+# Validated page YAML is turned into a small typed model before anything is
+# built: Page (a sparse grid of Buttons), Button, Step, Action, Feedback and
+# Style. Defaults and unit conversions (text lines, font size, colors,
+# feedback styles) are applied once, here, and connection/action/feedback
+# names are interned. Every object carries a content key (position and notes
+# are not part of it), which is what the resolver memo (SECTION 2b) and the
+# control dedupe (SECTION 2c) look buttons up by. Treat the objects, and the
+# options dicts they hold, as read-only.
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class Style:
+    """Button appearance in Companion units (text, size in pt, RGB ints)."""
+
+    __slots__ = ("text", "size", "color", "bgcolor", "key")
+
+    def __init__(self, text="", size=14, color=0xFFFFFF, bgcolor=0):
+        self.text = text
+        self.size = size
+        self.color = color
+        self.bgcolor = bgcolor
+        self.key = (_freeze(text), size, color, bgcolor)
+
+    @classmethod
+    def from_yaml(cls, yaml_style):
+        yaml_style = yaml_style or {}
+        return cls(
+            build_button_text(yaml_style),
+            font_size_to_companion(yaml_style.get("font_size", "14pt")),
+            hex_to_companion_color(yaml_style.get("color_text", "#FFFFFF")),
+            hex_to_companion_color(yaml_style.get("color_bg", "#000000")),
+        )
+
+
+class Action:
+    """One press action: connection id, YAML action name and options."""
+
+    __slots__ = ("connection", "name", "options", "key")
+
+    def __init__(self, connection, name, options):
+        self.connection = _intern(connection)
+        self.name = _intern(name)
+        self.options = options
+        self.key = (self.connection, self.name, _freeze(options))
+
+    @classmethod
+    def from_yaml(cls, yaml_action):
+        return cls(
+            yaml_action.get("connection", "internal"),
+            yaml_action.get("action", ""),
+            yaml_action.get("options", {}) or {},
+        )
+
+
+class Feedback:
+    """One feedback, with its style override already in Companion units."""
+
+    __slots__ = ("connection", "name", "options", "style", "inverted", "key")
+
+    def __init__(self, connection, name, options, style=(), inverted=False):
+        self.connection = _intern(connection)
+        self.name = _intern(name)
+        self.options = options
+        self.style = style  # ((companion field, value), ...)
+        self.inverted = inverted
+        self.key = (self.connection, self.name, _freeze(options), style, inverted)
+
+    @classmethod
+    def from_yaml(cls, yaml_feedback):
+        style, inverted = build_feedback_style(yaml_feedback)
+        return cls(
+            yaml_feedback.get("connection", "internal"),
+            yaml_feedback.get("feedback", ""),
+            yaml_feedback.get("options", {}) or {},
+            tuple(style.items()),
+            inverted,
+        )
+
+
+class Step:
+    """A named list of press actions."""
+
+    __slots__ = ("name", "actions", "key")
+
+    def __init__(self, name, actions):
+        self.name = name
+        self.actions = tuple(actions)
+        self.key = (name, tuple(a.key for a in self.actions))
+
+    @classmethod
+    def from_yaml(cls, name, yaml_action_list):
+        press = _mapping(yaml_action_list).get("press") or ()
+        return cls(name, [Action.from_yaml(a) for a in press])
+
+
+class Button:
+    """A button without its position (the Page grid holds that).
+
+    Equal buttons build identical controls, so Button is hashable and
+    compares by content. Hashing fails with TypeError for option values
+    that cannot be frozen (see _freeze()).
+    """
+
+    __slots__ = ("style", "feedbacks", "steps", "timeout", "key", "_hash")
+
+    def __init__(self, style, feedbacks=(), steps=(), timeout=None):
+        self.style = style
+        self.feedbacks = tuple(feedbacks)
+        self.steps = tuple(steps)
+        self.timeout = timeout  # step 2 auto-progress (multi-step buttons only)
+        self.key = (
+            style.key,
+            tuple(f.key for f in self.feedbacks),
+            tuple(s.key for s in self.steps),
+            _freeze(timeout),
+        )
+        self._hash = None
+
+    def __eq__(self, other):
+        return isinstance(other, Button) and self.key == other.key
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(self.key)
+        return self._hash
+
+    @property
+    def multistep(self):
+        return len(self.steps) > 1
+
+    @classmethod
+    def from_yaml(cls, yaml_button):
+        steps = [Step.from_yaml("", yaml_button.get("actions"))]
+        timeout = None
+        if yaml_button.get("step_count", 1) >= 2:
+            steps.append(Step.from_yaml("Confirm", yaml_button.get("step_2_actions")))
+            timeout = yaml_button.get("step_2_timeout_ms", 5000)
+        return cls(
+            Style.from_yaml(yaml_button.get("style")),
+            [Feedback.from_yaml(f) for f in yaml_button.get("feedbacks") or ()],
+            steps,
+            timeout,
+        )
+
+
+def _as_button(button):
+    """Accept a Button or a YAML button dict."""
+    return button if isinstance(button, Button) else Button.from_yaml(button)
+
+
+class Page:
+    """Page number, name and a sparse grid: {row: {col: Button}}, in YAML order."""
+
+    __slots__ = ("number", "name", "grid")
+
+    def __init__(self, number=0, name="Unnamed"):
+        self.number = number
+        self.name = name
+        self.grid = {}
+
+    def add(self, yaml_button, row, col):
+        """Place a (validated) YAML button at row, col; usable as validate_page()'s on_button."""
+        self.grid.setdefault(row, {})[col] = Button.from_yaml(yaml_button)
+
+    def __len__(self):
+        return sum(len(cols) for cols in self.grid.values())
+
+    @classmethod
+    def from_meta(cls, yaml_page_data):
+        """An empty Page carrying the page: number and name."""
+        meta = _mapping(_mapping(yaml_page_data).get("page"))
+        return cls(meta.get("number", 0), meta.get("name", "Unnamed"))
+
+    @classmethod
+    def from_yaml(cls, yaml_page_data):
+        page = cls.from_meta(yaml_page_data)
+        for button in yaml_page_data.get("buttons", []):
+            pos = button.get("position", [0, 0])
+            page.add(button, pos[0], pos[1])
+        return page
+
+
 # =============================================================================
 # SECTION 2: Mapping Layer
 # =============================================================================
 
+def make_id(id_path=None):
+    """Return a new Companion ID string.
+
+    With id_path (a tuple describing where the ID lives, e.g.
+    ("page", 1, 0, 3, "step", 0, "action", 2)) the ID is a UUIDv5 of that
+    path, so rebuilding unchanged YAML yields identical IDs. Without it, a
+    random UUIDv4 is returned.
+    """
+    if id_path is None:
+        return str(uuid.uuid4())
+    return str(uuid.uuid5(ID_NAMESPACE, "/".join(str(p) for p in id_path)))
+
+
+def _child_id_path(id_path, *parts):
+    return None if id_path is None else tuple(id_path) + parts
+
+
 def hex_to_companion_color(hex_str):
     """Convert '#RRGGBB' hex color to Companion decimal integer.
 
@@ -534,23 +792,16 @@ def build_button_text(yaml_style):
     return top or bottom
 
 
-def build_button_style(yaml_style):
-    """Map YAML style block to Companion ButtonStyleProperties."""
-    text = build_button_text(yaml_style)
+def build_button_style(style):
+    """Map a Style (see Style.from_yaml()) to Companion ButtonStyleProperties."""
     return {
-        FIELD_MAP["style_text"]: text,
-        "textExpression": text_contains_expression(text),
-        FIELD_MAP["style_size"]: font_size_to_companion(
-            yaml_style.get("font_size", "14pt")
-        ),
+        FIELD_MAP["style_text"]: style.text,
+        "textExpression": text_contains_expression(style.text),
+        FIELD_MAP["style_size"]: style.size,
         "alignment": "center:center",
         "pngalignment": "center:center",
-        FIELD_MAP["style_color"]: hex_to_companion_color(
-            yaml_style.get("color_text", "#FFFFFF")
-        ),
-        FIELD_MAP["style_bgcolor"]: hex_to_companion_color(
-            yaml_style.get("color_bg", "#000000")
-        ),
+        FIELD_MAP["style_color"]: style.color,
+        FIELD_MAP["style_bgcolor"]: style.bgcolor,
         "show_topbar": "default",
         "png64": None,
     }
@@ -644,68 +895,18 @@ def _atem_resolve_options(yaml_options):
     return result
 
 
-def build_action(yaml_action, connection_map, connection_module_map=None):
-    """Map a single YAML action to a Companion ActionEntityModel.
+def build_action(action, connection_map, connection_module_map=None, id_path=None):
+    """Map a single Action to a Companion ActionEntityModel.
 
     Uses MODULE_ACTION_MAP to translate YAML symbolic action names
-    into actual Companion module definitionIds with correct options.
+    into actual Companion module definitionIds with correct options
+    (via the compiled ACTION_RESOLVERS table, memoized per run).
+    id_path, if given, makes the action ID deterministic (see make_id).
     """
-    conn_name = yaml_action.get("connection", "internal")
-    action_name = yaml_action.get("action", "")
-    yaml_options = yaml_action.get("options", {}) or {}
-
-    if conn_name == "internal":
-        conn_id = "internal"
-        def_id = INTERNAL_ACTION_MAP.get(action_name, action_name)
-        options = _remap_options(yaml_options, INTERNAL_OPTION_MAP.get(action_name))
-
-        # Special: connection_disable/enable both map to instance_control
-        # with different 'enable' values
-        if action_name == "connection_disable":
-            # Resolve the friendly connection name to UUID
-            target = options.get("instance_id", "")
-            if target in connection_map:
-                options["instance_id"] = connection_map[target]
-            options["enable"] = "false"
-        elif action_name == "connection_enable":
-            target = options.get("instance_id", "")
-            if target in connection_map:
-                options["instance_id"] = connection_map[target]
-            options["enable"] = "true"
-    else:
-        conn_id = connection_map.get(conn_name, conn_name)
-
-        # Look up the module for this connection
-        module = (connection_module_map or {}).get(conn_name, "")
-        module_actions = MODULE_ACTION_MAP.get(module, {})
-        action_def = module_actions.get(action_name)
-
-        if action_def:
-            def_id = action_def["definitionId"]
-            # Start with default options, then merge YAML options on top
-            options = dict(action_def.get("default_options", {}))
-
-            # Special handling per module
-            if module == "yamaha-rcp" and def_id is None:
-                def_id, options = _yamaha_resolve_action(action_name, yaml_options)
-            elif module == "bmd-atem":
-                atem_opts = _atem_resolve_options(yaml_options)
-                options.update(atem_opts)
-            elif module == "obs-studio":
-                obs_map = MODULE_OPTION_MAP.get("obs-studio", {})
-                remapped = _remap_options(yaml_options, obs_map)
-                options.update(remapped)
-            else:
-                # Generic: merge YAML options directly
-                options.update(yaml_options)
-        else:
-            # No mapping found — pass through as-is (may need manual fix)
-            def_id = action_name
-            options = dict(yaml_options)
-
+    conn_id, def_id, options = get_resolver(connection_map, connection_module_map).action(action)
     return {
         FIELD_MAP["action_type_key"]: FIELD_MAP["action_type_value"],
-        FIELD_MAP["action_id_key"]: str(uuid.uuid4()),
+        FIELD_MAP["action_id_key"]: make_id(id_path),
         FIELD_MAP["action_def_key"]: def_id,
         FIELD_MAP["action_conn_key"]: conn_id,
         "headline": None,
@@ -778,76 +979,265 @@ def _yamaha_resolve_feedback(feedback_name, yaml_options):
     return def_id, options
 
 
-def build_feedback(yaml_feedback, connection_map, connection_module_map=None):
-    """Map a YAML feedback to a Companion FeedbackEntityModel.
+def build_feedback(feedback, connection_map, connection_module_map=None, id_path=None):
+    """Map a Feedback to a Companion FeedbackEntityModel.
 
     Uses MODULE_FEEDBACK_MAP to translate YAML symbolic feedback names
-    into actual Companion module feedback IDs.
+    into actual Companion module feedback IDs (via the compiled
+    FEEDBACK_RESOLVERS table, memoized per run).
+    id_path, if given, makes the feedback ID deterministic (see make_id).
     """
-    conn_name = yaml_feedback.get("connection", "internal")
-    feedback_name = yaml_feedback.get("feedback", "")
-    yaml_options = yaml_feedback.get("options", {}) or {}
-
-    # Check MODULE_FEEDBACK_MAP for this feedback name
-    fb_mapping = MODULE_FEEDBACK_MAP.get(feedback_name)
-
-    if fb_mapping and fb_mapping.get("redirect_to_internal"):
-        # connection_status -> internal instance_status
-        conn_id = "internal"
-        def_id = fb_mapping["definitionId"]
-        # Set instance_id to the UUID of the original connection
-        options = {"instance_id": connection_map.get(conn_name, conn_name)}
-    elif fb_mapping:
-        # Module-specific feedback remap
-        if conn_name == "internal":
-            conn_id = "internal"
-        else:
-            conn_id = connection_map.get(conn_name, conn_name)
-
-        module = (connection_module_map or {}).get(conn_name, "")
-
-        if fb_mapping.get("definitionId") is None and module == "yamaha-rcp":
-            def_id, options = _yamaha_resolve_feedback(feedback_name, yaml_options)
-        else:
-            def_id = fb_mapping["definitionId"]
-            # Remap options if needed
-            fb_opt_map = FEEDBACK_OPTION_MAP.get(module, {})
-            options = _remap_options(yaml_options, fb_opt_map)
-
-            # ATEM: convert "black" input to 0
-            if module == "bmd-atem" and "input" in options:
-                if str(options["input"]).lower() == "black":
-                    options["input"] = 0
-    else:
-        # No mapping — pass through as-is
-        if conn_name == "internal":
-            conn_id = "internal"
-        else:
-            conn_id = connection_map.get(conn_name, conn_name)
-        def_id = feedback_name
-        options = dict(yaml_options)
-
-    style, is_inverted = build_feedback_style(yaml_feedback)
+    conn_id, def_id, options = get_resolver(connection_map, connection_module_map).feedback(feedback)
 
     return {
         FIELD_MAP["action_type_key"]: FIELD_MAP["feedback_type_value"],
-        FIELD_MAP["action_id_key"]: str(uuid.uuid4()),
+        FIELD_MAP["action_id_key"]: make_id(id_path),
         FIELD_MAP["action_def_key"]: def_id,
         FIELD_MAP["action_conn_key"]: conn_id,
         "headline": None,
         FIELD_MAP["action_opts_key"]: options,
         "disabled": False,
         "upgradeIndex": None,
-        "isInverted": is_inverted,
-        "style": style,
+        "isInverted": feedback.inverted,
+        "style": dict(feedback.style),
     }
 
 
-def build_step(yaml_press_actions, connection_map, connection_module_map=None, step_name=""):
-    """Build a Companion step object from a list of press actions."""
+# =============================================================================
+# SECTION 2b: Compiled Action/Feedback Resolvers
+# =============================================================================
+# The mapping tables above are compiled once, at import, into dispatch tables
+# keyed by (module, YAML name). Each resolver is a closure that has already
+# looked up its definitionId, default options and option remaps, and has the
+# signature resolver(conn_name, yaml_options, connection_map) and returns
+# (connectionId, definitionId, options). Actions on the "internal" connection
+# use "internal" as their module key. Unknown combinations fall back to the
+# pass-through resolvers.
+
+def _resolve_conn_id(conn_name, connection_map):
+    if conn_name == "internal":
+        return "internal"
+    return connection_map.get(conn_name, conn_name)
+
+
+def _make_internal_action_resolver(action_name):
+    def_id = INTERNAL_ACTION_MAP.get(action_name, action_name)
+    opt_map = INTERNAL_OPTION_MAP.get(action_name)
+    # connection_disable/enable both map to instance_control with different
+    # 'enable' values, and take a friendly connection name to resolve to UUID
+    enable = {"connection_disable": "false", "connection_enable": "true"}.get(action_name)
+
+    def resolve(conn_name, yaml_options, connection_map):
+        options = _remap_options(yaml_options, opt_map)
+        if enable is not None:
+            target = options.get("instance_id", "")
+            if target in connection_map:
+                options["instance_id"] = connection_map[target]
+            options["enable"] = enable
+        return "internal", def_id, options
+
+    return resolve
+
+
+def _make_module_action_resolver(module, action_name, action_def):
+    def_id = action_def["definitionId"]
+    defaults = action_def.get("default_options", {})
+
+    if module == "yamaha-rcp" and def_id is None:
+        def merge(yaml_options):
+            return _yamaha_resolve_action(action_name, yaml_options)
+    elif module == "bmd-atem":
+        def merge(yaml_options):
+            options = dict(defaults)
+            options.update(_atem_resolve_options(yaml_options))
+            return def_id, options
+    elif module == "obs-studio":
+        obs_map = MODULE_OPTION_MAP.get("obs-studio", {})
+
+        def merge(yaml_options):
+            options = dict(defaults)
+            options.update(_remap_options(yaml_options, obs_map))
+            return def_id, options
+    else:
+        # Generic: merge YAML options directly over the defaults
+        def merge(yaml_options):
+            options = dict(defaults)
+            options.update(yaml_options)
+            return def_id, options
+
+    def resolve(conn_name, yaml_options, connection_map):
+        resolved_id, options = merge(yaml_options)
+        return connection_map.get(conn_name, conn_name), resolved_id, options
+
+    return resolve
+
+
+def _make_action_passthrough(action_name):
+    """No mapping found — pass through as-is (may need manual fix)."""
+    def resolve(conn_name, yaml_options, connection_map):
+        return connection_map.get(conn_name, conn_name), action_name, dict(yaml_options)
+
+    return resolve
+
+
+def _make_feedback_resolver(module, feedback_name, fb_mapping):
+    if fb_mapping.get("redirect_to_internal"):
+        # connection_status -> internal instance_status, pointed at the UUID
+        # of the original connection
+        def_id = fb_mapping["definitionId"]
+
+        def resolve(conn_name, yaml_options, connection_map):
+            return "internal", def_id, {"instance_id": connection_map.get(conn_name, conn_name)}
+
+        return resolve
+
+    if fb_mapping.get("definitionId") is None and module == "yamaha-rcp":
+        def resolve(conn_name, yaml_options, connection_map):
+            def_id, options = _yamaha_resolve_feedback(feedback_name, yaml_options)
+            return _resolve_conn_id(conn_name, connection_map), def_id, options
+
+        return resolve
+
+    def_id = fb_mapping["definitionId"]
+    fb_opt_map = FEEDBACK_OPTION_MAP.get(module, {})
+    atem_black = module == "bmd-atem"
+
+    def resolve(conn_name, yaml_options, connection_map):
+        options = _remap_options(yaml_options, fb_opt_map)
+        # ATEM: convert "black" input to 0
+        if atem_black and "input" in options and str(options["input"]).lower() == "black":
+            options["input"] = 0
+        return _resolve_conn_id(conn_name, connection_map), def_id, options
+
+    return resolve
+
+
+def _make_feedback_passthrough(feedback_name):
+    """No mapping — pass through as-is."""
+    def resolve(conn_name, yaml_options, connection_map):
+        return _resolve_conn_id(conn_name, connection_map), feedback_name, dict(yaml_options)
+
+    return resolve
+
+
+def compile_resolvers():
+    """Compile the mapping tables into (module, name) -> resolver dispatch tables."""
+    actions = {}
+    for action_name in INTERNAL_ACTION_MAP:
+        actions[("internal", action_name)] = _make_internal_action_resolver(action_name)
+    for module, module_actions in MODULE_ACTION_MAP.items():
+        for action_name, action_def in module_actions.items():
+            actions[(module, action_name)] = _make_module_action_resolver(
+                module, action_name, action_def
+            )
+
+    # Feedbacks are mapped by name; the connection's module (or "" when it
+    # has none) only changes option handling, so compile every combination.
+    feedbacks = {}
+    for feedback_name, fb_mapping in MODULE_FEEDBACK_MAP.items():
+        for module in list(MODULE_CONFIGS) + [""]:
+            feedbacks[(module, feedback_name)] = _make_feedback_resolver(
+                module, feedback_name, fb_mapping
+            )
+    return actions, feedbacks
+
+
+ACTION_RESOLVERS, FEEDBACK_RESOLVERS = compile_resolvers()
+
+
+def _freeze(value):
+    """Hashable, order- and type-preserving key for YAML option values."""
+    if isinstance(value, dict):
+        return ("dict",) + tuple((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return ("list",) + tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return ("set",) + tuple(sorted((_freeze(v) for v in value), key=repr))
+    return (type(value).__name__, value)
+
+
+class EntityResolver:
+    """Resolves Actions/Feedbacks for one set of connection maps.
+
+    Results are memoized by their key (connection, name, options), so an action that
+    appears on many buttons (set_page, ATEM program_input, Yamaha mutes) is
+    resolved once per run. Each call returns a fresh options dict.
+    """
+
+    def __init__(self, connection_map, connection_module_map=None):
+        self.connection_map = connection_map
+        self.connection_module_map = connection_module_map or {}
+        self._actions = {}
+        self._feedbacks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, memo, table, passthrough, entity, module):
+        resolved = memo.get(entity.key)
+        if resolved is None:
+            self.misses += 1
+            conn_name = entity.connection
+            resolver = table.get((module(conn_name), entity.name)) or passthrough(entity.name)
+            resolved = resolver(conn_name, entity.options, self.connection_map)
+            memo[entity.key] = resolved
+        else:
+            self.hits += 1
+        conn_id, def_id, options = resolved
+        return conn_id, def_id, dict(options)
+
+    def _action_module(self, conn_name):
+        if conn_name == "internal":
+            return "internal"
+        return self.connection_module_map.get(conn_name, "")
+
+    def _feedback_module(self, conn_name):
+        return self.connection_module_map.get(conn_name, "")
+
+    def action(self, action):
+        """Return (connectionId, definitionId, options) for an Action."""
+        return self._lookup(
+            self._actions, ACTION_RESOLVERS, _make_action_passthrough,
+            action, self._action_module,
+        )
+
+    def feedback(self, feedback):
+        """Return (connectionId, definitionId, options) for a Feedback."""
+        return self._lookup(
+            self._feedbacks, FEEDBACK_RESOLVERS, _make_feedback_passthrough,
+            feedback, self._feedback_module,
+        )
+
+
+# Single-slot resolver cache: builds pass the same connection_map dict for a
+# whole run (or site), so the memo lives exactly as long as those maps do.
+# The maps must not be mutated once building has started. The control cache
+# (SECTION 2c) shares the slot, since built controls embed connection UUIDs.
+_RESOLVER_SLOT = {}
+
+
+def get_resolver(connection_map, connection_module_map=None):
+    """Return the memoizing EntityResolver for these connection maps."""
+    resolver = _RESOLVER_SLOT.get("resolver")
+    if (resolver is None or resolver.connection_map is not connection_map
+            or _RESOLVER_SLOT.get("module_map") is not connection_module_map):
+        resolver = EntityResolver(connection_map, connection_module_map)
+        _RESOLVER_SLOT["resolver"] = resolver
+        _RESOLVER_SLOT["module_map"] = connection_module_map
+        _RESOLVER_SLOT["controls"] = ControlCache(connection_map, connection_module_map)
+    return resolver
+
+
+def get_control_cache(connection_map, connection_module_map=None):
+    """Return the ControlCache for these connection maps."""
+    get_resolver(connection_map, connection_module_map)
+    return _RESOLVER_SLOT["controls"]
+
+
+def build_step(step, connection_map, connection_module_map=None, id_path=None):
+    """Build a Companion step object from a Step."""
     actions = [
-        build_action(a, connection_map, connection_module_map)
-        for a in (yaml_press_actions or [])
+        build_action(a, connection_map, connection_module_map, _child_id_path(id_path, "action", i))
+        for i, a in enumerate(step.actions)
     ]
     return {
         "action_sets": {
@@ -856,43 +1246,37 @@ def build_step(yaml_press_actions, connection_map, connection_module_map=None, s
         },
         "options": {
             "runWhileHeld": [],
-            "name": step_name,
+            "name": step.name,
         },
     }
 
 
-def build_control(yaml_button, connection_map, connection_module_map=None):
-    """Build a complete Companion button control from a YAML button definition."""
-    style = build_button_style(yaml_button.get("style", {}))
+def build_control(button, connection_map, connection_module_map=None, id_path=None):
+    """Build a complete Companion button control from a Button (or YAML button dict).
+
+    id_path (e.g. ("page", 1, 0, 3)) makes every step/action/feedback ID
+    deterministic; None gives random IDs.
+    """
+    button = _as_button(button)
+    style = build_button_style(button.style)
     feedbacks = [
-        build_feedback(f, connection_map, connection_module_map)
-        for f in yaml_button.get("feedbacks", [])
+        build_feedback(f, connection_map, connection_module_map, _child_id_path(id_path, "feedback", i))
+        for i, f in enumerate(button.feedbacks)
     ]
 
-    step_count = yaml_button.get("step_count", 1)
-    is_multistep = step_count >= 2
-
-    # Build steps
+    # Step 1 is the press actions; multi-step buttons add a "Confirm" step
     steps = {}
-    press_actions = yaml_button.get("actions", {}).get("press", [])
-    step1_id = str(uuid.uuid4())
-    steps[step1_id] = build_step(press_actions, connection_map, connection_module_map, "")
-
-    if is_multistep:
-        step2_actions = yaml_button.get("step_2_actions", {}).get("press", [])
-        step2_id = str(uuid.uuid4())
-        steps[step2_id] = build_step(step2_actions, connection_map, connection_module_map, "Confirm")
+    for i, step in enumerate(button.steps):
+        step_path = _child_id_path(id_path, "step", i)
+        steps[make_id(step_path)] = build_step(step, connection_map, connection_module_map, step_path)
 
     # Button options
     options = {
         "rotaryActions": False,
+        "stepProgression": "auto",
     }
-    if is_multistep:
-        options["stepProgression"] = "auto"
-        timeout = yaml_button.get("step_2_timeout_ms", 5000)
-        options["stepAutoProgressTimeout"] = timeout
-    else:
-        options["stepProgression"] = "auto"
+    if button.multistep:
+        options["stepAutoProgressTimeout"] = button.timeout
 
     return {
         "type": "button",
@@ -904,17 +1288,105 @@ def build_control(yaml_button, connection_map, connection_module_map=None):
     }
 
 
+# =============================================================================
+# SECTION 2c: Control Dedupe
+# =============================================================================
+# Navigation buttons, the emergency row and connection status tiles repeat
+# verbatim across pages. ControlCache builds each distinct Button once and
+# stamps out copies with their own IDs. Buttons compare by content (see
+# SECTION 1b), so position and notes don't stop two buttons from sharing.
+# Templates are kept least-recently-used: buttons that repeat do so on
+# nearby pages, and holding every distinct control would keep the whole
+# export in memory while pages are streamed out.
+CONTROL_CACHE_SIZE = 8 * GRID_ROWS * GRID_COLS
+
+def stamp_control(template, id_path=None):
+    """Copy a built control, giving it the IDs build_control(..., id_path) would.
+
+    Only the parts that hold IDs are copied; style and options dicts are
+    shared with the template, so treat built controls as read-only.
+    """
+    id_key = FIELD_MAP["action_id_key"]
+    press_key = FIELD_MAP["press_key"]
+    control = dict(template)
+    control["feedbacks"] = [
+        dict(feedback, **{id_key: make_id(_child_id_path(id_path, "feedback", i))})
+        for i, feedback in enumerate(template["feedbacks"])
+    ]
+    steps = {}
+    for i, step in enumerate(template["steps"].values()):
+        step_path = _child_id_path(id_path, "step", i)
+        action_sets = dict(step["action_sets"])
+        action_sets[press_key] = [
+            dict(action, **{id_key: make_id(_child_id_path(step_path, "action", j))})
+            for j, action in enumerate(step["action_sets"][press_key])
+        ]
+        action_sets[FIELD_MAP["release_key"]] = []
+        steps[make_id(step_path)] = {"action_sets": action_sets, "options": step["options"]}
+    control["steps"] = steps
+    control["localVariables"] = []
+    return control
+
+
+class ControlCache:
+    """Content-addressed LRU cache of built controls for one set of connection maps."""
+
+    def __init__(self, connection_map, connection_module_map=None, size=CONTROL_CACHE_SIZE):
+        self.connection_map = connection_map
+        self.connection_module_map = connection_module_map
+        self.size = size
+        self._templates = OrderedDict()
+        self.built = 0
+        self.deduped = 0
+        self.build_seconds = 0.0
+        self.stamp_seconds = 0.0
+
+    def build(self, button, id_path=None):
+        """Return a control for button (a Button or YAML dict), building it only on first sight."""
+        button = _as_button(button)
+        try:
+            template = self._templates.get(button)
+        except TypeError:  # unhashable option value: build directly
+            return build_control(button, self.connection_map, self.connection_module_map, id_path)
+
+        start = time.perf_counter()
+        if template is None:
+            # The first copy is the template itself; later ones are stamped from it
+            template = build_control(button, self.connection_map, self.connection_module_map, id_path)
+            self._templates[button] = template
+            if len(self._templates) > self.size:
+                self._templates.popitem(last=False)
+            self.built += 1
+            self.build_seconds += time.perf_counter() - start
+            return template
+        self._templates.move_to_end(button)
+        control = stamp_control(template, id_path)
+        self.deduped += 1
+        self.stamp_seconds += time.perf_counter() - start
+        return control
+
+    def saved_seconds(self):
+        """Estimated build time avoided by stamping instead of rebuilding."""
+        if not self.built:
+            return 0.0
+        return max(0.0, self.deduped * self.build_seconds / self.built - self.stamp_seconds)
+
+
 # =============================================================================
 # SECTION 3: Structure Builders
 # =============================================================================
 
-def build_connections(yaml_connections, params=None):
+def build_connections(yaml_connections, params=None, known_uuids=None, deterministic_ids=False):
     """Build Companion instances dict and connection_map from connections.yaml.
 
     If params (from parameters.yaml) is provided, resolves machine IPs from
     assignments and applies connection-specific settings. All module config
     fields are populated with defaults to ensure Companion can save connections.
 
+    known_uuids maps friendly connection id -> UUID from a previous run. Reusing
+    them keeps connectionId references stable so cached pages stay valid.
+    With deterministic_ids, UUIDs are derived from the connection id instead.
+
     Returns (instances_dict, connection_map, connection_module_map).
     connection_module_map maps friendly connection id -> module name.
     """
@@ -939,7 +1411,10 @@ def build_connections(yaml_connections, params=None):
         if module == "TBD":
             continue
 
-        conn_uuid = str(uuid.uuid4())
+        if deterministic_ids:
+            conn_uuid = make_id(("connection", conn_id))
+        else:
+            conn_uuid = (known_uuids or {}).get(conn_id) or make_id()
         connection_map[conn_id] = conn_uuid
         connection_module_map[conn_id] = module
 
@@ -989,6 +1464,28 @@ def build_connections(yaml_connections, params=None):
     return instances, connection_map, connection_module_map
 
 
+# Single-slot memo for repeated convert() runs (--watch, --serve): most edits
+# leave connections.yaml and parameters.yaml alone, and handing back the same
+# map objects keeps the get_resolver() memo and control cache warm.
+_CONNECTIONS_SLOT = {}
+
+
+def build_connections_cached(yaml_connections, params=None, known_uuids=None,
+                             deterministic_ids=False):
+    """build_connections(), reusing the previous result if its inputs match.
+
+    known_uuids is left out of the key: a reused result already holds the
+    UUIDs it was built with, and those are what the build cache then saves.
+    """
+    key = hashlib.sha256(pickle.dumps((yaml_connections, params, deterministic_ids))).digest()
+    if _CONNECTIONS_SLOT.get("key") != key:
+        _CONNECTIONS_SLOT["key"] = key
+        _CONNECTIONS_SLOT["result"] = build_connections(
+            yaml_connections, params, known_uuids, deterministic_ids
+        )
+    return _CONNECTIONS_SLOT["result"]
+
+
 def build_custom_variables(yaml_variables):
     """Convert variables.yaml custom_variables to Companion CustomVariablesModel."""
     result = {}
@@ -1005,24 +1502,28 @@ def build_custom_variables(yaml_variables):
     return result
 
 
-def build_page(yaml_page_data, connection_map, connection_module_map=None):
-    """Build a complete Companion page from parsed YAML page data."""
-    page_meta = yaml_page_data.get("page", {})
-    page_name = page_meta.get("name", "Unnamed")
+def build_page(page, connection_map, connection_module_map=None, deterministic_ids=False):
+    """Build a complete Companion page from a Page (or parsed YAML page data).
 
+    The converter normally fills the Page while validating (Page.add() as
+    validate_page()'s on_button); YAML is accepted for pages that were
+    validated earlier. Identical buttons are built once and copied
+    (see ControlCache). With deterministic_ids, control IDs derive from page
+    number and position.
+    """
+    if not isinstance(page, Page):
+        page = Page.from_yaml(page)
+    control_cache = get_control_cache(connection_map, connection_module_map)
     controls = {}
-    for button in yaml_page_data.get("buttons", []):
-        pos = button.get("position", [0, 0])
-        row = str(pos[0])
-        col = str(pos[1])
-
-        if row not in controls:
-            controls[row] = {}
-
-        controls[row][col] = build_control(button, connection_map, connection_module_map)
-
+    for row, cols in page.grid.items():
+        row = str(row)
+        built = controls[row] = {}
+        for col, button in cols.items():
+            col = str(col)
+            id_path = ("page", page.number, row, col) if deterministic_ids else None
+            built[col] = control_cache.build(button, id_path)
     return {
-        "name": page_name,
+        "name": page.name,
         "controls": controls,
         "gridSize": dict(GRID_SIZE),
     }
@@ -1063,6 +1564,17 @@ class ValidationResult:
     def has_errors(self):
         return len(self.errors) > 0
 
+    def as_dict(self):
+        return {"errors": list(self.errors), "warnings": list(self.warnings), "info": list(self.info)}
+
+    def extend(self, other):
+        """Append messages from another ValidationResult or an as_dict() dict."""
+        if isinstance(other, ValidationResult):
+            other = other.as_dict()
+        self.errors.extend(other.get("errors", []))
+        self.warnings.extend(other.get("warnings", []))
+        self.info.extend(other.get("info", []))
+
     def print_report(self):
         print(f"\nValidation Results / バリデーション結果:")
         print(f"  ERRORS:   {len(self.errors)}")
@@ -1078,193 +1590,2768 @@ class ValidationResult:
         print()
 
 
-def validate_button(button, page_file, known_connections, result):
-    """Validate a single button definition."""
-    pos = button.get("position")
-    if not pos or not isinstance(pos, list) or len(pos) != 2:
-        result.error(f"{page_file}: Button missing valid position field")
-        return
+class ReferenceIndex:
+    """Names that page YAML may reference, built once per run.
 
-    row, col = pos
-    label = f"[{row},{col}]"
-
-    if not (0 <= row <= GRID_ROWS - 1):
-        result.error(f"{page_file}: Button {label} row {row} out of range (0-{GRID_ROWS-1})")
-    if not (0 <= col <= GRID_COLS - 1):
-        result.error(f"{page_file}: Button {label} col {col} out of range (0-{GRID_COLS-1})")
-
-    style = button.get("style", {})
-    if not style:
-        result.warn(f"{page_file}: Button {label} has no style defined")
-
-    # Validate color formats
-    for color_field in ["color_bg", "color_text"]:
-        val = style.get(color_field, "")
-        if val and not (isinstance(val, str) and val.startswith("#") and len(val) == 7):
-            result.warn(f"{page_file}: Button {label} {color_field} '{val}' may not be valid hex")
-
-    # Validate font size
-    fs = style.get("font_size", "")
-    if fs and fs not in FONT_SIZE_MAP:
-        result.warn(f"{page_file}: Button {label} font_size '{fs}' not in known sizes")
-
-    # Validate connection references in actions
-    for action in button.get("actions", {}).get("press", []):
-        conn = action.get("connection", "")
-        if conn and conn not in known_connections and conn != "internal":
-            result.error(f"{page_file}: Button {label} action references unknown connection '{conn}'")
-
-    # Validate connection references in feedbacks
-    for fb in button.get("feedbacks", []):
-        conn = fb.get("connection", "")
-        if conn and conn not in known_connections and conn != "internal":
-            result.error(f"{page_file}: Button {label} feedback references unknown connection '{conn}'")
+    Holds the connection ids from connections.yaml (plus "internal") and the
+    custom variable names from variables.yaml. Page numbers are only known
+    once every page has been read, so set_page targets are collected per page
+    and checked afterwards by check_page_links().
+    """
 
-    # Check for OPEN QUESTION markers
-    notes = str(button.get("notes", ""))
-    if "OPEN QUESTION" in notes:
-        result.warn(f"{page_file}: Button {label} has OPEN QUESTION in notes")
+    def __init__(self, yaml_connections=(), yaml_variables=()):
+        self.connections = frozenset(
+            {"internal"} | {c.get("id", "") for c in yaml_connections if isinstance(c, dict)}
+        )
+        self.variables = frozenset(
+            v.get("name") for v in yaml_variables or [] if isinstance(v, dict) and v.get("name")
+        )
 
-    # Multi-step validation
-    step_count = button.get("step_count", 1)
-    if step_count >= 2:
-        if not button.get("step_2_actions"):
-            result.warn(f"{page_file}: Button {label} has step_count={step_count} but no step_2_actions")
-        if not button.get("step_2_timeout_ms"):
-            result.note(f"{page_file}: Button {label} multi-step without timeout (will use default)")
+    def cache_slice(self):
+        """The part of the index that a page's validation messages depend on."""
+        return {"known": sorted(self.connections), "variables": sorted(self.variables)}
 
-    # Display-only buttons (no actions)
-    press_actions = button.get("actions", {}).get("press", [])
-    if not press_actions:
-        result.note(f"{page_file}: Button {label} has no press actions (display-only)")
-
-
-def validate_page(page_data, page_file, known_connections, result):
-    """Validate a complete page YAML file."""
-    page_meta = page_data.get("page", {})
-    if not page_meta.get("number"):
-        result.error(f"{page_file}: Missing page number")
-    if not page_meta.get("name"):
-        result.warn(f"{page_file}: Missing page name")
-
-    buttons = page_data.get("buttons", [])
-    if not buttons:
-        result.warn(f"{page_file}: No buttons defined")
-        return
 
-    # Check for duplicate positions
-    positions = []
-    for button in buttons:
-        pos = button.get("position")
-        if pos:
-            pos_tuple = tuple(pos)
-            if pos_tuple in positions:
-                result.error(f"{page_file}: Duplicate button position [{pos[0]},{pos[1]}]")
-            positions.append(pos_tuple)
+def _as_reference_index(known):
+    """Accept a ReferenceIndex or a bare set of connection ids."""
+    if isinstance(known, ReferenceIndex):
+        return known
+    index = ReferenceIndex()
+    index.connections = frozenset(known) | {"internal"}
+    return index
 
-    for button in buttons:
-        validate_button(button, page_file, known_connections, result)
 
+_VARIABLE_EXPR = re.compile(r"\$\(internal:custom_([A-Za-z0-9_]+)\)")
 
-def validate_connections(yaml_connections, result):
-    """Validate connections.yaml."""
-    for conn in yaml_connections:
-        conn_id = conn.get("id", "unknown")
-        config = conn.get("config", {})
-        host = config.get("host", "")
-        if "XXX" in str(host):
-            result.warn(f"connections.yaml: '{conn_id}' has placeholder IP ({host})")
 
-        notes = conn.get("notes", [])
-        oq_count = sum(1 for n in (notes or []) if "OPEN QUESTION" in str(n))
-        if oq_count:
-            result.warn(f"connections.yaml: '{conn_id}' has {oq_count} OPEN QUESTION(s)")
+# --- Source positions --------------------------------------------------------
+# Parsed documents are plain dicts and lists, so positions are recorded from
+# the YAML node tree while parsing (parse_document()) and kept in the parse
+# cache next to the data. Build-cache hits never look at them.
 
+class SourceMap:
+    """Resolve document paths (tuples of keys and list indexes) to file:line:column.
 
-def validate_all(pages_data, yaml_connections, yaml_variables, result):
-    """Run all validation checks."""
-    known_connections = {"internal"}
-    for conn in yaml_connections:
-        known_connections.add(conn.get("id", ""))
+    marks are the positions recorded by parse_document() (e.g. from the parse
+    cache). Otherwise the file is composed from raw, or read from path, when
+    a position is first needed. With none of these, locations are just the
+    file name. Mapping entries are located at their key, list items at the
+    item.
+    """
 
-    validate_connections(yaml_connections, result)
+    def __init__(self, name, raw=None, path=None, marks=None):
+        self.name = str(name)
+        self._raw = raw
+        self._path = path
+        self._marks = marks
+
+    def _load(self):
+        self._marks = {}
+        raw = self._raw
+        if raw is None and self._path is not None:
+            try:
+                raw = Path(self._path).read_bytes()
+            except OSError:
+                return
+        if raw is None:
+            return
+        try:
+            root = yaml.compose(_NamedBytesIO(raw, self.name), Loader=YamlLoader)
+        except yaml.YAMLError:
+            return
+        if root is not None:
+            _collect_marks(root, self._marks)
+
+    def position(self, path):
+        """(line, column), 1-based, of path or its nearest located ancestor."""
+        if self._marks is None:
+            self._load()
+        path = tuple(path)
+        while path not in self._marks and path:
+            path = path[:-1]
+        return self._marks.get(path)
+
+    def locate(self, path=()):
+        pos = self.position(path)
+        return f"{self.name}:{pos[0]}:{pos[1]}" if pos else self.name
+
+
+def _collect_marks(root, marks):
+    seen = set()
+    stack = [(root, (), root.start_mark)]
+    while stack:
+        node, path, mark = stack.pop()
+        marks[path] = (mark.line + 1, mark.column + 1)
+        if id(node) in seen:
+            continue  # an alias of a node already walked
+        seen.add(id(node))
+        if isinstance(node, yaml.MappingNode):
+            for key_node, value_node in node.value:
+                if isinstance(key_node, yaml.ScalarNode):
+                    stack.append((value_node, path + (key_node.value,), key_node.start_mark))
+        elif isinstance(node, yaml.SequenceNode):
+            for i, item in enumerate(node.value):
+                stack.append((item, path + (i,), item.start_mark))
+
+
+def format_path(path):
+    """('buttons', 3, 'style') -> 'buttons[3].style'."""
+    text = ""
+    for part in path:
+        text += f"[{part}]" if type(part) is int else (f".{part}" if text else str(part))
+    return text
+
+
+class SourceReport:
+    """Adds messages about one YAML file to a ValidationResult.
+
+    Every message is prefixed with the file:line:column of the path it is
+    about. references is the ReferenceIndex the schema's "ref" checks use.
+    """
 
-    for page_file, page_data in pages_data:
-        validate_page(page_data, page_file, known_connections, result)
+    def __init__(self, result, source, references=()):
+        self.result = result
+        self.source = source
+        self.index = _as_reference_index(references)
+
+    def error(self, path, msg):
+        self.result.error(f"{self.source.locate(path)}: {msg}")
+
+    def warn(self, path, msg):
+        self.result.warn(f"{self.source.locate(path)}: {msg}")
+
+    def note(self, path, msg):
+        self.result.note(f"{self.source.locate(path)}: {msg}")
+
+    def schema(self, severity, path, msg):
+        """Structural message from a compiled schema: names the offending field."""
+        getattr(self, severity)(path, f"{format_path(path)}: {msg}")
+
+
+# --- Declarative schemas -----------------------------------------------------
+# The YAML formats are described as nested spec dicts and compiled once, at
+# import, into validator closures (like the resolvers in SECTION 2b), which
+# every page, worker process and site then reuses. A spec has a "type" (map,
+# list, str, int, number, bool, scalar or any) and optionally:
+#
+#   fields     map: spec per known key; other keys get an "unknown field"
+#              warning (a map without fields accepts any keys)
+#   required   on a field: True (error) or "warn" when the key is missing
+#   items      list: spec for every item, or a list of specs for a fixed-length
+#              list (e.g. [row, col])
+#   min_items  list: fewer items is reported
+#   nullable   null is accepted as "not given"
+#   min, max   numbers: inclusive range
+#   enum       allowed values (any container); pattern: regex for strings;
+#              hint describes the expected value in messages
+#   ref        "connections" / "variables": must name one in the ReferenceIndex
+#   severity   "error" (default) or "warn" for every problem found at this node
+#
+# Cross-field rules (duplicate positions, multi-step buttons, conditional
+# variable references) are checked by validate_button() and friends.
+
+_HEX_COLOR = {"type": "str", "pattern": r"#[0-9A-Fa-f]{6}", "hint": "a #RRGGBB hex color",
+              "severity": "warn"}
+_TEXT = {"type": "scalar"}
+
+STYLE_SCHEMA = {
+    "type": "map",
+    "fields": {
+        "text": _TEXT,
+        "text_top": _TEXT,
+        "text_bottom": _TEXT,
+        "color_bg": _HEX_COLOR,
+        "color_text": _HEX_COLOR,
+        "font_size": {"type": "scalar", "enum": FONT_SIZE_MAP, "severity": "warn"},
+    },
+}
 
+ACTION_SCHEMA = {
+    "type": "map",
+    "fields": {
+        "connection": {"type": "str", "ref": "connections"},
+        "action": {"type": "str", "required": True},
+        "options": {"type": "map", "nullable": True},
+        "notes": {"type": "scalar"},
+    },
+}
 
-# =============================================================================
-# SECTION 5: File I/O
-# =============================================================================
+ACTION_LIST_SCHEMA = {
+    "type": "map",
+    "nullable": True,
+    "fields": {"press": {"type": "list", "nullable": True, "items": ACTION_SCHEMA}},
+}
 
-def load_yaml_file(path):
-    """Load and parse a YAML file."""
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return yaml.safe_load(f)
-    except yaml.YAMLError as e:
-        print(f"ERROR: Failed to parse YAML file: {path}", file=sys.stderr)
-        print(f"  {e}", file=sys.stderr)
-        sys.exit(1)
-    except FileNotFoundError:
-        print(f"ERROR: File not found: {path}", file=sys.stderr)
-        sys.exit(1)
+FEEDBACK_SCHEMA = {
+    "type": "map",
+    "fields": {
+        "connection": {"type": "str", "ref": "connections"},
+        "feedback": {"type": "str", "required": True},
+        "options": {"type": "map", "nullable": True},
+        "style_when_true": STYLE_SCHEMA,
+        "style_when_false": STYLE_SCHEMA,
+        "notes": {"type": "scalar"},
+    },
+}
 
+BUTTON_SCHEMA = {
+    "type": "map",
+    "fields": {
+        "position": {
+            "type": "list",
+            "required": True,
+            "items": [
+                {"type": "int", "min": 0, "max": GRID_ROWS - 1},
+                {"type": "int", "min": 0, "max": GRID_COLS - 1},
+            ],
+        },
+        "style": dict(STYLE_SCHEMA, required="warn"),
+        "actions": ACTION_LIST_SCHEMA,
+        "feedbacks": {"type": "list", "nullable": True, "items": FEEDBACK_SCHEMA},
+        "step_count": {"type": "int", "min": 1},
+        "step_2_actions": ACTION_LIST_SCHEMA,
+        "step_2_style": STYLE_SCHEMA,
+        "step_2_timeout_ms": {"type": "int", "min": 0},
+        "notes": {"type": "scalar"},
+    },
+}
 
-def load_all_pages(pages_dir):
-    """Discover and load all page YAML files, sorted by name.
+# Buttons are checked one at a time against BUTTON_SCHEMA by validate_page(),
+# so a button with errors can be skipped while the rest are still built.
+PAGE_SCHEMA = {
+    "type": "map",
+    "fields": {
+        "page": {
+            "type": "map",
+            "required": True,
+            "fields": {
+                "number": {"type": "int", "required": True, "min": 1},
+                "name": {"type": "scalar", "required": "warn"},
+                "name_jp": {"type": "scalar"},
+                "description": {"type": "scalar"},
+                "role": {"type": "scalar"},
+                "primary_connection": {"type": "str", "ref": "connections", "severity": "warn"},
+                "service_section": {"type": "scalar"},
+            },
+        },
+        "templates": {"type": "map"},
+        "buttons": {"type": "list", "required": "warn", "min_items": 1, "severity": "warn"},
+    },
+}
 
-    Returns list of (filename, parsed_data) tuples.
-    """
-    pages_path = Path(pages_dir)
-    if not pages_path.is_dir():
-        print(f"ERROR: Pages directory not found: {pages_dir}", file=sys.stderr)
-        sys.exit(1)
+CONNECTION_SCHEMA = {
+    "type": "map",
+    "fields": {
+        "id": {"type": "str", "required": True},
+        "label": {"type": "scalar"},
+        "module": {"type": "str", "required": True},
+        "enabled": {"type": "bool"},
+        "config": {"type": "map", "nullable": True},
+        "notes": {"type": "list", "nullable": True, "items": {"type": "scalar"}},
+    },
+}
 
-    page_files = sorted(pages_path.glob("page*.yaml"))
-    if not page_files:
-        print(f"ERROR: No page*.yaml files found in {pages_dir}", file=sys.stderr)
-        sys.exit(1)
+VARIABLE_SCHEMA = {
+    "type": "map",
+    "fields": {
+        "name": {"type": "str", "required": True, "pattern": r"[A-Za-z0-9_]+",
+                 "hint": "a valid name (letters, digits and _)"},
+        "description": {"type": "scalar"},
+        "default": {"type": "scalar"},
+        "values": {"type": "list", "nullable": True, "items": {"type": "scalar"}},
+        "notes": {"type": "scalar"},
+    },
+}
 
-    result = []
-    for pf in page_files:
-        data = load_yaml_file(pf)
-        result.append((pf.name, data))
+# Exact types, so bool (a subclass of int) is not accepted as a number
+_SCHEMA_TYPES = {
+    "map": (frozenset({dict}), "a mapping"),
+    "list": (frozenset({list}), "a list"),
+    "str": (frozenset({str}), "a string"),
+    "int": (frozenset({int}), "an integer"),
+    "number": (frozenset({int, float}), "a number"),
+    "bool": (frozenset({bool}), "true or false"),
+    "scalar": (frozenset({str, int, float, bool}), "a single value"),
+    "any": (None, None),
+}
+_REF_NOUNS = {"connections": "connection", "variables": "custom variable"}
 
-    return result
 
+def _type_name(value):
+    return "null" if value is None else type(value).__name__
 
-def load_parameters(path):
-    """Load parameters.yaml if it exists.
 
-    Returns parsed dict or None if file doesn't exist.
-    """
-    params_path = Path(path)
-    if not params_path.is_file():
-        return None
-    try:
-        with open(params_path, "r", encoding="utf-8") as f:
-            data = yaml.safe_load(f)
-        return data if data else None
-    except yaml.YAMLError as e:
-        print(f"ERROR: Failed to parse parameters file: {path}", file=sys.stderr)
-        print(f"  {e}", file=sys.stderr)
-        sys.exit(1)
+def _fstring(template):
+    """Source of an f-string literal; template may use {name} placeholders."""
+    return "f" + repr(template)
 
 
-def write_json_output(data, output_path):
-    """Write the Companion JSON config file."""
-    output_dir = os.path.dirname(output_path)
-    if output_dir:
-        os.makedirs(output_dir, exist_ok=True)
+def _literal(text):
+    return text.replace("{", "{{").replace("}", "}}")
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
 
+class _SchemaCompiler:
+    """Generates the source of one validator function from a schema spec.
 
-# =============================================================================
-# SECTION 6: CLI Entry Point
-# =============================================================================
+    Nested maps and lists become nested blocks and loops in a single
+    function, so checking a document costs no call per value, and paths are
+    only built (as path + (...)) on the branches that report a problem.
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.constants = {}
+        self.names = 0
+
+    def constant(self, value):
+        name = f"_k{len(self.constants)}"
+        self.constants[name] = value
+        return name
+
+    def var(self, prefix="v"):
+        self.names += 1
+        return f"{prefix}{self.names}"
+
+    def emit(self, depth, line):
+        self.lines.append("    " * depth + line)
+
+    def report(self, depth, severity, parts, message):
+        path = f"path + ({', '.join(parts)},)" if parts else "path"
+        self.emit(depth, f"report.schema({severity!r}, {path}, {message})")
+
+    def block(self, depth, header, body):
+        """Emit header plus the lines body(depth + 1) adds; drop the header if there are none."""
+        mark = len(self.lines)
+        self.emit(depth, header)
+        body(depth + 1)
+        if len(self.lines) == mark + 1:
+            self.lines.pop()
+            return False
+        return True
+
+    def node(self, spec, var, parts, depth):
+        kind = spec.get("type", "any")
+        types, type_desc = _SCHEMA_TYPES[kind]
+        severity = spec.get("severity", "error")
+        if types is None:
+            self.body(spec, kind, severity, var, parts, depth)
+            return
+        if spec.get("nullable"):
+            types = types | {type(None)}
+        test = (f"type({var}) is not {next(iter(types)).__name__}" if len(types) == 1
+                else f"type({var}) not in {self.constant(types)}")
+        self.emit(depth, f"if {test}:")
+        self.report(depth + 1, severity, parts,
+                    _fstring(f"must be {type_desc}, not {{_type_name({var})}}"))
+        header = f"elif {var} is not None:" if spec.get("nullable") else "else:"
+        self.block(depth, header, lambda d: self.body(spec, kind, severity, var, parts, d))
+
+    def body(self, spec, kind, severity, var, parts, depth):
+        if kind == "map" and "fields" in spec:
+            self.fields(spec, var, parts, depth)
+        if kind == "list":
+            self.items(spec, severity, var, parts, depth)
+
+        if "min" in spec or "max" in spec:
+            lo, hi = spec.get("min"), spec.get("max")
+            bounds = f"{lo}-{hi}" if lo is not None and hi is not None else (
+                f">= {lo}" if lo is not None else f"<= {hi}")
+            test = " and ".join(t for t in (lo is not None and f"{lo!r} <= {var}",
+                                            hi is not None and f"{var} <= {hi!r}") if t)
+            self.emit(depth, f"if not ({test}):")
+            self.report(depth + 1, severity, parts,
+                        _fstring(f"{{{var}}} out of range ({_literal(bounds)})"))
+        hint = spec.get("hint")
+        if "enum" in spec:
+            expected = hint or "one of: " + ", ".join(map(str, spec["enum"]))
+            self.emit(depth, f"if {var} not in {self.constant(frozenset(spec['enum']))}:")
+            self.report(depth + 1, severity, parts,
+                        _fstring(f"'{{{var}}}' is not {_literal(expected)}"))
+        if "pattern" in spec:
+            expected = hint or f"matching {spec['pattern']}"
+            match = self.constant(re.compile(spec["pattern"]).fullmatch)
+            self.emit(depth, f"if not {match}(str({var})):")
+            self.report(depth + 1, severity, parts,
+                        _fstring(f"'{{{var}}}' is not {_literal(expected)}"))
+        if "ref" in spec:
+            noun = _REF_NOUNS[spec["ref"]]
+            self.emit(depth, f"if {var} and {var} not in report.index.{spec['ref']}:")
+            self.report(depth + 1, severity, parts,
+                        _fstring(f"unknown {noun} '{{{var}}}'"))
+
+    def fields(self, spec, var, parts, depth):
+        fields = spec["fields"]
+        for key, sub in fields.items():
+            if sub.get("required"):
+                self.emit(depth, f"if {key!r} not in {var}:")
+                self.report(depth + 1, "warn" if sub["required"] == "warn" else "error", parts,
+                            repr(f"missing required field '{key}'"))
+        known = self.constant(frozenset(fields))
+        key_var = self.var("key")
+        self.emit(depth, f"if not {var}.keys() <= {known}:")
+        self.emit(depth + 1, f"for {key_var} in {var}.keys() - {known}:")
+        self.report(depth + 2, "warn", parts + (key_var,),
+                    _fstring(f"unknown field '{{{key_var}}}'"))
+        for key, sub in fields.items():
+            sub_var = self.var()
+            mark = len(self.lines)
+            self.emit(depth, f"{sub_var} = {var}.get({key!r}, _MISSING)")
+            if not self.block(depth, f"if {sub_var} is not _MISSING:",
+                              lambda d: self.node(sub, sub_var, parts + (repr(key),), d)):
+                del self.lines[mark:]
+
+    def items(self, spec, severity, var, parts, depth):
+        items = spec.get("items")
+        if spec.get("min_items"):
+            self.emit(depth, f"if len({var}) < {spec['min_items']!r}:")
+            self.report(depth + 1, severity, parts,
+                        repr(f"needs at least {spec['min_items']} item(s)"))
+        if isinstance(items, list):
+            self.emit(depth, f"if len({var}) != {len(items)}:")
+            self.report(depth + 1, severity, parts,
+                        _fstring(f"must have exactly {len(items)} items, not {{len({var})}}"))
+
+            def positional(d):
+                for i, sub in enumerate(items):
+                    item_var = self.var()
+                    self.emit(d, f"{item_var} = {var}[{i}]")
+                    self.node(sub, item_var, parts + (str(i),), d)
+            self.block(depth, "else:", positional)
+        elif items is not None:
+            index_var, item_var = self.var("i"), self.var()
+            self.block(depth, f"for {index_var}, {item_var} in enumerate({var}):",
+                       lambda d: self.node(items, item_var, parts + (index_var,), d))
+
+    def compile(self, spec):
+        self.node(spec, "value", (), 1)
+        source = "\n".join(["def check(value, path, report):"] + (self.lines or ["    pass"]))
+        namespace = dict(self.constants, _MISSING=_MISSING, _type_name=_type_name)
+        exec(compile(source, "<schema>", "exec"), namespace)
+        check = namespace["check"]
+        check.source = source
+        return check
+
+
+_MISSING = object()
+
+
+def compile_schema(spec):
+    """Compile a schema spec into check(value, path, report).
+
+    check() reports every problem it finds (through report.schema()) rather
+    than stopping at the first, and returns nothing. The generated source is
+    kept as check.source.
+    """
+    return _SchemaCompiler().compile(spec)
+
+
+check_page_schema = compile_schema(PAGE_SCHEMA)
+check_button_schema = compile_schema(BUTTON_SCHEMA)
+check_connection_schema = compile_schema(CONNECTION_SCHEMA)
+check_variable_schema = compile_schema(VARIABLE_SCHEMA)
+
+
+def _mapping(value):
+    return value if isinstance(value, dict) else {}
+
+
+def _sequence(value):
+    return value if isinstance(value, list) else []
+
+
+def _grid_position(pos):
+    """Return (row, col) for a well-formed in-grid position, else None."""
+    if not isinstance(pos, list) or len(pos) != 2:
+        return None
+    row, col = pos
+    if type(row) is not int or type(col) is not int:
+        return None
+    if 0 <= row < GRID_ROWS and 0 <= col < GRID_COLS:
+        return row, col
+    return None
+
+
+def validate_button(button, path, report, links=None):
+    """Validate a single button definition at path (e.g. ('buttons', 3)).
+
+    The button is checked against BUTTON_SCHEMA, then for references that
+    depend on other fields: custom variables in text, custom_variable_set
+    actions and variable_value feedbacks, multi-step settings. set_page
+    targets are appended to links as (label, page) pairs when a list is
+    given. Returns the (row, col) grid cell for a valid position, else None.
+    """
+    check_button_schema(button, path, report)
+    if type(button) is not dict:
+        return None
+    pos = button.get("position")
+    cell = _grid_position(pos)
+    label = f"[{pos[0]},{pos[1]}]" if type(pos) is list and len(pos) == 2 else f"#{path[-1] + 1}"
+    index = report.index
+
+    # Custom variables shown in button text
+    style = button.get("style")
+    if type(style) is dict:
+        for text_field in ("text", "text_top", "text_bottom"):
+            text = str(style.get(text_field, ""))
+            if "$(" not in text:
+                continue
+            for name in _VARIABLE_EXPR.findall(text):
+                if name not in index.variables:
+                    report.warn(path + ("style", text_field),
+                                f"Button {label} text references unknown custom variable '{name}'")
+
+    # Variable references and page links in actions (both steps)
+    has_press = False
+    for step in ("actions", "step_2_actions"):
+        press = _mapping(button.get(step)).get("press")
+        if type(press) is not list:
+            continue
+        has_press = has_press or (step == "actions" and bool(press))
+        for i, action in enumerate(press):
+            name = action.get("action") if type(action) is dict else None
+            if name == "custom_variable_set":
+                var = _mapping(action.get("options")).get("variable", "")
+                if var and var not in index.variables:
+                    report.warn(path + (step, "press", i, "options", "variable"),
+                                f"Button {label} action sets unknown custom variable '{var}'")
+            elif name == "set_page" and links is not None:
+                target = _mapping(action.get("options")).get("page")
+                if type(target) is int:
+                    links.append((f"{report.source.locate(path + (step, 'press', i))}: Button {label}",
+                                  target))
+
+    feedbacks = button.get("feedbacks")
+    for i, fb in enumerate(feedbacks if type(feedbacks) is list else ()):
+        if type(fb) is dict and fb.get("feedback") == "variable_value":
+            var = _mapping(fb.get("options")).get("variable", "")
+            if var and var not in index.variables:
+                report.warn(path + ("feedbacks", i, "options", "variable"),
+                            f"Button {label} feedback reads unknown custom variable '{var}'")
+
+    # Check for OPEN QUESTION markers
+    notes = button.get("notes")
+    if notes and "OPEN QUESTION" in str(notes):
+        report.warn(path + ("notes",), f"Button {label} has OPEN QUESTION in notes")
+
+    # Multi-step validation
+    step_count = button.get("step_count", 1)
+    if type(step_count) is int and step_count >= 2:
+        if not button.get("step_2_actions"):
+            report.warn(path + ("step_count",),
+                        f"Button {label} has step_count={step_count} but no step_2_actions")
+        if not button.get("step_2_timeout_ms"):
+            report.note(path + ("step_count",),
+                        f"Button {label} multi-step without timeout (will use default)")
+
+    # Display-only buttons (no actions)
+    if not has_press:
+        report.note(path, f"Button {label} has no press actions (display-only)")
+
+    return cell
+
+
+def validate_page(page_data, page_file, references, result, on_button=None, source=None,
+                  origins=None):
+    """Validate a complete page YAML file in a single pass over its buttons.
+
+    Duplicate positions are caught with an occupancy bitmap over the grid.
+    If on_button is given, it is called as on_button(button, row, col) for
+    each button that validated without errors, so callers can collect them
+    in the same pass (Page.add() fills the IR grid the page is built from).
+
+    Messages carry file:line:column when source (a SourceMap of the file)
+    is given; for a page expanded from templates, origins (from
+    expand_page_templates()) maps each button back to its entry in the
+    file. Returns the page's set_page links (see ReferenceIndex).
+    """
+    report = SourceReport(result, source or SourceMap(page_file), references)
+    links = []
+    check_page_schema(page_data, (), report)
+    if not isinstance(page_data, dict):
+        return links
+
+    occupied = 0
+    for i, button in enumerate(_sequence(page_data.get("buttons"))):
+        errors_before = len(result.errors)
+        path = origins[i] if origins else ("buttons", i)
+        cell = validate_button(button, path, report, links)
+        if cell is None:
+            continue
+        bit = 1 << (cell[0] * GRID_COLS + cell[1])
+        if occupied & bit:
+            report.error(path + ("position",), f"Duplicate button position [{cell[0]},{cell[1]}]")
+            continue
+        occupied |= bit
+        if on_button is not None and len(result.errors) == errors_before:
+            on_button(button, *cell)
+    return links
+
+
+def check_page_links(pages, result):
+    """Check page numbers and set_page targets across all pages.
+
+    pages is an iterable of (page_file, number, links) tuples, where links
+    are the (label, target) pairs returned by validate_page().
+    """
+    numbers = {}
+    all_links = []
+    for page_file, number, links in pages:
+        if number:
+            if number in numbers:
+                result.error(f"{page_file}: Duplicate page number {number} (also used by {numbers[number]})")
+            else:
+                numbers[number] = page_file
+        all_links.extend(links)
+    for label, target in all_links:
+        if target not in numbers:
+            result.warn(f"{label} set_page targets page {target}, which is not defined")
+
+
+def validate_connections(yaml_connections, result, source=None):
+    """Validate the connections list from connections.yaml.
+
+    source is a SourceMap of connections.yaml, for file:line:column messages.
+    """
+    report = SourceReport(result, source or SourceMap("connections.yaml"))
+    path = ("connections",)
+    if not isinstance(yaml_connections, list):
+        report.error(path, f"connections: must be a list, not {_type_name(yaml_connections)}")
+        return
+    for i, conn in enumerate(yaml_connections):
+        check_connection_schema(conn, path + (i,), report)
+        conn = _mapping(conn)
+        conn_id = conn.get("id", "unknown")
+        host = _mapping(conn.get("config")).get("host", "")
+        if "XXX" in str(host):
+            report.warn(path + (i, "config", "host"), f"'{conn_id}' has placeholder IP ({host})")
+
+        notes = _sequence(conn.get("notes"))
+        oq_count = sum(1 for n in notes if "OPEN QUESTION" in str(n))
+        if oq_count:
+            report.warn(path + (i, "notes"), f"'{conn_id}' has {oq_count} OPEN QUESTION(s)")
+
+
+def validate_variables(yaml_variables, result, source=None):
+    """Validate the custom_variables list from variables.yaml.
+
+    source is a SourceMap of variables.yaml, for file:line:column messages.
+    """
+    report = SourceReport(result, source or SourceMap("variables.yaml"))
+    path = ("custom_variables",)
+    if not isinstance(yaml_variables, list):
+        report.error(path, f"custom_variables: must be a list, not {_type_name(yaml_variables)}")
+        return
+    names = {}
+    for i, var in enumerate(yaml_variables):
+        check_variable_schema(var, path + (i,), report)
+        name = _mapping(var).get("name")
+        if not isinstance(name, str):
+            continue
+        if name in names:
+            report.error(path + (i, "name"), f"Duplicate custom variable '{name}' "
+                         f"(also {format_path(path + (names[name],))})")
+        else:
+            names[name] = i
+
+
+def known_connection_ids(yaml_connections):
+    """Return the set of connection ids that actions/feedbacks may reference."""
+    return set(ReferenceIndex(yaml_connections).connections)
+
+
+def validate_all(pages_data, yaml_connections, yaml_variables, result):
+    """Run all validation checks."""
+    index = ReferenceIndex(yaml_connections, yaml_variables)
+
+    validate_connections(yaml_connections, result)
+    validate_variables(yaml_variables, result)
+
+    page_links = []
+    for page_file, page_data in pages_data:
+        links = validate_page(page_data, page_file, index, result)
+        page_links.append((page_file, _mapping(_mapping(page_data).get("page")).get("number"), links))
+    check_page_links(page_links, result)
+
+
+# =============================================================================
+# SECTION 4b: Button Templates (templates: / extends:)
+# =============================================================================
+# Rows and button families that repeat across pages are declared once, in
+# config/templates.yaml (shared by every page) or under a page's own
+# templates: key, and pulled into a page with extends:
+#
+#   templates:
+#     nav:                        # a button family: a partial button
+#       style: {font_size: "14pt", color_text: "#FFFFFF", color_bg: "#0066CC"}
+#     home:
+#       extends: nav
+#       style: {text_top: "Home", text_bottom: "ホーム"}
+#       actions: {press: [{connection: internal, action: set_page, options: {page: 1}}]}
+#     emergency_row:              # a row: a list of buttons
+#       - {position: [3, 6], extends: mute_all}
+#       - {position: [3, 7], extends: black}
+#
+#   buttons:
+#     - position: [3, 0]
+#       extends: home             # or a list of names, applied in order
+#     - extends: emergency_row    # inserts the row's buttons here
+#
+# A button's own keys override the template's: mappings (style, options, ...)
+# are merged key by key, anything else (lists such as actions.press) is
+# replaced. Pages are expanded right after parsing, so validation and
+# build_control() only ever see plain buttons. Each shared template is
+# resolved once per process and reused by every page; expanded buttons that
+# come out identical are built once by ControlCache (SECTION 2c).
+
+TEMPLATES_FILENAME = "templates.yaml"
+
+TEMPLATES_SCHEMA = {
+    "type": "map",
+    "fields": {"templates": {"type": "map", "required": True}},
+}
+
+check_templates_schema = compile_schema(TEMPLATES_SCHEMA)
+
+
+class TemplateError(ValueError):
+    """An extends: that cannot be expanded (unknown name, cycle, wrong kind)."""
+
+
+def merge_button(base, override):
+    """Return base with override applied; neither is modified.
+
+    Mappings are merged recursively and other values replaced. Values that
+    are not overridden are shared with base, not copied.
+    """
+    merged = dict(base)
+    for key, value in override.items():
+        old = merged.get(key)
+        if type(value) is dict and type(old) is dict:
+            merged[key] = merge_button(old, value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def _extends_names(value):
+    """The template names of an extends: value (a name or a list of names)."""
+    if type(value) is str:
+        return (value,)
+    if type(value) is list and value and all(type(v) is str for v in value):
+        return tuple(value)
+    raise TemplateError(f"extends must be a template name or a list of names, not {_type_name(value)}")
+
+
+class TemplateSet:
+    """Named button templates, resolved on first use and memoized.
+
+    A mapping template is a button family (a partial button, which may
+    itself use extends:); a list template is a row of buttons. Names not
+    defined here are looked up in parent, so page-local templates can build
+    on the shared ones. digest identifies templates.yaml for the build cache.
+    """
+
+    def __init__(self, templates=None, parent=None, digest=""):
+        self.templates = templates if type(templates) is dict else {}
+        self.parent = parent
+        self.digest = digest
+        self._resolved = {}
+
+    def resolve(self, name, chain=()):
+        """Return template name expanded: a button dict (family) or a list of buttons (row)."""
+        if name in self._resolved:
+            return self._resolved[name]
+        if name not in self.templates:
+            if self.parent is None:
+                raise TemplateError(f"unknown template '{name}'")
+            return self.parent.resolve(name, chain)
+        if name in chain:
+            raise TemplateError("template cycle: " + " -> ".join(chain + (name,)))
+        chain += (name,)
+        template = self.templates[name]
+        if type(template) is dict:
+            resolved = self.extend(template, chain)
+        elif type(template) is list:
+            resolved = []
+            for item in template:
+                if type(item) is not dict:
+                    raise TemplateError(f"row template '{name}' must list buttons (mappings), "
+                                        f"not {_type_name(item)}")
+                resolved.append(self.extend(item, chain))
+        else:
+            raise TemplateError(f"template '{name}' must be a mapping (a button family) or a "
+                                f"list (a row), not {_type_name(template)}")
+        self._resolved[name] = resolved
+        return resolved
+
+    def extend(self, button, chain=()):
+        """Return button with the templates named by its extends: applied, in order."""
+        if "extends" not in button:
+            return button
+        merged = None
+        for name in _extends_names(button["extends"]):
+            base = self.resolve(name, chain)
+            if type(base) is not dict:
+                raise TemplateError(f"'{name}' is a row template; use it as its own "
+                                    f"'- extends: {name}' entry under buttons")
+            merged = base if merged is None else merge_button(merged, base)
+        return merge_button(merged, {k: v for k, v in button.items() if k != "extends"})
+
+
+def _raise_template_error(path, msg):
+    raise TemplateError(f"{format_path(path)}: {msg}")
+
+
+def expand_page_templates(page_data, templates=None, on_error=_raise_template_error):
+    """Expand the extends: entries of a parsed page; returns (page_data, origins).
+
+    templates is the shared TemplateSet; the page's own templates: key adds
+    page-local ones. origins[i] is the path, in the page file, of the entry
+    expanded button i came from (for positioned messages), or origins is
+    None when nothing was expanded. Entries that cannot be expanded are
+    reported with on_error(path, message) and dropped. Pages that use no
+    templates are returned as-is.
+    """
+    if type(page_data) is not dict:
+        return page_data, None
+    buttons = page_data.get("buttons")
+    local = page_data.get("templates")
+    if type(buttons) is not list or (
+        local is None and not any(type(b) is dict and "extends" in b for b in buttons)
+    ):
+        return page_data, None
+
+    if templates is None:
+        templates = TemplateSet()
+    if type(local) is dict:
+        templates = TemplateSet(local, parent=templates)
+        for name in local:
+            try:
+                templates.resolve(name)
+            except TemplateError as e:
+                on_error(("templates", name), str(e))
+
+    expanded = []
+    origins = []
+    for i, button in enumerate(buttons):
+        path = ("buttons", i)
+        if type(button) is not dict or "extends" not in button:
+            expanded.append(button)
+            origins.append(path)
+            continue
+        try:
+            names = _extends_names(button["extends"])
+            rows = [templates.resolve(name) for name in names]
+            if all(type(row) is dict for row in rows):
+                expanded.append(templates.extend(button))
+                origins.append(path)
+                continue
+            if not all(type(row) is list for row in rows):
+                raise TemplateError("cannot mix row and button templates in one extends")
+            extra = sorted(set(button) - {"extends", "notes"})
+            if extra:
+                raise TemplateError(f"a row entry takes only extends and notes, not {', '.join(extra)}")
+            for row in rows:
+                expanded.extend(row)
+                origins.extend([path] * len(row))
+        except TemplateError as e:
+            on_error(path + ("extends",), str(e))
+    return dict(page_data, buttons=expanded), origins
+
+
+def load_templates(config_dir):
+    """Load the shared templates from config/templates.yaml, if there is one."""
+    path = Path(config_dir) / TEMPLATES_FILENAME
+    try:
+        raw = path.read_bytes()
+    except FileNotFoundError:
+        return TemplateSet()
+    data = parse_yaml_bytes(raw, path)
+    return TemplateSet(_mapping(data).get("templates"), digest=_sha256(raw))
+
+
+def validate_templates(config_dir, templates, result):
+    """Check templates.yaml: its layout, and that every template expands."""
+    path = Path(config_dir) / TEMPLATES_FILENAME
+    if not templates.digest:
+        return
+    report = SourceReport(result, SourceMap(TEMPLATES_FILENAME, path=path))
+    check_templates_schema(load_yaml_file(path), (), report)
+    for name in templates.templates:
+        try:
+            templates.resolve(name)
+        except TemplateError as e:
+            report.error(("templates", name), str(e))
+
+
+# =============================================================================
+# SECTION 5: File I/O
+# =============================================================================
+
+class _NamedBytesIO(io.BytesIO):
+    """BytesIO carrying a file name so YAML error marks point at the file."""
+
+    def __init__(self, raw, name):
+        super().__init__(raw)
+        self.name = str(name)
+
+
+def parse_document(raw, name):
+    """Parse one YAML document, returning (data, marks).
+
+    marks maps each path in data to its (line, column), for SourceMap. The
+    node tree is composed once and both come from it, so this costs little
+    more than a plain yaml.load().
+    """
+    loader = YamlLoader(_NamedBytesIO(raw, name))
+    try:
+        node = loader.get_single_node()
+        data = loader.construct_document(node) if node is not None else None
+    finally:
+        loader.dispose()
+    marks = {}
+    if node is not None:
+        _collect_marks(node, marks)
+    return data, marks
+
+
+class ParseCache:
+    """Persistent cache of parsed YAML documents.
+
+    Entries are pickled per source path and store the file's mtime, size,
+    SHA-256, the data and its source positions (see parse_document()). A
+    matching mtime and size is trusted as-is; otherwise the content hash
+    decides, so touching a file without changing it is still a hit.
+    Disabled (always parses) when cache_dir is None, unless keep_in_memory()
+    was called: long-lived processes (--watch) also keep entries in memory
+    and skip the pickle round trip.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = None
+        self.memory = None
+        self.hits = 0
+        self.misses = 0
+        self.configure(cache_dir)
+
+    def keep_in_memory(self):
+        if self.memory is None:
+            self.memory = {}
+
+    def configure(self, cache_dir):
+        """Point the cache at cache_dir (None disables it). Counters are kept."""
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+
+    @property
+    def enabled(self):
+        return self.cache_dir is not None
+
+    def _entry_path(self, path):
+        return self.cache_dir / f"{_sha256(str(Path(path).resolve()))[:32]}.pickle"
+
+    def _read_entry(self, entry_path):
+        try:
+            with open(entry_path, "rb") as f:
+                return pickle.load(f)
+        except Exception:
+            return None
+
+    def _write_entry(self, entry_path, entry):
+        try:
+            entry_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = entry_path.with_name(entry_path.name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, entry_path)
+        except OSError:
+            pass  # a read-only cache only costs speed
+
+    def _lookup(self, path):
+        entry = self.memory.get(str(path)) if self.memory is not None else None
+        if entry is None and self.enabled:
+            entry = self._read_entry(self._entry_path(path))
+        if entry is not None and "marks" not in entry:
+            return None  # written before positions were recorded
+        return entry
+
+    def _store(self, path, entry):
+        if self.memory is not None:
+            self.memory[str(path)] = entry
+        if self.enabled:
+            self._write_entry(self._entry_path(path), entry)
+
+    def load(self, path, raw=None, marks=False):
+        """Return the parsed document for path. raw is the file contents, if already read.
+
+        With marks=True, returns (data, marks) where marks are the source
+        positions from parse_document(). Raises OSError / yaml.YAMLError like
+        a plain parse would.
+        """
+        if not self.enabled and self.memory is None:
+            if raw is None:
+                raw = Path(path).read_bytes()
+            if marks:
+                return parse_document(raw, path)
+            return yaml.load(_NamedBytesIO(raw, path), Loader=YamlLoader)
+
+        st = os.stat(path)
+        entry = self._lookup(path)
+        if (raw is None and entry and entry["mtime_ns"] == st.st_mtime_ns
+                and entry["size"] == st.st_size):
+            self.hits += 1
+            return (entry["data"], entry["marks"]) if marks else entry["data"]
+
+        if raw is None:
+            raw = Path(path).read_bytes()
+        digest = _sha256(raw)
+        if entry and entry["sha256"] == digest:
+            self.hits += 1
+            if entry["mtime_ns"] != st.st_mtime_ns:
+                self._store(path, dict(entry, mtime_ns=st.st_mtime_ns, size=st.st_size))
+            return (entry["data"], entry["marks"]) if marks else entry["data"]
+
+        self.misses += 1
+        data, positions = parse_document(raw, path)
+        self._store(path, {
+            "path": str(path),
+            "mtime_ns": st.st_mtime_ns,
+            "size": st.st_size,
+            "sha256": digest,
+            "data": data,
+            "marks": positions,
+        })
+        return (data, positions) if marks else data
+
+
+# Process-wide parse cache; main() (and each page worker) points it at
+# <cache dir>/parsed unless --no-cache is given.
+PARSE_CACHE = ParseCache()
+
+
+def load_yaml_file(path):
+    """Load and parse a YAML file."""
+    try:
+        return PARSE_CACHE.load(path)
+    except yaml.YAMLError as e:
+        print(f"ERROR: Failed to parse YAML file: {path}", file=sys.stderr)
+        print(f"  {e}", file=sys.stderr)
+        sys.exit(1)
+    except FileNotFoundError:
+        print(f"ERROR: File not found: {path}", file=sys.stderr)
+        sys.exit(1)
+
+
+def parse_yaml_bytes(raw, path, marks=False):
+    """Parse YAML from already-read file contents (same errors as load_yaml_file).
+
+    With marks=True, returns (data, marks) for a SourceMap.
+    """
+    try:
+        return PARSE_CACHE.load(path, raw, marks)
+    except yaml.YAMLError as e:
+        print(f"ERROR: Failed to parse YAML file: {path}", file=sys.stderr)
+        print(f"  {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def discover_page_files(pages_dir):
+    """Return the sorted list of page*.yaml paths in pages_dir."""
+    pages_path = Path(pages_dir)
+    if not pages_path.is_dir():
+        print(f"ERROR: Pages directory not found: {pages_dir}", file=sys.stderr)
+        sys.exit(1)
+
+    page_files = sorted(pages_path.glob("page*.yaml"))
+    if not page_files:
+        print(f"ERROR: No page*.yaml files found in {pages_dir}", file=sys.stderr)
+        sys.exit(1)
+    return page_files
+
+
+def load_all_pages(pages_dir, templates=None):
+    """Discover and load all page YAML files, sorted by name.
+
+    extends: entries are expanded with templates (default: the
+    templates.yaml next to pages_dir). Returns list of (filename,
+    parsed_data) tuples.
+    """
+    page_files = discover_page_files(pages_dir)
+    if templates is None:
+        templates = load_templates(Path(pages_dir).parent)
+
+    result = []
+    for pf in page_files:
+        try:
+            data, _origins = expand_page_templates(load_yaml_file(pf), templates)
+        except TemplateError as e:
+            print(f"ERROR: {pf.name}: {e}", file=sys.stderr)
+            sys.exit(1)
+        result.append((pf.name, data))
+
+    return result
+
+
+def load_parameters(path):
+    """Load parameters.yaml if it exists.
+
+    Returns parsed dict or None if file doesn't exist.
+    """
+    params_path = Path(path)
+    if not params_path.is_file():
+        return None
+    try:
+        data = PARSE_CACHE.load(params_path)
+        return data if data else None
+    except yaml.YAMLError as e:
+        print(f"ERROR: Failed to parse parameters file: {path}", file=sys.stderr)
+        print(f"  {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def _file_sha256(path):
+    """SHA-256 of an existing file, or None if it doesn't exist."""
+    h = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                h.update(chunk)
+    except FileNotFoundError:
+        return None
+    return h.hexdigest()
+
+
+def _commit_output(tmp_path, output_path, digest):
+    """Move tmp_path over output_path unless the content is identical.
+
+    Returns True if the output was (re)written, False if it was already
+    up to date (the existing file, and its mtime, are left untouched).
+    """
+    if _file_sha256(output_path) == digest:
+        os.remove(tmp_path)
+        return False
+    os.replace(tmp_path, output_path)
+    return True
+
+
+def _indented_json(value, level):
+    """json.dumps(value, indent=2) re-indented to sit at the given nesting level."""
+    return json.dumps(value, indent=2, ensure_ascii=False).replace("\n", "\n" + "  " * level)
+
+
+class PrettySerializer:
+    """json.dumps(indent=2): the default, and what Companion itself exports.
+
+    A serializer encodes values (as UTF-8 bytes) and supplies the whitespace
+    StreamingExportWriter puts between the members it writes itself.
+    """
+
+    name = "pretty"
+    newline = b"\n"
+    indent = b"  "
+    colon = b": "
+
+    def encode(self, value, level=0):
+        return _indented_json(value, level).encode("utf-8")
+
+
+class CompactSerializer(PrettySerializer):
+    """Stdlib JSON without whitespace: smaller, and faster to write and import."""
+
+    name = "compact"
+    newline = b""
+    indent = b""
+    colon = b":"
+
+    def encode(self, value, level=0):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class OrjsonSerializer(CompactSerializer):
+    """The same compact JSON, written by orjson (several times faster)."""
+
+    name = "orjson"
+
+    def encode(self, value, level=0):
+        return orjson.dumps(value)
+
+
+SERIALIZERS = {
+    "pretty": PrettySerializer,
+    "compact": CompactSerializer,
+    "orjson": OrjsonSerializer,
+}
+
+# --compress writes an archive copy next to the output; Companion itself
+# only imports the plain file.
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+COMPRESSION_LEVELS = {"gzip": 9, "zstd": 10}
+
+
+def missing_backend(name):
+    """Install hint if the serializer/compression `name` needs a missing package, else None."""
+    if name == "orjson" and orjson is None:
+        return "orjson is not installed (pip install orjson)"
+    if name == "zstd" and zstandard is None:
+        return "zstandard is not installed (pip install zstandard)"
+    return None
+
+
+def get_serializer(name="pretty"):
+    problem = missing_backend(name)
+    if problem:
+        raise ValueError(problem)
+    return SERIALIZERS[name]()
+
+
+def write_json_output(data, output_path, serializer=None):
+    """Write the Companion JSON config file (pretty-printed unless serializer says otherwise).
+
+    The file is written atomically and skipped if identical to what's there.
+    Returns True if the file changed.
+    """
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    encoded = (serializer or PrettySerializer()).encode(data)
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(encoded)
+    return _commit_output(tmp_path, output_path, hashlib.sha256(encoded).hexdigest())
+
+
+def compressed_path(output_path, method):
+    """church-config.companionconfig -> church-config.companionconfig.gz"""
+    return Path(str(output_path) + COMPRESSION_SUFFIXES[method])
+
+
+def write_compressed_copy(output_path, method):
+    """Compress output_path to an archive copy beside it.
+
+    gzip headers carry no timestamp, so identical output gives an identical
+    archive, which (like the output itself) is left untouched if unchanged.
+    Returns (archive path, archive size in bytes).
+    """
+    raw = Path(output_path).read_bytes()
+    if method == "gzip":
+        packed = gzip.compress(raw, compresslevel=COMPRESSION_LEVELS["gzip"], mtime=0)
+    else:
+        packed = zstandard.ZstdCompressor(level=COMPRESSION_LEVELS["zstd"]).compress(raw)
+    archive = compressed_path(output_path, method)
+    tmp_path = f"{archive}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(packed)
+    _commit_output(tmp_path, archive, hashlib.sha256(packed).hexdigest())
+    return archive, len(packed)
+
+
+class StreamingExportWriter:
+    """Write a full Companion export one page at a time.
+
+    Produces the same bytes as write_json_output(build_full_export(...)) with
+    the same serializer, but each page is serialized as soon as it is added,
+    so only one page needs to be in memory. Output goes to a temporary file
+    that finish() moves into place and abort() deletes, so a failed run never
+    leaves a partial config. The content is hashed as it is written; if it
+    matches the existing file, finish() keeps the old file and returns False.
+    """
+
+    def __init__(self, output_path, serializer=None):
+        self.output_path = str(output_path)
+        self.serializer = serializer or PrettySerializer()
+        output_dir = os.path.dirname(self.output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        self.tmp_path = self.output_path + ".tmp"
+        self.page_count = 0
+        self.sha256 = None
+        self._hash = hashlib.sha256()
+        self._f = open(self.tmp_path, "wb")
+        self._write(b"{" + self.serializer.newline)
+        self._write(self._member("version", FORMAT_VERSION, 1) + b"," + self.serializer.newline)
+        self._write(self._member("type", EXPORT_TYPE, 1) + b"," + self.serializer.newline)
+        self._write(self._member("companionBuild", COMPANION_BUILD, 1) + b"," + self.serializer.newline)
+        self._write(self._key("pages", 1) + b"{")
+
+    def _write(self, data):
+        self._f.write(data)
+        self._hash.update(data)
+
+    def _key(self, key, level):
+        ser = self.serializer
+        return ser.indent * level + ser.encode(key, level) + ser.colon
+
+    def _member(self, key, value, level):
+        return self._key(key, level) + self.serializer.encode(value, level)
+
+    def add_page(self, page_key, page):
+        self._write((b"," if self.page_count else b"") + self.serializer.newline)
+        self._write(self._member(str(page_key), page, 2))
+        self.page_count += 1
+
+    def finish(self, instances, custom_variables):
+        """Complete the export. Returns True if the output file changed."""
+        nl = self.serializer.newline
+        if self.page_count:
+            self._write(nl + self.serializer.indent + b"},")
+        else:
+            self._write(b"},")
+        self._write(nl + self._member("instances", instances, 1) + b",")
+        self._write(nl + self._member("custom_variables", custom_variables, 1) + nl + b"}")
+        self._f.close()
+        self.sha256 = self._hash.hexdigest()
+        return _commit_output(self.tmp_path, self.output_path, self.sha256)
+
+    def abort(self):
+        self._f.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+# =============================================================================
+# SECTION 5b: Incremental Build Cache
+# =============================================================================
+# Built page fragments are stored per page file, keyed by a hash of:
+#   - the raw page YAML bytes
+#   - the connection slice pages depend on (friendly id -> UUID/module, and
+#     the set of ids validation accepts)
+#   - the converter fingerprint (mapping tables + this script's source +
+#     templates.yaml, which any page may extend)
+# Machine IPs and other connection settings only feed build_connections(),
+# so editing them leaves every page key unchanged.
+
+def _sha256(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        h.update(part)
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def converter_fingerprint(deterministic_ids=False, templates=None):
+    """Hash of everything in this script (and the options and shared
+    templates) that affects page output."""
+    tables = json.dumps(
+        [
+            FORMAT_VERSION, COMPANION_BUILD, GRID_SIZE, FONT_SIZE_MAP, FIELD_MAP,
+            INTERNAL_ACTION_MAP, INTERNAL_OPTION_MAP, MODULE_ACTION_MAP,
+            MODULE_OPTION_MAP, MODULE_FEEDBACK_MAP, FEEDBACK_OPTION_MAP,
+        ],
+        sort_keys=True,
+        default=str,
+    )
+    options = json.dumps({"deterministic_ids": deterministic_ids})
+    templates_digest = templates.digest if templates is not None else ""
+    return _sha256(str(CACHE_VERSION), tables, options, templates_digest,
+                   Path(__file__).read_bytes())
+
+
+def connection_cache_slice(connection_map, connection_module_map, references):
+    """Serialize the parts of the connection setup that page output depends on."""
+    return json.dumps(
+        {
+            "uuids": connection_map,
+            "modules": connection_module_map,
+            **_as_reference_index(references).cache_slice(),
+        },
+        sort_keys=True,
+    )
+
+
+def page_cache_key(raw_page, conn_slice, fingerprint):
+    return _sha256(fingerprint, conn_slice, raw_page)
+
+
+class BuildCache:
+    """On-disk cache of built page fragments and stable connection UUIDs.
+
+    With keep_in_memory, entries read or written are also kept in memory, so
+    a long-lived process (--watch) doesn't re-read unchanged pages from disk.
+    """
+
+    def __init__(self, cache_dir, enabled=True, keep_in_memory=False):
+        self.cache_dir = Path(cache_dir)
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.memory = {} if keep_in_memory else None
+        self.manifest = {"version": CACHE_VERSION}
+        if enabled:
+            manifest = self._read_json(self.cache_dir / "manifest.json")
+            if manifest and manifest.get("version") == CACHE_VERSION:
+                self.manifest = manifest
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_json(path, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _page_path(self, page_file):
+        return self.cache_dir / "pages" / f"{page_file}.json"
+
+    def connection_uuids(self):
+        """Friendly connection id -> UUID recorded by the previous run."""
+        if not self.enabled:
+            return {}
+        return dict(self.manifest.get("connections", {}))
+
+    def get_page(self, page_file, key):
+        """Return the cached entry for page_file if its key matches, else None."""
+        if not self.enabled:
+            return None
+        entry = self.memory.get(page_file) if self.memory is not None else None
+        if entry is None or entry.get("key") != key:
+            entry = self._read_json(self._page_path(page_file))
+        if entry and entry.get("key") == key:
+            self.hits += 1
+            if self.memory is not None:
+                self.memory[page_file] = entry
+            return entry
+        self.misses += 1
+        return None
+
+    def put_page(self, page_file, key, entry):
+        if not self.enabled:
+            return
+        entry = dict(entry, key=key)
+        if self.memory is not None:
+            self.memory[page_file] = entry
+        self._write_json(self._page_path(page_file), entry)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def save(self, connection_map):
+        if not self.enabled:
+            return
+        self.manifest["connections"] = {
+            conn_id: conn_uuid
+            for conn_id, conn_uuid in connection_map.items()
+            if conn_id != "internal"
+        }
+        self._write_json(self.cache_dir / "manifest.json", self.manifest)
+
+
+# =============================================================================
+# SECTION 5c: Page Processing (serial or process pool)
+# =============================================================================
+# A page job is (page_file, path, raw_bytes). Processing parses, expands
+# templates, validates and — if the page has no errors and build=True —
+# builds it. Each job returns a cache entry, the parsed page (if keep_data)
+# and stats about the process that ran it.
+
+# Per-process build context, set once per worker by _init_page_worker() so the
+# connection maps aren't pickled with every job. See page_context().
+_PAGE_CONTEXT = {}
+
+
+def page_context(connection_map, connection_module_map, references,
+                 build=True, keep_data=False, parse_cache_dir=None, deterministic_ids=False,
+                 trace_memory=False, templates=None):
+    return {
+        "connection_map": connection_map,
+        "connection_module_map": connection_module_map,
+        "references": references,
+        "templates": templates,
+        "build": build,
+        "deterministic_ids": deterministic_ids,
+        "keep_data": keep_data,
+        "parse_cache_dir": parse_cache_dir,
+        "trace_memory": trace_memory,
+    }
+
+
+def _init_page_worker(context):
+    _PAGE_CONTEXT.update(context)
+    PARSE_CACHE.configure(context["parse_cache_dir"])
+    if context.get("trace_memory") and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def _page_entry(page_data, page, validation, links=(), uses=None):
+    """Cache entry for one page: metadata, built page (or None), validation
+    messages, set_page links (checked across pages by check_page_links()) and
+    what the buttons use (see page_usage())."""
+    page_meta = _mapping(_mapping(page_data).get("page"))
+    return {
+        "number": page_meta.get("number", 0),
+        "name": page_meta.get("name", "Unnamed"),
+        "page": page,
+        "validation": validation,
+        "links": [list(link) for link in links],
+        "uses": uses or {"actions": [], "variables": []},
+    }
+
+
+def _process_page_job(job):
+    page_file, path, raw = job
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        mem_base = tracemalloc.get_traced_memory()[0]
+    hits_before = PARSE_CACHE.hits
+    page_data, marks = parse_yaml_bytes(raw, path, marks=True)
+    parse_hit = PARSE_CACHE.hits > hits_before
+    page_result = ValidationResult()
+    source = SourceMap(page_file, marks=marks)
+    page_data, origins = expand_page_templates(
+        page_data, _PAGE_CONTEXT["templates"], SourceReport(page_result, source).error
+    )
+
+    # One walk over the buttons validates them and puts each clean one into
+    # the page's IR grid; the page is then built from the IR.
+    page = None
+    dedupe = (0, 0, 0.0)
+    page_ir = Page.from_meta(page_data) if _PAGE_CONTEXT["build"] else None
+    links = validate_page(page_data, page_file, _PAGE_CONTEXT["references"], page_result,
+                          page_ir.add if page_ir is not None else None, source, origins)
+    if page_ir is not None and not page_result.has_errors:
+        connection_map = _PAGE_CONTEXT["connection_map"]
+        connection_module_map = _PAGE_CONTEXT["connection_module_map"]
+        controls_cache = get_control_cache(connection_map, connection_module_map)
+        before = (controls_cache.built, controls_cache.deduped, controls_cache.saved_seconds())
+        page = build_page(page_ir, connection_map, connection_module_map,
+                          _PAGE_CONTEXT["deterministic_ids"])
+        after = (controls_cache.built, controls_cache.deduped, controls_cache.saved_seconds())
+        dedupe = tuple(b - a for a, b in zip(before, after))
+    entry = _page_entry(page_data, page, page_result.as_dict(), links, page_usage(page_data))
+    kept = page_data if _PAGE_CONTEXT["keep_data"] else None
+    stats = {
+        "pid": os.getpid(),
+        "seconds": time.perf_counter() - start,
+        "cpu_seconds": time.process_time() - cpu_start,
+        "alloc_base_bytes": mem_base if tracing else None,
+        "alloc_peak_bytes": tracemalloc.get_traced_memory()[1] - mem_base if tracing else None,
+        "parse_hit": parse_hit,
+        "controls_built": dedupe[0],
+        "controls_deduped": dedupe[1],
+        "dedupe_saved": dedupe[2],
+    }
+    return entry, kept, stats
+
+
+def _record_timing(timings, stats):
+    worker = timings.setdefault(stats["pid"], {
+        "pages": 0, "seconds": 0.0, "parse_hits": 0,
+        "controls_built": 0, "controls_deduped": 0, "dedupe_saved": 0.0,
+    })
+    worker["pages"] += 1
+    worker["seconds"] += stats["seconds"]
+    worker["parse_hits"] += int(stats["parse_hit"])
+    worker["controls_built"] += stats["controls_built"]
+    worker["controls_deduped"] += stats["controls_deduped"]
+    worker["dedupe_saved"] += stats["dedupe_saved"]
+
+
+def print_dedupe_stats(built, deduped, saved_seconds):
+    if built or deduped:
+        print(f"  Controls: {built} built, {deduped} deduped "
+              f"(~{saved_seconds * 1000:.1f} ms build time saved)")
+
+
+def iter_processed_pages(tasks, context, workers=1):
+    """Process page jobs lazily, in order, with a bounded number in flight.
+
+    tasks yields (job, extra) pairs; job is a page job, or None to pass extra
+    straight through (e.g. a cached page). Yields (extra, processed) in input
+    order, where processed is _process_page_job()'s result or None. At most
+    2 * workers jobs are outstanding, so memory stays bounded by a few pages.
+    """
+    if workers <= 1:
+        _init_page_worker(context)
+        for job, extra in tasks:
+            yield extra, (_process_page_job(job) if job else None)
+        return
+
+    pending = deque()
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_page_worker, initargs=(context,)
+    ) as pool:
+        for job, extra in tasks:
+            pending.append((extra, pool.submit(_process_page_job, job) if job else None))
+            if len(pending) > 2 * workers:
+                extra, future = pending.popleft()
+                yield extra, (future.result() if future else None)
+        while pending:
+            extra, future = pending.popleft()
+            yield extra, (future.result() if future else None)
+
+
+def process_pages(jobs, context, workers=1):
+    """Parse, validate and build a list of page jobs, serially or in a process pool.
+
+    Returns ([(entry, page_data), ...], timings) in job order; page_data is
+    only returned when context["keep_data"] is set. timings is
+    {pid: {"pages", "seconds", "parse_hits"}}.
+    """
+    timings = {}
+    processed = []
+    tasks = ((job, None) for job in jobs)
+    for _extra, (entry, page_data, stats) in iter_processed_pages(
+        tasks, context, min(workers, len(jobs))
+    ):
+        _record_timing(timings, stats)
+        processed.append((entry, page_data))
+    return processed, timings
+
+
+def print_cache_stats(parse_hits, parse_lookups, build_cache=None):
+    loader = YamlLoader.__name__
+    if PARSE_CACHE.enabled and parse_lookups:
+        rate = 100.0 * parse_hits / parse_lookups
+        print(f"  YAML parse cache: {parse_hits}/{parse_lookups} hits ({rate:.0f}%), loader {loader}")
+    else:
+        print(f"  YAML parse cache: disabled, loader {loader}")
+    if build_cache is not None and build_cache.enabled:
+        lookups = build_cache.hits + build_cache.misses
+        rate = 100.0 * build_cache.hits / lookups if lookups else 0.0
+        print(f"  Page build cache: {build_cache.hits}/{lookups} hits ({rate:.0f}%)")
+
+
+def print_worker_timings(timings, jobs):
+    print(f"  Worker timing ({len(timings)} processes, --jobs {jobs}):")
+    for n, stats in enumerate(timings.values(), 1):
+        print(f"    worker {n}: {stats['pages']} pages in {stats['seconds'] * 1000:.1f} ms")
+
+
+# =============================================================================
+# SECTION 5d: Multi-Site Batch Generation
+# =============================================================================
+# Sites share connections.yaml, variables.yaml and pages/, and differ only in
+# their parameters file. Pages are parsed and validated once; each site then
+# builds its own connections (UUIDs, module choice, IPs) and pages, in its own
+# process, with its own build cache so per-site UUIDs stay stable.
+
+_SITE_CONTEXT = {}
+
+
+def _init_site_worker(yaml_connections, yaml_variables, pages, fingerprint,
+                      references, parse_cache_dir, deterministic_ids,
+                      serializer="pretty", compress=()):
+    _SITE_CONTEXT.update(
+        yaml_connections=yaml_connections,
+        yaml_variables=yaml_variables,
+        pages=pages,
+        fingerprint=fingerprint,
+        references=references,
+        deterministic_ids=deterministic_ids,
+        serializer=serializer,
+        compress=compress,
+    )
+    PARSE_CACHE.configure(parse_cache_dir)
+
+
+def _build_site_job(job):
+    site, params_path, output_path, cache_dir = job
+    start = time.perf_counter()
+    try:
+        params = load_parameters(params_path)
+        cache = BuildCache(cache_dir, enabled=cache_dir is not None)
+        instances, connection_map, connection_module_map = build_connections(
+            _SITE_CONTEXT["yaml_connections"], params, cache.connection_uuids(),
+            _SITE_CONTEXT["deterministic_ids"],
+        )
+        conn_slice = connection_cache_slice(
+            connection_map, connection_module_map, _SITE_CONTEXT["references"]
+        )
+
+        writer = StreamingExportWriter(output_path, get_serializer(_SITE_CONTEXT["serializer"]))
+        controls = get_control_cache(connection_map, connection_module_map)
+        total_buttons = 0
+        try:
+            for page_file, raw, page_data, validation in _SITE_CONTEXT["pages"]:
+                key = page_cache_key(raw, conn_slice, _SITE_CONTEXT["fingerprint"])
+                entry = cache.get_page(page_file, key)
+                if entry is None:
+                    page = build_page(page_data, connection_map, connection_module_map,
+                                      _SITE_CONTEXT["deterministic_ids"])
+                    entry = _page_entry(page_data, page, validation)
+                    cache.put_page(page_file, key, entry)
+                writer.add_page(entry["number"], entry["page"])
+                total_buttons += sum(len(cols) for cols in entry["page"]["controls"].values())
+            changed = writer.finish(instances, build_custom_variables(_SITE_CONTEXT["yaml_variables"]))
+        except BaseException:
+            writer.abort()
+            raise
+        for method in _SITE_CONTEXT["compress"]:
+            write_compressed_copy(output_path, method)
+        cache.save(connection_map)
+    except SystemExit:
+        # load_parameters() has already printed the parse error
+        return {
+            "site": site,
+            "ok": False,
+            "error": f"could not load {params_path} (see error above)",
+            "seconds": time.perf_counter() - start,
+        }
+    except Exception as e:
+        return {
+            "site": site,
+            "ok": False,
+            "error": f"{type(e).__name__}: {e}",
+            "seconds": time.perf_counter() - start,
+        }
+    return {
+        "site": site,
+        "ok": True,
+        "output": output_path,
+        "changed": changed,
+        "pages": writer.page_count,
+        "buttons": total_buttons,
+        "connections": len(instances),
+        "reused": cache.hits,
+        "deduped": controls.deduped,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def discover_site_files(sites_dir):
+    """Return sorted (site_name, path) pairs for every *.yaml/*.yml in sites_dir."""
+    sites_path = Path(sites_dir)
+    if not sites_path.is_dir():
+        print(f"ERROR: Sites directory not found: {sites_dir}", file=sys.stderr)
+        sys.exit(1)
+    site_files = sorted(list(sites_path.glob("*.yaml")) + list(sites_path.glob("*.yml")))
+    if not site_files:
+        print(f"ERROR: No site parameter files (*.yaml) found in {sites_dir}", file=sys.stderr)
+        sys.exit(1)
+    return [(sf.stem, sf) for sf in site_files]
+
+
+def build_sites(site_jobs, yaml_connections, yaml_variables, pages, fingerprint,
+                references, parse_cache_dir=None, deterministic_ids=False, workers=1,
+                serializer="pretty", compress=()):
+    """Build every site job, serially or in a process pool. Returns summaries in job order."""
+    context = (yaml_connections, yaml_variables, pages, fingerprint, references,
+               parse_cache_dir, deterministic_ids, serializer, tuple(compress))
+    if workers <= 1 or len(site_jobs) <= 1:
+        _init_site_worker(*context)
+        return [_build_site_job(job) for job in site_jobs]
+    with ProcessPoolExecutor(
+        max_workers=min(workers, len(site_jobs)),
+        initializer=_init_site_worker,
+        initargs=context,
+    ) as pool:
+        return list(pool.map(_build_site_job, site_jobs))
+
+
+def print_site_summary(summaries, elapsed):
+    ok = [s for s in summaries if s["ok"]]
+    failed = [s for s in summaries if not s["ok"]]
+    print(f"\nSite batch / サイト一括生成: {len(ok)} succeeded, {len(failed)} failed "
+          f"({elapsed * 1000:.0f} ms total)")
+    for s in summaries:
+        if s["ok"]:
+            print(f"  [ OK ] {s['site']}: {s['pages']} pages, {s['buttons']} buttons, "
+                  f"{s['connections']} connections, {s['reused']} pages reused, "
+                  f"{s['deduped']} controls deduped "
+                  f"({s['seconds'] * 1000:.1f} ms) -> {s['output']}"
+                  f"{'' if s['changed'] else ' (unchanged)'}")
+        else:
+            print(f"  [FAIL] {s['site']}: {s['error']} ({s['seconds'] * 1000:.1f} ms)")
+    print()
+
+
+def run_site_batch(args, config_dir, sites_dir, output_dir, cache_root, yaml_connections,
+                   yaml_variables, page_files):
+    """Validate shared pages once, then generate one config per site file."""
+    start = time.perf_counter()
+    sites = discover_site_files(sites_dir)
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    if args.verbose:
+        print(f"  Found {len(sites)} site parameter files in {sites_dir}")
+
+    templates = load_templates(config_dir)
+    result = ValidationResult()
+    if not validate_specs(config_dir, yaml_connections, yaml_variables, result, templates):
+        result.print_report()
+        print("Validation failed with errors. Fix errors before generating config.")
+        print("バリデーションエラーがあります。設定生成前にエラーを修正してください。")
+        sys.exit(1)
+    references = ReferenceIndex(yaml_connections, yaml_variables)
+    parse_cache_dir = PARSE_CACHE.cache_dir and str(PARSE_CACHE.cache_dir)
+    parse_before = (PARSE_CACHE.hits, PARSE_CACHE.misses)
+    raws = [pf.read_bytes() for pf in page_files]
+    processed, worker_timings = process_pages(
+        [(pf.name, str(pf), raw) for pf, raw in zip(page_files, raws)],
+        page_context({}, {}, references, build=False, keep_data=True,
+                     parse_cache_dir=parse_cache_dir, templates=templates),
+        workers=jobs,
+    )
+    for entry, _page_data in processed:
+        result.extend(entry["validation"])
+    check_page_links(
+        ((pf.name, entry["number"], entry["links"]) for pf, (entry, _) in zip(page_files, processed)),
+        result,
+    )
+    result.print_report()
+
+    if result.has_errors:
+        print("Validation failed with errors. Fix errors before generating config.")
+        print("バリデーションエラーがあります。設定生成前にエラーを修正してください。")
+        sys.exit(1)
+    if args.strict and result.warnings:
+        print("Strict mode: warnings treated as errors.")
+        sys.exit(1)
+    if args.validate_only:
+        print("Validation passed. YAML specs are valid.")
+        print("バリデーション成功。YAMLスペックは有効です。")
+        return
+    if args.verbose and jobs > 1:
+        print_worker_timings(worker_timings, jobs)
+    if args.cache_stats:
+        parse_hits = parse_before[0] + sum(w["parse_hits"] for w in worker_timings.values())
+        parse_lookups = sum(parse_before) + len(page_files)
+        print_cache_stats(parse_hits, parse_lookups)
+
+    pages = [
+        (pf.name, raw, page_data, entry["validation"])
+        for pf, raw, (entry, page_data) in zip(page_files, raws, processed)
+    ]
+    site_jobs = [
+        (
+            site,
+            str(path),
+            str(Path(output_dir) / f"{site}.companionconfig"),
+            None if args.no_cache else str(Path(cache_root) / "sites" / site),
+        )
+        for site, path in sites
+    ]
+    summaries = build_sites(
+        site_jobs, yaml_connections, yaml_variables, pages,
+        converter_fingerprint(args.deterministic_ids, templates), references, parse_cache_dir,
+        deterministic_ids=args.deterministic_ids, workers=jobs,
+        serializer=args.serializer, compress=args.compress,
+    )
+    print_site_summary(summaries, time.perf_counter() - start)
+    if any(not s["ok"] for s in summaries):
+        sys.exit(1)
+
+
+# =============================================================================
+# SECTION 5e: Profiling (--profile)
+# =============================================================================
+# Wall time, CPU time and traced memory (tracemalloc) per phase of convert()
+# and per page, written as a JSON metrics report next to the output file so
+# it can be collected by dashboards. CPU time is this process only; pages
+# built in worker processes carry their own per-page numbers.
+
+METRICS_VERSION = 1
+
+
+class PhaseProfiler:
+    """Collects per-phase and per-page metrics. A disabled profiler is a no-op."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.phases = []
+        self.pages = []
+        self._nested_peak = 0
+        self._run_peak = 0
+        self._start = None
+        if enabled:
+            tracemalloc.start()
+            self._start = (time.perf_counter(), time.process_time())
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        tracemalloc.reset_peak()
+        self._nested_peak = 0
+        mem_base = tracemalloc.get_traced_memory()[0]
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, self._nested_peak)
+            self._run_peak = max(self._run_peak, peak)
+            self.phases.append({
+                "name": name,
+                "wall_seconds": time.perf_counter() - wall,
+                "cpu_seconds": time.process_time() - cpu,
+                "alloc_peak_bytes": peak - mem_base,
+                "alloc_net_bytes": current - mem_base,
+            })
+
+    def page(self, page_file, entry, source, stats=None):
+        """Record one page; stats is _process_page_job()'s, None for cache hits."""
+        if not self.enabled:
+            return
+        record = {"file": page_file, "number": entry["number"], "source": source}
+        if stats:
+            record.update(
+                pid=stats["pid"],
+                wall_seconds=stats["seconds"],
+                cpu_seconds=stats["cpu_seconds"],
+                alloc_peak_bytes=stats["alloc_peak_bytes"],
+                parse_hit=stats["parse_hit"],
+            )
+            # An in-process page job resets the tracemalloc peak; keep the
+            # enclosing phase's peak honest.
+            if stats["pid"] == os.getpid() and stats["alloc_peak_bytes"] is not None:
+                self._nested_peak = max(
+                    self._nested_peak, stats["alloc_base_bytes"] + stats["alloc_peak_bytes"]
+                )
+        self.pages.append(record)
+
+    def stop(self):
+        """Stop tracing and return (wall_seconds, cpu_seconds, peak_bytes) for the run."""
+        peak = max(tracemalloc.get_traced_memory()[1], self._run_peak)
+        tracemalloc.stop()
+        wall, cpu = self._start
+        return time.perf_counter() - wall, time.process_time() - cpu, peak
+
+    def report(self, summary, output_path, jobs):
+        wall, cpu, peak = self.stop()
+        result = summary["result"]
+        return {
+            "metrics_version": METRICS_VERSION,
+            "recorded": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "output": str(output_path),
+            "python": sys.version.split()[0],
+            "yaml_loader": YamlLoader.__name__,
+            "jobs": jobs,
+            "totals": {"wall_seconds": wall, "cpu_seconds": cpu, "alloc_peak_bytes": peak},
+            "phases": self.phases,
+            "pages": self.pages,
+            "counts": {
+                "pages": summary["pages"],
+                "buttons": summary["buttons"],
+                "connections": len(summary["instances"]),
+                "pages_reused": sum(1 for p in self.pages if p["source"] == "cached"),
+                "pages_rebuilt": sum(1 for p in self.pages if p["source"] == "built"),
+                "errors": len(result.errors),
+                "warnings": len(result.warnings),
+            },
+            "output_changed": summary["changed"],
+        }
+
+
+def metrics_path(output_path):
+    """church-config.companionconfig -> church-config.metrics.json"""
+    return Path(output_path).with_suffix(".metrics.json")
+
+
+def print_profile(report, slowest=5):
+    print("Profile / プロファイル:")
+    print(f"  {'phase':<18} {'wall':>10} {'cpu':>10} {'alloc peak':>11}")
+    for p in report["phases"]:
+        print(f"  {p['name']:<18} {p['wall_seconds'] * 1000:>7.1f} ms {p['cpu_seconds'] * 1000:>7.1f} ms"
+              f" {p['alloc_peak_bytes'] / 1024:>8.0f} KB")
+    totals = report["totals"]
+    print(f"  {'total':<18} {totals['wall_seconds'] * 1000:>7.1f} ms {totals['cpu_seconds'] * 1000:>7.1f} ms"
+          f" {totals['alloc_peak_bytes'] / 1024:>8.0f} KB")
+    built = [p for p in report["pages"] if p["source"] == "built"]
+    if built:
+        print(f"  Slowest pages:")
+        for p in sorted(built, key=lambda p: p["wall_seconds"], reverse=True)[:slowest]:
+            print(f"    {p['file']}: {p['wall_seconds'] * 1000:.1f} ms")
+
+
+# =============================================================================
+# SECTION 5f: Watch Mode
+# =============================================================================
+# --watch keeps one process alive across edits so the interpreter, PyYAML and
+# the compiled resolver tables stay loaded, and the parse and build caches are
+# served from memory. Each change re-runs convert(): unchanged pages are cache
+# hits, so only edited pages are parsed, validated and rebuilt.
+
+WATCH_DEBOUNCE_SECONDS = 0.05
+WATCH_POLL_SECONDS = 0.25
+
+
+class InotifyWatcher:
+    """Watch directories for YAML changes with Linux inotify (via libc)."""
+
+    IN_MODIFY = 0x002
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_Q_OVERFLOW = 0x4000
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self, directories):
+        libc = ctypes.CDLL(None, use_errno=True)
+        self._fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = (self.IN_CLOSE_WRITE | self.IN_MOVED_FROM | self.IN_MOVED_TO
+                | self.IN_CREATE | self.IN_DELETE)
+        self._dirs = {}
+        for directory in directories:
+            wd = libc.inotify_add_watch(self._fd, os.fsencode(directory), mask)
+            if wd < 0:
+                os.close(self._fd)
+                raise OSError(ctypes.get_errno(), f"cannot watch {directory}")
+            self._dirs[wd] = Path(directory)
+
+    def _read_events(self, changed):
+        data = os.read(self._fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                # Events were dropped; treat every file as changed
+                changed.update(p for d in self._dirs.values() for p in d.iterdir())
+            elif wd in self._dirs and name:
+                changed.add(self._dirs[wd] / os.fsdecode(name))
+
+    def wait(self):
+        """Block until something changes; return the changed paths.
+
+        Events arriving within WATCH_DEBOUNCE_SECONDS of each other are
+        merged, so an editor's write-rename-chmod counts as one change.
+        """
+        changed = set()
+        select.select([self._fd], [], [])
+        while True:
+            self._read_events(changed)
+            ready, _, _ = select.select([self._fd], [], [], WATCH_DEBOUNCE_SECONDS)
+            if not ready:
+                return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Fallback watcher for platforms without inotify: polls file mtimes."""
+
+    def __init__(self, directories):
+        self._dirs = [Path(d) for d in directories]
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for directory in self._dirs:
+            for path in directory.iterdir():
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                snapshot[path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def wait(self):
+        while True:
+            time.sleep(WATCH_POLL_SECONDS)
+            snapshot = self._scan()
+            changed = {
+                path for path in snapshot.keys() | self._snapshot.keys()
+                if snapshot.get(path) != self._snapshot.get(path)
+            }
+            self._snapshot = snapshot
+            if changed:
+                return changed
+
+    def close(self):
+        pass
+
+
+def make_watcher(directories):
+    """Return an InotifyWatcher where supported, else a PollingWatcher."""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(directories)
+
+
+def _message_lines(result):
+    return (
+        [f"[ERROR] {e}" for e in result.errors]
+        + [f"[WARN]  {w}" for w in result.warnings]
+        + [f"[INFO]  {i}" for i in result.info]
+    )
+
+
+# Line numbers shift as lines are added above a message; compare without them
+_MESSAGE_POSITION = re.compile(r"(\.ya?ml):\d+:\d+:")
+
+
+def _without_position(line):
+    return _MESSAGE_POSITION.sub(r"\1:", line, count=1)
+
+
+def print_watch_result(summary, seconds, previous_messages, cache):
+    """Print one rebuild: message counts, errors, new messages and latency."""
+    result = summary["result"]
+    messages = _message_lines(result)
+    print(f"  ERRORS: {len(result.errors)}  WARNINGS: {len(result.warnings)}  INFO: {len(result.info)}")
+    seen = {_without_position(line) for line in previous_messages}
+    for line in messages:
+        if line.startswith("[ERROR]") or _without_position(line) not in seen:
+            print(f"  {line}")
+    resolved = len(seen - {_without_position(line) for line in messages})
+    if resolved:
+        print(f"  ({resolved} earlier message(s) resolved)")
+
+    if summary["changed"] is None:
+        outcome = "output not written / 出力なし"
+    elif summary["changed"]:
+        outcome = "output updated / 出力を更新"
+    else:
+        outcome = "output unchanged / 出力に変更なし"
+    if cache.enabled:
+        pages = f"{cache.misses} page(s) rebuilt, {cache.hits} cached"
+    else:
+        pages = f"{summary['pages']} page(s) rebuilt"
+    print(f"  {pages}, {outcome} in {seconds * 1000:.1f} ms")
+    return messages
+
+
+def watch_config(args, config_dir, output_path, cache, jobs):
+    """Build once, then rebuild on every relevant change until interrupted."""
+    pages_dir = config_dir / "pages"
+    params_path = Path(args.params or config_dir / "parameters.yaml")
+    directories = {config_dir, pages_dir, params_path.parent}
+    relevant = {
+        (config_dir / "connections.yaml").resolve(),
+        (config_dir / "variables.yaml").resolve(),
+        (config_dir / TEMPLATES_FILENAME).resolve(),
+        params_path.resolve(),
+    }
+    PARSE_CACHE.keep_in_memory()
+    watcher = make_watcher(sorted(directories))
+    print(f"Watching {config_dir} ({type(watcher).__name__}). Press Ctrl+C to stop.")
+    print(f"{config_dir} を監視中。Ctrl+C で終了します。")
+
+    changed_names = ["initial build"]
+    messages = None
+    try:
+        while True:
+            start = time.perf_counter()
+            print(f"\n[{time.strftime('%H:%M:%S')}] {', '.join(changed_names)}")
+            cache.reset_stats()
+            try:
+                # The first build may fan out to worker processes; after
+                # that, edits touch a page or two and the warm in-process
+                # caches beat a pool start-up.
+                summary = convert(args, config_dir, output_path, cache,
+                                  jobs if messages is None else 1)
+            except SystemExit:
+                print("  Could not load the config (see error above); waiting for the next change.")
+            except Exception as e:
+                # A half-saved file can parse but have the wrong shape
+                print(f"  ERROR: {type(e).__name__}: {e}")
+                print("  Could not build the config; waiting for the next change.")
+            else:
+                seconds = time.perf_counter() - start
+                if messages is None:
+                    summary["result"].print_report()
+                    messages = _message_lines(summary["result"])
+                    print(f"  Initial build: {summary['pages']} page(s) in {seconds * 1000:.1f} ms")
+                else:
+                    messages = print_watch_result(summary, seconds, messages, cache)
+
+            while True:
+                paths = watcher.wait()
+                changed = sorted(
+                    p for p in paths
+                    if p.resolve() in relevant
+                    or (p.parent == pages_dir and p.suffix in (".yaml", ".yml"))
+                )
+                if changed:
+                    changed_names = [p.name for p in changed]
+                    break
+    except KeyboardInterrupt:
+        print("\nStopped watching. / 監視を終了しました。")
+    finally:
+        watcher.close()
+
+
+# =============================================================================
+# SECTION 5g: Partial Exports (--partial)
+# =============================================================================
+# Companion can import a single page from a "page" export: the page plus the
+# connections its buttons use. --partial compares every page, connection and
+# the custom variables with a previous full export and writes page exports
+# only for pages that differ, so a one-button fix replaces one page in
+# Companion instead of reloading the whole configuration. Changed connections
+# and variables go into one full-format file that holds nothing else.
+
+def _json_digest(value):
+    text = json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def export_digests(path):
+    """Per-page and per-connection digests of a previous full export.
+
+    Returns None if there is no usable export at path (everything then
+    counts as changed).
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict) or data.get("type") != EXPORT_TYPE:
+        return None
+    return {
+        "pages": {str(key): _json_digest(page) for key, page in data.get("pages", {}).items()},
+        "instances": {key: _json_digest(inst) for key, inst in data.get("instances", {}).items()},
+        "custom_variables": _json_digest(data.get("custom_variables", {})),
+    }
+
+
+def page_connection_ids(value, found=None):
+    """Every connection UUID referenced by an action or feedback in value."""
+    if found is None:
+        found = set()
+    if isinstance(value, dict):
+        conn_id = value.get(FIELD_MAP["action_conn_key"])
+        if isinstance(conn_id, str):
+            found.add(conn_id)
+        for child in value.values():
+            page_connection_ids(child, found)
+    elif isinstance(value, list):
+        for child in value:
+            page_connection_ids(child, found)
+    return found
+
+
+def partial_dir(output_path):
+    """church-config.companionconfig -> church-config.partial/"""
+    return Path(output_path).with_suffix(".partial")
+
+
+class PartialExport:
+    """Collects pages that differ from a previous export and writes them.
+
+    Only changed pages are kept in memory. finish() writes nothing until the
+    run has validated, and clears files from an earlier --partial run first,
+    so the directory always holds exactly one deploy's worth of changes.
+    """
+
+    def __init__(self, output_dir, previous, serializer=None):
+        self.output_dir = Path(output_dir)
+        self.serializer = serializer
+        self.has_baseline = previous is not None
+        self.previous = previous or {"pages": {}, "instances": {}, "custom_variables": None}
+        self.changed_pages = {}
+        self.unchanged_pages = 0
+        self.files = []
+        self.changed_instances = []
+        self.removed_pages = []
+        self.removed_instances = []
+        self.variables_changed = False
+
+    def add_page(self, page_key, page):
+        key = str(page_key)
+        if self.previous["pages"].pop(key, None) == _json_digest(page):
+            self.unchanged_pages += 1
+        else:
+            self.changed_pages[key] = page
+
+    def finish(self, instances, custom_variables):
+        """Write one page export per changed page, plus changed connections."""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        for old in self.output_dir.glob("*.companionconfig"):
+            old.unlink()
+
+        for key, page in self.changed_pages.items():
+            used = page_connection_ids(page)
+            data = {
+                "version": FORMAT_VERSION,
+                "type": PAGE_EXPORT_TYPE,
+                "companionBuild": COMPANION_BUILD,
+                "page": page,
+                "instances": {uid: inst for uid, inst in instances.items() if uid in used},
+                "oldPageNumber": int(key),
+            }
+            path = self.output_dir / f"page{int(key):02d}.companionconfig"
+            write_json_output(data, str(path), self.serializer)
+            self.files.append((path, f"Page {key}: {page['name']}"))
+
+        previous_instances = self.previous["instances"]
+        self.changed_instances = [
+            uid for uid, inst in instances.items()
+            if previous_instances.get(uid) != _json_digest(inst)
+        ]
+        self.removed_instances = [uid for uid in previous_instances if uid not in instances]
+        self.removed_pages = sorted(self.previous["pages"], key=int)
+        self.variables_changed = self.previous["custom_variables"] != _json_digest(custom_variables)
+        if self.changed_instances or self.variables_changed:
+            data = build_full_export(
+                {},
+                {uid: instances[uid] for uid in self.changed_instances},
+                custom_variables if self.variables_changed else {},
+            )
+            path = self.output_dir / "connections.companionconfig"
+            write_json_output(data, str(path), self.serializer)
+            parts = []
+            if self.changed_instances:
+                parts.append(f"{len(self.changed_instances)} connection(s)")
+            if self.variables_changed:
+                parts.append("custom variables")
+            self.files.append((path, ", ".join(parts)))
+
+
+def print_partial_summary(partial):
+    print(f"Partial export / 差分エクスポート: {partial.output_dir}")
+    if not partial.has_baseline:
+        print("  No previous export to compare against; every page was written.")
+        print("  比較対象の前回エクスポートがないため、全ページを出力しました。")
+    if not partial.files and not partial.removed_pages and not partial.removed_instances:
+        print("  Nothing changed since the previous export. / 前回のエクスポートから変更なし。")
+        return
+    for path, description in partial.files:
+        print(f"  {path.name:<30} {description}")
+    print(f"  Unchanged pages: {partial.unchanged_pages}")
+    if partial.removed_pages:
+        print(f"  Pages no longer generated (clear them in Companion): {', '.join(partial.removed_pages)}")
+    if partial.removed_instances:
+        print(f"  Connections no longer generated (remove them in Companion): "
+              f"{len(partial.removed_instances)}")
+    print()
+    print("Deploy / 反映手順:")
+    print("  Import each page file in Companion's Import/Export tab; it replaces only that page.")
+    print("  各ページファイルをインポートすると、そのページだけが置き換わります。")
+    if any(path.name == "connections.companionconfig" for path, _ in partial.files):
+        print("  For connections.companionconfig, import only Connections / Custom Variables.")
+
+
+# =============================================================================
+# SECTION 5h: Converter Service (--serve)
+# =============================================================================
+# --serve keeps one converter process running behind a Unix socket, with the
+# same warm in-memory parse and build caches as --watch, so editor hooks and
+# scripts get answers without paying for interpreter and PyYAML start-up.
+# Requests and responses are single-line JSON objects, one per line; a client
+# may send several requests over one connection:
+#
+#   {"command": "validate"}                  -> validation messages
+#   {"command": "build", "strict": true}     -> writes the output file
+#   {"command": "build-page", "page": 3}     -> one built page, nothing written
+#   {"command": "status"} / {"command": "shutdown"}
+#
+# Every response has "ok" (and "error" when a request could not be run).
+# scripts/converter-client.py is the command-line client.
+
+SERVICE_SOCKET_NAME = "converter.sock"
+SERVICE_PROTOCOL = 1
+SERVICE_MAX_REQUEST = 64 * 1024
+
+
+class ConverterService:
+    """Answer service requests, one at a time, against warm caches."""
+
+    def __init__(self, args, config_dir, output_path, cache, socket_path):
+        self.args = args
+        self.config_dir = config_dir
+        self.output_path = output_path
+        self.cache = cache
+        self.socket_path = socket_path
+        self.started = time.time()
+        self.requests = 0
+        self.running = True
+        self.encoder = get_serializer("orjson" if orjson else "compact")
+        self.handlers = {
+            "validate": self.validate,
+            "build": self.build,
+            "build-page": self.build_page,
+            "status": self.status,
+            "shutdown": self.shutdown,
+        }
+
+    def run(self, jobs=1, validate_only=False, strict=False, write=True, select_page=None):
+        """One convert() pass with per-request overrides of the CLI options."""
+        request_args = argparse.Namespace(**vars(self.args))
+        request_args.validate_only = validate_only
+        request_args.strict = strict
+        self.cache.reset_stats()
+        return convert(request_args, self.config_dir, self.output_path, self.cache, jobs,
+                       write=write, select_page=select_page)
+
+    def validate(self, request):
+        strict = bool(request.get("strict"))
+        summary = self.run(validate_only=True, strict=strict)
+        result = summary["result"]
+        return {
+            "ok": not result.has_errors and not (strict and result.warnings),
+            **result.as_dict(),
+            "pages": summary["pages"],
+        }
+
+    def build(self, request):
+        strict = bool(request.get("strict"))
+        summary = self.run(strict=strict)
+        result = summary["result"]
+        written = summary["changed"] is not None
+        return {
+            "ok": written,
+            **result.as_dict(),
+            "output": self.output_path,
+            "written": written,
+            "changed": bool(summary["changed"]),
+            "sha256": summary["writer"].sha256 if written else None,
+            "pages": summary["pages"],
+            "buttons": summary["buttons"],
+            "rebuilt": self.cache.misses,
+            "reused": self.cache.hits,
+        }
+
+    def build_page(self, request):
+        number = request.get("page")
+        if isinstance(number, bool) or not isinstance(number, int):
+            return {"ok": False, "error": "build-page needs an integer \"page\""}
+        summary = self.run(write=False, select_page=number)
+        if summary["selected"] is None:
+            return {"ok": False, "error": f"no page number {number} in {self.config_dir / 'pages'}"}
+        page_file, source, entry = summary["selected"]
+        return {
+            "ok": entry["page"] is not None,
+            **entry["validation"],
+            "number": entry["number"],
+            "name": entry["name"],
+            "file": page_file,
+            "source": source,
+            "page": entry["page"],
+        }
+
+    def status(self, request):
+        return {
+            "ok": True,
+            "protocol": SERVICE_PROTOCOL,
+            "pid": os.getpid(),
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "config_dir": str(self.config_dir),
+            "output": self.output_path,
+            "cached_pages": len(self.cache.memory or {}),
+            "cached_documents": len(PARSE_CACHE.memory or {}),
+        }
+
+    def shutdown(self, request):
+        self.running = False
+        return {"ok": True}
+
+    def handle(self, line):
+        """Decode one request line and return the encoded response line."""
+        start = time.perf_counter()
+        log = io.StringIO()
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+        except ValueError as e:
+            response = {"ok": False, "error": f"invalid request: {e}"}
+        else:
+            handler = self.handlers.get(request.get("command"))
+            if handler is None:
+                response = {"ok": False, "error": f"unknown command {request.get('command')!r}; "
+                            f"expected one of {', '.join(self.handlers)}"}
+            else:
+                self.requests += 1
+                try:
+                    with redirect_stdout(log), redirect_stderr(log):
+                        response = handler(request)
+                except SystemExit:
+                    # load_yaml_file() and friends exit on unreadable YAML
+                    response = {"ok": False, "error": "could not load the config",
+                                "log": log.getvalue().strip()}
+                except Exception as e:
+                    # A config that parses but has the wrong shape must not
+                    # take the service down with it
+                    response = {"ok": False, "error": f"{type(e).__name__}: {e}",
+                                "log": log.getvalue().strip()}
+        response["seconds"] = round(time.perf_counter() - start, 6)
+        return self.encoder.encode(response) + b"\n"
+
+
+def _socket_in_use(socket_path):
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except OSError:
+        return False
+    finally:
+        probe.close()
+    return True
+
+
+def serve_requests(args, config_dir, output_path, cache, jobs, socket_path):
+    """Warm the caches, then answer requests on socket_path until shutdown."""
+    if os.path.exists(socket_path):
+        if _socket_in_use(socket_path):
+            print(f"ERROR: A converter service is already listening on {socket_path}", file=sys.stderr)
+            sys.exit(1)
+        os.unlink(socket_path)  # left behind by a service that was killed
+
+    PARSE_CACHE.keep_in_memory()
+    service = ConverterService(args, config_dir, output_path, cache, socket_path)
+    start = time.perf_counter()
+    try:
+        summary = service.run(jobs=jobs, write=False)
+    except SystemExit:
+        print("Could not load the config (see error above); requests will retry.")
+    else:
+        print(f"Loaded {summary['pages']} page(s) in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        Path(socket_path).parent.mkdir(parents=True, exist_ok=True)
+        server.bind(socket_path)
+    except OSError as e:
+        print(f"ERROR: Cannot listen on {socket_path}: {e}", file=sys.stderr)
+        print("  (Unix socket paths are limited to about 100 characters; pass a shorter "
+              "one to --serve)", file=sys.stderr)
+        sys.exit(1)
+    os.chmod(socket_path, 0o600)
+    server.listen(8)
+    print(f"Serving on {socket_path}. Press Ctrl+C to stop.")
+    print(f"{socket_path} で待機中。Ctrl+C で終了します。")
+
+    try:
+        while service.running:
+            conn, _ = server.accept()
+            with conn, conn.makefile("rb") as reader:
+                try:
+                    for line in iter(lambda: reader.readline(SERVICE_MAX_REQUEST), b""):
+                        if line.strip():
+                            conn.sendall(service.handle(line))
+                        if not service.running:
+                            break
+                except OSError:
+                    pass  # client went away mid-response
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        try:
+            os.unlink(socket_path)
+        except OSError:
+            pass
+    print("\nConverter service stopped. / コンバーターサービスを終了しました。")
+
+
+# =============================================================================
+# SECTION 5i: Usage Index (--impact / --uses)
+# =============================================================================
+# Which buttons depend on what. Each page's cache entry carries a compact list
+# of the connections, actions, feedbacks and custom variables its buttons use
+# (page_usage()), so cached pages contribute without being parsed again.
+# convert() merges them into one index per run: connection -> uses, custom
+# variable -> references and page -> incoming set_page buttons. The index is
+# written next to the output (<output>.usage.json) with the size and mtime of
+# every file it was built from, so --impact and --uses answer from it
+# directly and only rebuild it after the config has changed.
+
+USAGE_VERSION = 1
+
+
+def usage_path(output_path):
+    """church-config.companionconfig -> church-config.usage.json"""
+    return Path(output_path).with_suffix(".usage.json")
+
+
+def usage_sources(config_dir, page_files):
+    """{file: [mtime_ns, size]} for every file the usage index depends on."""
+    sources = {}
+    files = [config_dir / name for name in ("connections.yaml", "variables.yaml", TEMPLATES_FILENAME)]
+    for path in files + list(page_files):
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        sources[str(path.relative_to(config_dir))] = [st.st_mtime_ns, st.st_size]
+    return sources
+
+
+def page_usage(page_data):
+    """What the buttons of one (template-expanded) page use.
+
+    Returns {"actions": [[row, col, label, kind, connection, name, options],
+    ...], "variables": [[row, col, label, variable, how], ...]}, where kind is
+    "press", "step 2" or "feedback" and how is "text", "set" or "feedback".
+    A connection_status feedback is a use of the connection it watches.
+    """
+    actions = []
+    variables = []
+    for button in _sequence(_mapping(page_data).get("buttons")):
+        if type(button) is not dict:
+            continue
+        cell = _grid_position(button.get("position"))
+        if cell is None:
+            continue
+        style = _mapping(button.get("style"))
+        label = build_button_text(style).replace("\\n", " / ")
+        for text_field in ("text", "text_top", "text_bottom"):
+            for name in _VARIABLE_EXPR.findall(str(style.get(text_field, ""))):
+                variables.append([*cell, label, name, "text"])
+
+        steps = [("press", "actions")]
+        step_count = button.get("step_count", 1)
+        if type(step_count) is int and step_count >= 2:
+            steps.append(("step 2", "step_2_actions"))
+        for kind, step in steps:
+            press = _mapping(button.get(step)).get("press")
+            for action in press if type(press) is list else ():
+                if type(action) is not dict:
+                    continue
+                name = action.get("action", "")
+                options = _mapping(action.get("options"))
+                actions.append([*cell, label, kind, action.get("connection", "internal"), name, options])
+                if name == "custom_variable_set" and options.get("variable"):
+                    variables.append([*cell, label, str(options["variable"]), "set"])
+
+        feedbacks = button.get("feedbacks")
+        for fb in feedbacks if type(feedbacks) is list else ():
+            if type(fb) is not dict:
+                continue
+            name = fb.get("feedback", "")
+            options = _mapping(fb.get("options"))
+            actions.append([*cell, label, "feedback", fb.get("connection", "internal"), name, options])
+            if name == "variable_value" and options.get("variable"):
+                variables.append([*cell, label, str(options["variable"]), "feedback"])
+    return {"actions": actions, "variables": variables}
+
+
+class UsageIndex:
+    """Connection, custom variable and page-link index over every page."""
+
+    def __init__(self):
+        self.connections = {}
+        self.variables = {}
+        self.pages = {}
+
+    def _page(self, number):
+        return self.pages.setdefault(str(number), {"name": None, "file": None, "incoming": []})
+
+    def add_page(self, page_file, number, name, uses):
+        page = self._page(number)
+        page["name"], page["file"] = name, page_file
+        for row, col, label, kind, conn, action, options in uses["actions"]:
+            where = {"page": number, "position": [row, col], "label": label}
+            self.connections.setdefault(conn, []).append(
+                dict(where, kind=kind, name=action, options=options))
+            if action == "set_page" and kind != "feedback" and type(options.get("page")) is int:
+                self._page(options["page"])["incoming"].append(dict(where, kind=kind))
+        for row, col, label, variable, how in uses["variables"]:
+            self.variables.setdefault(variable, []).append(
+                {"page": number, "position": [row, col], "label": label, "kind": how})
+
+    def as_dict(self, sources):
+        return {
+            "version": USAGE_VERSION,
+            "sources": sources,
+            "connections": self.connections,
+            "variables": self.variables,
+            "pages": self.pages,
+        }
+
+
+def load_usage_index(path, sources):
+    """The saved index at path, or None if it is missing or out of date."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(index, dict) or index.get("version") != USAGE_VERSION:
+        return None
+    return index if index.get("sources") == sources else None
+
+
+def _matches(value, wanted):
+    if isinstance(value, list):
+        return any(_matches(v, wanted) for v in value)
+    return str(value) == wanted
+
+
+def query_usage(index, spec):
+    """Answer --uses SPEC (or --impact CONN when spec has no colon).
+
+    SPEC is CONNECTION[:VALUE] (VALUE matches an action/feedback name or any
+    option value, e.g. yamaha:InCh/003), variable:NAME or page:N. Returns
+    (title, references, names that would have matched something).
+    """
+    scope, _, value = spec.partition(":")
+    if scope == "variable":
+        return (f"Custom variable '{value}' / カスタム変数",
+                index["variables"].get(value, []), sorted(index["variables"]))
+    if scope == "page":
+        page = index["pages"].get(value, {})
+        return (f"Buttons that open page {value} ({page.get('name') or 'not defined'}) / "
+                f"ページ{value}へのリンク", page.get("incoming", []),
+                sorted((k for k, p in index["pages"].items() if p["incoming"]), key=int))
+    refs = index["connections"].get(scope, [])
+    known = sorted(c for c in index["connections"] if c != "internal")
+    if value:
+        refs = [r for r in refs
+                if r["name"] == value or any(_matches(v, value) for v in r["options"].values())]
+        return f"Uses of {scope}:{value} / 使用箇所", refs, known
+    return (f"Impact if connection '{scope}' goes down / 接続 {scope} 停止時の影響",
+            refs, known)
+
+
+def print_usage(title, refs, known, index):
+    print(title)
+    if not refs:
+        print("  No buttons. / 該当するボタンはありません。")
+        print(f"  In use: {', '.join(known) or '(none)'}")
+        return
+    current = None
+    buttons = set()
+    for ref in sorted(refs, key=lambda r: (r["page"], r["position"])):
+        if ref["page"] != current:
+            current = ref["page"]
+            page = index["pages"].get(str(current), {})
+            print(f"  Page {current} \"{page.get('name') or ''}\" ({page.get('file') or '?'})")
+        row, col = ref["position"]
+        buttons.add((ref["page"], row, col))
+        line = f"    [{row},{col}] \"{ref['label']}\": {ref['kind']}"
+        if "name" in ref:
+            options = json.dumps(ref["options"], ensure_ascii=False) if ref["options"] else ""
+            line += f" {ref['name']} {options}".rstrip()
+        print(line)
+    pages = {page for page, _, _ in buttons}
+    print(f"  {len(refs)} use(s) on {len(buttons)} button(s), {len(pages)} page(s)")
+
+
+def run_usage_query(args, config_dir, output_path, cache, jobs):
+    """--impact / --uses: answer from the saved index, rebuilding it if stale."""
+    path = usage_path(output_path)
+    page_files = discover_page_files(config_dir / "pages")
+    index = load_usage_index(path, usage_sources(config_dir, page_files))
+    if index is None:
+        summary = convert(args, config_dir, output_path, cache, jobs, write=False)
+        index = summary["usage"]
+        write_json_output(index, str(path), get_serializer("compact"))
+        print(f"(Usage index rebuilt: {path})")
+    for spec in ([args.impact] if args.impact else []) + args.uses:
+        print_usage(*query_usage(index, spec), index)
+
+
+# =============================================================================
+# SECTION 6: CLI Entry Point
+# =============================================================================
 
 def generate_sample():
     """Generate a minimal sample config for format comparison."""
@@ -1429,51 +4516,226 @@ def parse_args():
         action="store_true",
         help="Treat warnings as errors (exit non-zero)",
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--cache-dir",
+        default=None,
+        help=f"Build cache directory (default: {CACHE_DIRNAME}/ next to the output file)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignore and don't update the build cache (full rebuild)",
+    )
+    parser.add_argument(
+        "--deterministic-ids",
+        action="store_true",
+        help="Derive all IDs from page/position/step/index (UUIDv5) so unchanged "
+        "YAML produces a byte-identical config",
+    )
+    parser.add_argument(
+        "--cache-stats",
+        action="store_true",
+        help="Report YAML parse cache and build cache hit rates",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="Parse, validate and build changed pages in N processes (0 = one per CPU)",
+    )
+    parser.add_argument(
+        "--sites",
+        default=None,
+        metavar="DIR",
+        help="Batch mode: generate one config per site parameters file in DIR "
+        "(--output is then a directory, default: output/sites/)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Stay running and rebuild whenever a file in the config directory "
+        "changes (Ctrl+C to stop)",
+    )
+    parser.add_argument(
+        "--serve",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="SOCKET",
+        help="Stay running as a converter service answering validate/build/build-page "
+        "requests on a Unix socket (default: <cache dir>/converter.sock); see "
+        "scripts/converter-client.py",
+    )
+    parser.add_argument(
+        "--serializer",
+        choices=sorted(SERIALIZERS),
+        default="pretty",
+        help="JSON style: pretty (indented, default), compact (no whitespace) or "
+        "orjson (compact, faster; needs the orjson package)",
+    )
+    parser.add_argument(
+        "--compress",
+        action="append",
+        choices=sorted(COMPRESSION_SUFFIXES),
+        default=[],
+        help="Also write a compressed archive copy of the output (<output>.gz / .zst; "
+        "zstd needs the zstandard package). Repeat for both",
+    )
+    parser.add_argument(
+        "--partial",
+        action="store_true",
+        help="Also write Companion page exports for only the pages (and connections) "
+        "that differ from the previous export, to <output>.partial/",
+    )
+    parser.add_argument(
+        "--since",
+        default=None,
+        metavar="FILE",
+        help="With --partial, the export to compare against (default: the existing "
+        "output file, i.e. the previous run)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Record wall/CPU time and allocated memory per phase and per page, and "
+        "write a JSON metrics report next to the output (<output>.metrics.json)",
+    )
+    parser.add_argument(
+        "--profile-pstats",
+        action="store_true",
+        help="With --profile, also run under cProfile and write <output>.pstats",
+    )
+    parser.add_argument(
+        "--impact",
+        default=None,
+        metavar="CONN",
+        help="List every button that uses connection CONN (e.g. obs), i.e. what stops "
+        "working if it goes down, from the usage index next to the output",
+    )
+    parser.add_argument(
+        "--uses",
+        action="append",
+        default=[],
+        metavar="SPEC",
+        help="List the buttons using CONN:VALUE (an action/feedback name or option "
+        "value, e.g. yamaha:InCh/003), variable:NAME or page:N (incoming set_page "
+        "buttons). Repeatable",
+    )
+    args = parser.parse_args()
+    if (args.impact or args.uses) and (args.watch or args.sites or args.serve is not None
+                                       or args.dump_sample or args.partial or args.profile):
+        parser.error("--impact/--uses cannot be combined with --watch, --sites, --serve, "
+                     "--dump-sample, --partial or --profile")
+    if args.watch and (args.sites or args.dump_sample):
+        parser.error("--watch cannot be combined with --sites or --dump-sample")
+    if args.serve is not None and (args.watch or args.sites or args.dump_sample
+                                   or args.validate_only or args.partial):
+        parser.error("--serve cannot be combined with --watch, --sites, --dump-sample, "
+                     "--validate-only or --partial")
+    if args.profile_pstats:
+        args.profile = True
+    if args.profile and (args.watch or args.sites or args.serve is not None):
+        parser.error("--profile cannot be combined with --watch, --sites or --serve")
+    for backend in [args.serializer] + args.compress:
+        if missing_backend(backend):
+            parser.error(missing_backend(backend))
+    if args.since and not args.partial:
+        parser.error("--since requires --partial")
+    if args.partial and (args.watch or args.sites or args.validate_only or args.dump_sample):
+        parser.error("--partial cannot be combined with --watch, --sites, --validate-only "
+                     "or --dump-sample")
+    return args
+
+
+def load_specs(config_dir, verbose=False):
+    """Load connections.yaml and variables.yaml and list the page files."""
+    if verbose:
+        print("Loading configuration files...")
+        print(f"  Config directory: {config_dir}")
 
+    connections_data = load_yaml_file(config_dir / "connections.yaml")
+    variables_data = load_yaml_file(config_dir / "variables.yaml")
+    page_files = discover_page_files(config_dir / "pages")
 
-def main():
-    args = parse_args()
+    yaml_connections = _document_list(connections_data, "connections")
+    yaml_variables = _document_list(variables_data, "custom_variables")
+    return yaml_connections, yaml_variables, page_files
 
-    # Determine paths
-    script_dir = Path(__file__).resolve().parent
-    project_root = script_dir.parent
 
-    if args.config_dir:
-        config_dir = Path(args.config_dir)
-    else:
-        config_dir = project_root / "config"
+def _document_list(data, key):
+    """data[key] of a spec file's document; an empty file has no entries.
 
-    output_path = args.output or str(project_root / "output" / "church-config.companionconfig")
+    Any other non-mapping document is passed through as is, for
+    validate_specs() to report rather than crash on here.
+    """
+    if data is None:
+        return []
+    if isinstance(data, dict):
+        return data.get(key, [])
+    return data
 
-    # Handle --dump-sample
-    if args.dump_sample:
-        sample = generate_sample()
-        sample_path = args.output or str(project_root / "output" / "sample-config.json")
-        write_json_output(sample, sample_path)
-        print(f"Sample config written to: {sample_path}")
-        print("Compare this against a real Companion JSON export to verify format.")
-        return
 
-    # Load YAML files
-    if args.verbose:
-        print("Loading configuration files...")
-        print(f"  Config directory: {config_dir}")
+def validate_specs(config_dir, yaml_connections, yaml_variables, result, templates=None):
+    """Validate connections.yaml, variables.yaml and templates.yaml (pages are
+    validated as they are built).
+
+    Returns False if connections.yaml or variables.yaml has errors: the
+    connections and reference index are built from them, so callers report
+    the errors and stop there instead of building from malformed specs.
+    """
+    errors_before = len(result.errors)
+    validate_connections(yaml_connections, result,
+                         SourceMap("connections.yaml", path=config_dir / "connections.yaml"))
+    validate_variables(yaml_variables, result,
+                       SourceMap("variables.yaml", path=config_dir / "variables.yaml"))
+    buildable = len(result.errors) == errors_before
+    if templates is not None:
+        validate_templates(config_dir, templates, result)
+    return buildable
+
+
+def _spec_error_summary(result, page_files, sources):
+    """convert()'s summary for a run stopped by errors in the shared specs."""
+    return {
+        "result": result,
+        "changed": None,
+        "writer": None,
+        "partial": None,
+        "archives": [],
+        "selected": None,
+        "instances": {},
+        "custom_variables": {},
+        "usage": UsageIndex().as_dict(sources),
+        "buttons": 0,
+        "pages": len(page_files),
+        "parse_before": (PARSE_CACHE.hits, PARSE_CACHE.misses),
+        "worker_timings": {},
+    }
 
-    connections_path = config_dir / "connections.yaml"
-    variables_path = config_dir / "variables.yaml"
-    pages_dir = config_dir / "pages"
 
-    connections_data = load_yaml_file(connections_path)
-    variables_data = load_yaml_file(variables_path)
-    pages_data = load_all_pages(pages_dir)
+def convert(args, config_dir, output_path, cache, jobs, profiler=None, write=True,
+            select_page=None):
+    """Run the load -> validate -> build -> emit pipeline once.
 
-    yaml_connections = connections_data.get("connections", [])
-    yaml_variables = variables_data.get("custom_variables", [])
+    Returns a summary dict. The output file is only replaced if the run
+    validates ("changed" is None when nothing was written); reporting and
+    exit codes are left to the caller. Exits like load_yaml_file() on
+    unreadable YAML. Phases and pages are recorded in profiler, if given.
+    With write=False pages are still built (and cached) but nothing is
+    written; the cache entry of page number select_page, if any, is
+    returned as summary["selected"] = (page_file, source, entry).
+    """
+    profiler = profiler or PhaseProfiler()
+    with profiler.phase("load_specs"):
+        yaml_connections, yaml_variables, page_files = load_specs(config_dir, args.verbose)
+        templates = load_templates(config_dir)
+        sources = usage_sources(config_dir, page_files)
 
     # Load parameters (auto-detect or from --params flag)
     params_path = args.params or str(config_dir / "parameters.yaml")
-    params = load_parameters(params_path)
+    with profiler.phase("load_parameters"):
+        params = load_parameters(params_path)
     if params and args.verbose:
         machines = params.get("machines", {})
         assignments = params.get("assignments", {})
@@ -1488,70 +4750,256 @@ def main():
     if args.verbose:
         print(f"  Loaded {len(yaml_connections)} connections")
         print(f"  Loaded {len(yaml_variables)} custom variables")
-        print(f"  Loaded {len(pages_data)} page files")
+        print(f"  Found {len(page_files)} page files")
 
-    # Validate
     result = ValidationResult()
-    validate_all(pages_data, yaml_connections, yaml_variables, result)
-    result.print_report()
-
-    if result.has_errors:
-        print("Validation failed with errors. Fix errors before generating config.")
-        print("バリデーションエラーがあります。設定生成前にエラーを修正してください。")
-        sys.exit(1)
-
-    if args.strict and result.warnings:
-        print("Strict mode: warnings treated as errors.")
-        sys.exit(1)
+    if not validate_specs(config_dir, yaml_connections, yaml_variables, result, templates):
+        return _spec_error_summary(result, page_files, sources)
+
+    # Connections are cheap to rebuild and pages depend on their UUIDs, so
+    # build them first; the previous run's UUIDs keep cached pages valid.
+    with profiler.phase("build_connections"):
+        instances, connection_map, connection_module_map = build_connections_cached(
+            yaml_connections, params, cache.connection_uuids(), args.deterministic_ids
+        )
+        references = ReferenceIndex(yaml_connections, yaml_variables)
+        conn_slice = connection_cache_slice(connection_map, connection_module_map, references)
+        fingerprint = converter_fingerprint(args.deterministic_ids, templates)
+
+    # Pipeline: load page -> validate -> build -> emit, one page at a time.
+    # Clean pages come straight from the cache (replaying their validation
+    # messages); changed pages are parsed, validated and built, possibly in
+    # worker processes. The output file is only replaced if the run validates.
+    build = not args.validate_only
+    parse_before = (PARSE_CACHE.hits, PARSE_CACHE.misses)
+    context = page_context(
+        connection_map, connection_module_map, references, build=build,
+        parse_cache_dir=PARSE_CACHE.cache_dir and str(PARSE_CACHE.cache_dir),
+        deterministic_ids=args.deterministic_ids,
+        trace_memory=profiler.enabled,
+        templates=templates,
+    )
 
-    if args.validate_only:
-        if not result.has_errors:
-            print("Validation passed. YAML specs are valid.")
-            print("バリデーション成功。YAMLスペックは有効です。")
-        return
+    def page_tasks():
+        for pf in page_files:
+            raw = pf.read_bytes()
+            key = page_cache_key(raw, conn_slice, fingerprint)
+            entry = cache.get_page(pf.name, key)
+            if entry:
+                yield None, (pf.name, key, entry)
+            else:
+                yield (pf.name, str(pf), raw), (pf.name, key, None)
 
-    # Build Companion JSON
-    if args.verbose:
+    if args.verbose and build:
         print("Building Companion configuration...")
-
-    instances, connection_map, connection_module_map = build_connections(
-        yaml_connections, params
-    )
-
-    if args.verbose:
         print(f"  Built {len(instances)} connection instances")
         for friendly_id, comp_uuid in connection_map.items():
             if friendly_id != "internal":
                 module = connection_module_map.get(friendly_id, "?")
                 print(f"    {friendly_id} -> {comp_uuid[:8]}... ({module})")
 
-    custom_variables = build_custom_variables(yaml_variables)
-
-    pages_dict = {}
+    serializer = get_serializer(args.serializer)
+    partial = None
+    if build and write and args.partial:
+        partial = PartialExport(
+            partial_dir(output_path), export_digests(args.since or output_path), serializer
+        )
+    writer = StreamingExportWriter(output_path, serializer) if build and write else None
+    selected = None
+    worker_timings = {}
+    page_links = []
+    usage = UsageIndex()
     total_buttons = 0
-    for page_file, page_data in pages_data:
-        page_num = page_data.get("page", {}).get("number", 0)
-        page_name = page_data.get("page", {}).get("name", "Unnamed")
-        page_result = build_page(page_data, connection_map, connection_module_map)
-        pages_dict[str(page_num)] = page_result
+    with profiler.phase("pages"):
+        try:
+            for (page_file, key, entry), processed in iter_processed_pages(page_tasks(), context, jobs):
+                source = "cached"
+                stats = None
+                if processed:
+                    entry, _page_data, stats = processed
+                    _record_timing(worker_timings, stats)
+                    source = "built"
+                profiler.page(page_file, entry, source, stats)
+                result.extend(entry["validation"])
+                page_links.append((page_file, entry["number"], entry["links"]))
+                usage.add_page(page_file, entry["number"], entry["name"], entry["uses"])
+                if select_page is not None and entry["number"] == select_page:
+                    selected = (page_file, source, entry)
+                if not build or entry["page"] is None:
+                    continue
+                if source == "built":
+                    cache.put_page(page_file, key, entry)
+                if writer:
+                    writer.add_page(entry["number"], entry["page"])
+                if partial:
+                    partial.add_page(entry["number"], entry["page"])
+
+                button_count = sum(len(cols) for cols in entry["page"]["controls"].values())
+                total_buttons += button_count
+                if args.verbose:
+                    print(f"  Page {entry['number']}: {entry['name']} ({button_count} buttons, {source})")
+        except BaseException:
+            if writer:
+                writer.abort()
+            raise
+
+    with profiler.phase("finish"):
+        check_page_links(page_links, result)
+        cache.save(connection_map)
+        usage_data = usage.as_dict(sources)
+
+        custom_variables = build_custom_variables(yaml_variables)
+        changed = None
+        archives = []
+        if writer:
+            if result.has_errors or (args.strict and result.warnings):
+                writer.abort()
+            else:
+                changed = writer.finish(instances, custom_variables)
+                write_json_output(usage_data, str(usage_path(output_path)), get_serializer("compact"))
+                if partial:
+                    partial.finish(instances, custom_variables)
+                archives = [write_compressed_copy(output_path, method) for method in args.compress]
+
+    return {
+        "result": result,
+        "changed": changed,
+        "writer": writer,
+        "partial": partial,
+        "archives": archives,
+        "selected": selected,
+        "instances": instances,
+        "custom_variables": custom_variables,
+        "usage": usage_data,
+        "buttons": total_buttons,
+        "pages": len(page_files),
+        "parse_before": parse_before,
+        "worker_timings": worker_timings,
+    }
+
+
+def main():
+    args = parse_args()
+
+    # Determine paths
+    script_dir = Path(__file__).resolve().parent
+    project_root = script_dir.parent
+
+    if args.config_dir:
+        config_dir = Path(args.config_dir)
+    else:
+        config_dir = project_root / "config"
+
+    output_path = args.output or str(project_root / "output" / "church-config.companionconfig")
+
+    # Handle --dump-sample
+    if args.dump_sample:
+        sample = generate_sample()
+        sample_path = args.output or str(project_root / "output" / "sample-config.json")
+        write_json_output(sample, sample_path)
+        print(f"Sample config written to: {sample_path}")
+        print("Compare this against a real Companion JSON export to verify format.")
+        return
+
+    if args.sites:
+        output_dir = args.output or str(project_root / "output" / "sites")
+        cache_dir = args.cache_dir or str(Path(output_dir) / CACHE_DIRNAME)
+    else:
+        cache_dir = args.cache_dir or str(Path(output_path).parent / CACHE_DIRNAME)
+    if not args.no_cache:
+        PARSE_CACHE.configure(Path(cache_dir) / "parsed")
+
+    if args.sites:
+        yaml_connections, yaml_variables, page_files = load_specs(config_dir, args.verbose)
+        run_site_batch(args, config_dir, args.sites, output_dir, cache_dir, yaml_connections,
+                       yaml_variables, page_files)
+        return
+
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    serve = args.serve is not None
+    cache = BuildCache(cache_dir, enabled=not args.no_cache, keep_in_memory=args.watch or serve)
+    if args.impact or args.uses:
+        run_usage_query(args, config_dir, output_path, cache, jobs)
+        return
+    if args.watch:
+        watch_config(args, config_dir, output_path, cache, jobs)
+        return
+    if serve:
+        socket_path = args.serve or str(Path(cache_dir) / SERVICE_SOCKET_NAME)
+        serve_requests(args, config_dir, output_path, cache, jobs, socket_path)
+        return
+
+    profiler = PhaseProfiler(enabled=args.profile)
+    cprofile = cProfile.Profile() if args.profile_pstats else None
+    if cprofile:
+        cprofile.enable()
+    try:
+        summary = convert(args, config_dir, output_path, cache, jobs, profiler)
+    finally:
+        if cprofile:
+            cprofile.disable()
+
+    result = summary["result"]
+    worker_timings = summary["worker_timings"]
+    if jobs > 1 and worker_timings:
+        print_worker_timings(worker_timings, jobs)
+    if args.cache_stats:
+        parse_before = summary["parse_before"]
+        parsed_pages = sum(w["pages"] for w in worker_timings.values())
+        parse_hits = parse_before[0] + sum(w["parse_hits"] for w in worker_timings.values())
+        print_cache_stats(parse_hits, sum(parse_before) + parsed_pages, cache)
+    if args.profile:
+        report = profiler.report(summary, output_path, jobs)
+        print_profile(report)
+        report_path = metrics_path(output_path)
+        write_json_output(report, str(report_path))
+        print(f"  Metrics report: {report_path}")
+        if cprofile:
+            pstats_path = Path(output_path).with_suffix(".pstats")
+            cprofile.dump_stats(str(pstats_path))
+            print(f"  cProfile stats: {pstats_path} (python3 -m pstats {pstats_path})")
+    result.print_report()
 
-        button_count = sum(len(cols) for cols in page_result["controls"].values())
-        total_buttons += button_count
-        if args.verbose:
-            print(f"  Page {page_num}: {page_name} ({button_count} buttons)")
+    if result.has_errors:
+        print("Validation failed with errors. Fix errors before generating config.")
+        print("バリデーションエラーがあります。設定生成前にエラーを修正してください。")
+        sys.exit(1)
 
-    full_export = build_full_export(pages_dict, instances, custom_variables)
+    if args.strict and result.warnings:
+        print("Strict mode: warnings treated as errors.")
+        sys.exit(1)
 
-    # Write output
-    write_json_output(full_export, output_path)
+    if args.validate_only:
+        print("Validation passed. YAML specs are valid.")
+        print("バリデーション成功。YAMLスペックは有効です。")
+        return
 
+    writer = summary["writer"]
     print(f"\nConfig generated successfully! / 設定ファイルの生成に成功しました！")
     print(f"  Output: {output_path}")
-    print(f"  Pages:  {len(pages_dict)}")
-    print(f"  Buttons: {total_buttons}")
-    print(f"  Connections: {len(instances)}")
-    print(f"  Variables: {len(custom_variables)}")
+    print(f"  SHA-256: {writer.sha256[:16]}")
+    print(f"  Format: {writer.serializer.name} ({os.path.getsize(output_path) / 1024:.0f} KB)")
+    for archive, size in summary["archives"]:
+        print(f"  Archive: {archive} ({size / 1024:.0f} KB)")
+    print(f"  Pages:  {writer.page_count}")
+    print(f"  Buttons: {summary['buttons']}")
+    print(f"  Connections: {len(summary['instances'])}")
+    print(f"  Variables: {len(summary['custom_variables'])}")
+    if cache.enabled:
+        print(f"  Cache: {cache.hits} pages reused, {cache.misses} rebuilt ({cache_dir})")
+    print_dedupe_stats(
+        sum(w["controls_built"] for w in worker_timings.values()),
+        sum(w["controls_deduped"] for w in worker_timings.values()),
+        sum(w["dedupe_saved"] for w in worker_timings.values()),
+    )
     print()
+    if summary["partial"]:
+        print_partial_summary(summary["partial"])
+        return
+    if not summary["changed"]:
+        print("Output unchanged — existing file kept, no re-import needed.")
+        print("出力に変更なし — 既存ファイルを保持しました（再インポート不要）。")
+        return
     print("Next steps / 次のステップ:")
     print("  1. Open Companion web UI (http://localhost:8000)")
     print("  2. Go to Import/Export tab")
@@ -0,0 +1,49 @@
+"""Shared fixtures for the scripts/ tests.
+
+The scripts have hyphenated file names, so they're imported the same way
+they import each other: by path, through importlib.
+"""
+
+import importlib.util
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SCRIPT_DIR = PROJECT_ROOT / "scripts"
+
+
+@pytest.fixture(scope="session")
+def load_script():
+    """Return a loader: load_script("device-probe.py") -> module (cached)."""
+    modules = {}
+
+    def load(file_name):
+        if file_name not in modules:
+            module_name = file_name[:-3].replace("-", "_")
+            spec = importlib.util.spec_from_file_location(module_name, SCRIPT_DIR / file_name)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            modules[file_name] = module
+        return modules[file_name]
+
+    return load
+
+
+@pytest.fixture
+def run_script(tmp_path):
+    """Return a runner for a script's command line: (returncode, output).
+
+    Scripts run from tmp_path, so anything they write by default stays out
+    of the tree.
+    """
+    def run(file_name, *args, timeout=300):
+        proc = subprocess.run(
+            [sys.executable, str(SCRIPT_DIR / file_name), *map(str, args)],
+            capture_output=True, text=True, timeout=timeout, cwd=tmp_path,
+        )
+        return proc.returncode, proc.stdout + proc.stderr
+
+    return run
@@ -0,0 +1,215 @@
+"""Local stand-ins for the devices device-monitor.py talks to.
+
+Each speaks just enough of the real protocol for the monitor's sessions:
+ProPresenter's HTTP API (GET /version, keep-alive), obs-websocket v5 with
+password authentication, and an ATEM switcher's UDP handshake and acks.
+The Yamaha mixer is scripts/yamaha-simulator.py. All of them bind to
+127.0.0.1 on a free port; start() returns that port.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import struct
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+class _TcpStandIn:
+    """asyncio TCP server that tracks its connections so stop() can drop them."""
+
+    def __init__(self):
+        self.server = None
+        self.port = None
+        self.writers = set()
+        self.requests = 0
+
+    async def start(self, port=0):
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        """Stop listening and drop every open connection (a device going away)."""
+        self.server.close()
+        await self.server.wait_closed()
+        for writer in list(self.writers):
+            writer.close()
+
+    async def _serve(self, reader, writer):
+        self.writers.add(writer)
+        try:
+            await self.serve(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+
+class HttpStandIn(_TcpStandIn):
+    """ProPresenter API: GET /version on a keep-alive connection.
+
+    Replies alternate between Content-Length and chunked bodies; with
+    close_every=N every Nth reply carries "Connection: close".
+    """
+
+    def __init__(self, close_every=0):
+        super().__init__()
+        self.close_every = close_every
+
+    async def serve(self, reader, writer):
+        while True:
+            request = await reader.readline()
+            if not request:
+                return
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            self.requests += 1
+            path = request.split()[1].decode("latin-1")
+            if path != "/version":
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+                await writer.drain()
+                continue
+            body = json.dumps({"name": "Stand-in", "host_description": "ProPresenter 7.16"}).encode()
+            close = self.close_every and self.requests % self.close_every == 0
+            headers = "HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+            if close:
+                headers += "Connection: close\r\n"
+            if self.requests % 2:
+                data = f"{headers}Content-Length: {len(body)}\r\n\r\n".encode() + body
+            else:
+                chunks = f"{len(body):x}\r\n".encode() + body + b"\r\n0\r\n\r\n"
+                data = f"{headers}Transfer-Encoding: chunked\r\n\r\n".encode() + chunks
+            writer.write(data)
+            await writer.drain()
+            if close:
+                return
+
+
+class ObsStandIn(_TcpStandIn):
+    """obs-websocket v5: Hello (with an auth challenge if password is set),
+    Identify/Identified, and GetVersion requests. An event and a WebSocket
+    ping are sent ahead of each response, as OBS may do."""
+
+    def __init__(self, password=""):
+        super().__init__()
+        self.password = password
+
+    @staticmethod
+    def _frame(opcode, payload):
+        if len(payload) < 126:
+            header = struct.pack("!BB", 0x80 | opcode, len(payload))
+        else:
+            header = struct.pack("!BBH", 0x80 | opcode, 126, len(payload))
+        return header + payload
+
+    async def _send(self, writer, data):
+        writer.write(self._frame(0x1, json.dumps(data).encode("utf-8")))
+        await writer.drain()
+
+    @staticmethod
+    async def _recv(reader):
+        while True:
+            b0, b1 = await reader.readexactly(2)
+            length = b1 & 0x7F
+            if length == 126:
+                (length,) = struct.unpack("!H", await reader.readexactly(2))
+            mask = await reader.readexactly(4)
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(await reader.readexactly(length)))
+            if b0 & 0x0F == 0x1:
+                return json.loads(payload)
+            # Pongs (0xA) and anything else are ignored
+
+    def _expected_auth(self, salt, challenge):
+        secret = base64.b64encode(hashlib.sha256((self.password + salt).encode("utf-8")).digest())
+        return base64.b64encode(hashlib.sha256(secret + challenge.encode("utf-8")).digest()).decode()
+
+    async def serve(self, reader, writer):
+        key = ""
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "sec-websocket-key":
+                key = value.strip()
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        writer.write((
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Accept: {accept}\r\nSec-WebSocket-Protocol: obswebsocket.json\r\n\r\n"
+        ).encode("ascii"))
+
+        hello = {"obsWebSocketVersion": "5.5.0", "rpcVersion": 1}
+        salt = challenge = None
+        if self.password:
+            salt = base64.b64encode(os.urandom(16)).decode()
+            challenge = base64.b64encode(os.urandom(16)).decode()
+            hello["authentication"] = {"challenge": challenge, "salt": salt}
+        await self._send(writer, {"op": 0, "d": hello})
+
+        identify = await self._recv(reader)
+        if self.password and identify["d"].get("authentication") != self._expected_auth(salt, challenge):
+            writer.write(self._frame(0x8, struct.pack("!H", 4009) + b"Authentication failed."))
+            await writer.drain()
+            return
+        await self._send(writer, {"op": 2, "d": {"negotiatedRpcVersion": 1}})
+
+        while True:
+            request = (await self._recv(reader))["d"]
+            self.requests += 1
+            writer.write(self._frame(0x9, b"keepalive"))
+            await self._send(writer, {"op": 5, "d": {"eventType": "CurrentSceneChanged", "eventIntent": 4}})
+            await self._send(writer, {"op": 7, "d": {
+                "requestType": request["requestType"],
+                "requestId": request["requestId"],
+                "requestStatus": {"result": True, "code": 100},
+                "responseData": {"obsVersion": "30.2.0", "obsWebSocketVersion": "5.5.0"},
+            }})
+
+
+class AtemStandIn(asyncio.DatagramProtocol):
+    """ATEM switcher UDP session: answers the hello, moves the client to a
+    switcher-assigned session id, and acks ack-requested packets. With
+    full=True the hello is refused (no free client slots)."""
+
+    ACK_REQUEST = 0x01
+    HELLO = 0x02
+    ACK = 0x10
+
+    def __init__(self, full=False):
+        self.full = full
+        self.transport = None
+        self.port = None
+        self.requests = 0
+
+    async def start(self, port=0):
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: self, local_addr=("127.0.0.1", port)
+        )
+        self.port = self.transport.get_extra_info("sockname")[1]
+        return self.port
+
+    async def stop(self):
+        self.transport.close()
+
+    @staticmethod
+    def _header(flags, session_id, ack_id=0, packet_id=0, length=12):
+        return struct.pack("!HHH4xH", (flags << 11) | length, session_id, ack_id, packet_id)
+
+    def datagram_received(self, data, addr):
+        word, session_id, ack_id, packet_id = struct.unpack_from("!HHH4xH", data)
+        flags = word >> 11
+        if flags & self.HELLO:
+            reply = bytearray(self._header(self.HELLO, session_id, length=20)) + bytes(8)
+            reply[12] = 0x03 if self.full else 0x02
+            self.transport.sendto(bytes(reply), addr)
+        elif flags & self.ACK and packet_id == 0 and ack_id == 0:
+            # Handshake complete: the switcher switches to its own session id
+            self.transport.sendto(self._header(self.ACK_REQUEST, session_id | 0x8000, packet_id=1), addr)
+        elif flags & self.ACK_REQUEST:
+            self.requests += 1
+            self.transport.sendto(self._header(self.ACK, session_id, ack_id=packet_id), addr)
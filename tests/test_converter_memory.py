@@ -0,0 +1,45 @@
+"""yaml-to-companion.py streams pages out; its memory must not grow with them.
+
+Synthetic configs come from benchmark-converter.py. The usage index
+(--impact/--uses) is left out of the measurement: it is part of the run's
+output and holds a record per action, so it grows with the config by design.
+"""
+
+import sys
+import tracemalloc
+from pathlib import Path
+
+CONFIG_DIR = Path(__file__).resolve().parent.parent / "config"
+
+
+def convert_peak(conv, config_dir, tmp_path, monkeypatch):
+    """Peak traced memory (bytes) of one convert() run on config_dir."""
+    output = tmp_path / f"{config_dir.name}.companionconfig"
+    monkeypatch.setattr(sys, "argv", ["yaml-to-companion.py", "--config-dir", str(config_dir),
+                                      "--output", str(output), "--no-cache", "--deterministic-ids"])
+    args = conv.parse_args()
+    cache = conv.BuildCache(tmp_path / "cache", enabled=False)
+    tracemalloc.start()
+    try:
+        summary = conv.convert(args, config_dir, str(output), cache, 1)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert not summary["result"].has_errors
+    assert summary["changed"] is not None
+    return peak
+
+
+def test_peak_memory_does_not_grow_with_page_count(load_script, tmp_path, monkeypatch):
+    conv = load_script("yaml-to-companion.py")
+    bench = load_script("benchmark-converter.py")
+    monkeypatch.setattr(conv, "page_usage", lambda page_data: {"actions": [], "variables": []})
+
+    peaks = {}
+    for pages in (25, 100):
+        config_dir = tmp_path / f"pages{pages}"
+        bench.generate_config(conv, config_dir, CONFIG_DIR, pages, conv.GRID_ROWS, conv.GRID_COLS)
+        peaks[pages] = convert_peak(conv, config_dir, tmp_path, monkeypatch)
+    # 4x the pages: holding every built control for the whole run more than
+    # doubles the peak; what does grow (e.g. the resolver memo) stays small.
+    assert peaks[100] < 1.5 * peaks[25], peaks
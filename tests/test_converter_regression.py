@@ -0,0 +1,71 @@
+"""End-to-end regression checks for yaml-to-companion.py on config/.
+
+With --deterministic-ids the export is a pure function of config/ and the
+converter, so one hash pins down the whole output. It must not depend on
+how the pages were built (cache, worker processes, serializer). When a
+change to config/ or to the converter's output is intended, update
+GOLDEN_SHA256 to the hash the failing test prints, and say why in the commit.
+"""
+
+import gzip
+import hashlib
+import json
+import shutil
+from pathlib import Path
+
+import pytest
+
+CONFIG_DIR = Path(__file__).resolve().parent.parent / "config"
+GOLDEN_SHA256 = "e92806809ede9898414b97132aa57513a7742bb110e705389838abd49f7f634e"
+
+
+def sha256(path):
+    return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+
+
+@pytest.fixture
+def build(run_script, tmp_path):
+    """Run the converter on a config dir; returns the output path."""
+    def run(*args, config_dir=CONFIG_DIR, name="out.companionconfig"):
+        output = tmp_path / name
+        code, log = run_script("yaml-to-companion.py", "--config-dir", config_dir,
+                               "--output", output, "--deterministic-ids", *args)
+        assert code == 0, log
+        return output
+
+    return run
+
+
+def test_golden_hash(build):
+    assert sha256(build("--no-cache")) == GOLDEN_SHA256
+
+
+def test_golden_hash_with_workers_and_cache(build):
+    # Cold cache with a process pool, then a run served from the cache
+    assert sha256(build("--jobs", "4")) == GOLDEN_SHA256
+    assert sha256(build()) == GOLDEN_SHA256
+
+
+def test_serializers_and_archive_hold_the_same_export(build):
+    pretty = build("--no-cache")
+    compact = build("--no-cache", "--serializer", "compact", "--compress", "gzip",
+                    name="compact.companionconfig")
+    expected = json.loads(pretty.read_bytes())
+    assert json.loads(compact.read_bytes()) == expected
+    assert json.loads(gzip.decompress(Path(f"{compact}.gz").read_bytes())) == expected
+
+
+def test_companion_to_yaml_round_trip(build, run_script, tmp_path):
+    """Export -> page YAML -> export gives the same configuration."""
+    original = build("--no-cache")
+    imported = tmp_path / "imported"
+    shutil.copytree(CONFIG_DIR, imported, ignore=shutil.ignore_patterns("pages"))
+    code, log = run_script("companion-to-yaml.py", original, "--output-dir", imported,
+                           "--connections", CONFIG_DIR / "connections.yaml")
+    assert code == 0, log
+    assert len(list((imported / "pages").glob("*.yaml"))) == len(list((CONFIG_DIR / "pages").glob("*.yaml")))
+
+    rebuilt = build("--no-cache", config_dir=imported, name="rebuilt.companionconfig")
+    code, report = run_script("companion-diff.py", original, rebuilt)
+    assert code == 0, report
+    assert "No differences" in report
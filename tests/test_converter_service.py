@@ -0,0 +1,88 @@
+"""The resident converter service (--serve) and converter-client.py."""
+
+import json
+import shutil
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SCRIPT_DIR = PROJECT_ROOT / "scripts"
+CONFIG_DIR = PROJECT_ROOT / "config"
+
+
+def request(socket_path, payload):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(60)
+        s.connect(str(socket_path))
+        s.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    return json.loads(data) if data else None
+
+
+@pytest.fixture
+def service(tmp_path):
+    config_dir = tmp_path / "config"
+    shutil.copytree(CONFIG_DIR, config_dir)
+    socket_path = tmp_path / "converter.sock"
+    proc = subprocess.Popen(
+        [sys.executable, str(SCRIPT_DIR / "yaml-to-companion.py"),
+         "--config-dir", str(config_dir), "--output", str(tmp_path / "out.companionconfig"),
+         "--serve", str(socket_path)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 60
+    while not socket_path.exists():
+        assert proc.poll() is None, "service exited during start-up"
+        assert time.monotonic() < deadline, "service did not start"
+        time.sleep(0.05)
+    yield config_dir, socket_path
+    if proc.poll() is None:
+        try:
+            request(socket_path, {"command": "shutdown"})
+            proc.wait(10)
+        except (OSError, subprocess.TimeoutExpired):
+            proc.kill()
+            proc.wait()
+
+
+def test_malformed_config_does_not_stop_the_service(service):
+    config_dir, socket_path = service
+    assert request(socket_path, {"command": "build"})["ok"] is True
+
+    connections = config_dir / "connections.yaml"
+    original = connections.read_text(encoding="utf-8")
+    connections.write_text("connections: [1, 2]\n", encoding="utf-8")
+    response = request(socket_path, {"command": "build"})
+    assert response["ok"] is False and response["written"] is False
+    assert response["errors"] == [
+        "connections.yaml:1:15: connections[0]: must be a mapping, not int",
+        "connections.yaml:1:18: connections[1]: must be a mapping, not int",
+    ]
+
+    status = request(socket_path, {"command": "status"})
+    assert status["ok"] is True and status["requests"] == 3
+
+    connections.write_text(original, encoding="utf-8")
+    assert request(socket_path, {"command": "validate"})["ok"] is True
+
+
+def test_client_round_trip(service):
+    _config_dir, socket_path = service
+    proc = subprocess.run(
+        [sys.executable, str(SCRIPT_DIR / "converter-client.py"), "--socket", str(socket_path),
+         "--json", "build-page", "4"],
+        capture_output=True, text=True, timeout=60,
+    )
+    assert proc.returncode == 0, proc.stdout + proc.stderr
+    page = json.loads(proc.stdout)
+    assert page["number"] == 4 and page["page"]["controls"]
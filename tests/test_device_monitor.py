@@ -0,0 +1,267 @@
+"""device-monitor.py sessions, /metrics and reconnects against local stand-ins."""
+
+import asyncio
+import re
+
+import pytest
+
+from device_standins import AtemStandIn, HttpStandIn, ObsStandIn
+
+
+@pytest.fixture(scope="module")
+def monitor(load_script):
+    return load_script("device-monitor.py")
+
+
+@pytest.fixture(scope="module")
+def simulator(load_script):
+    return load_script("yamaha-simulator.py")
+
+
+def target(module, port, conn_id=None, config=None):
+    return {
+        "conn_id": conn_id or module,
+        "module": module,
+        "ip": "127.0.0.1",
+        "port": port,
+        "config": config or {},
+    }
+
+
+async def round_trips(session, count):
+    await asyncio.wait_for(session.connect(), 2)
+    try:
+        for _ in range(count):
+            await asyncio.wait_for(session.ping(), 2)
+    finally:
+        session.close()
+
+
+async def scrape(port, path="/metrics"):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode("ascii"))
+    data = await reader.read()
+    writer.close()
+    head, _, body = data.decode("utf-8").partition("\r\n\r\n")
+    return head.split("\r\n")[0], body
+
+
+def series(body, name, conn_id, quantile=None):
+    """Value of one metric line, or None."""
+    labels = f'connection="{conn_id}"[^}}]*'
+    if quantile is not None:
+        labels += f',quantile="{quantile}"'
+    match = re.search(rf"^{name}{{{labels}}} (\S+)$", body, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+# =============================================================================
+# Sessions
+# =============================================================================
+
+def test_rcp_session_skips_notify_lines(monitor, simulator):
+    async def scenario():
+        sim = simulator.RcpSimulator()
+        _host, port = await sim.start("127.0.0.1", 0)
+        session = monitor.RcpSession(target("yamaha-rcp", port))
+        other_reader, other = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            await session.connect()
+            await session.ping()
+            # Another client's change arrives as a NOTIFY ahead of the reply
+            other.write(b"set MIXER:Current/InCh/Fader/On 0 0 0\n")
+            await other_reader.readline()
+            await session.ping()
+        finally:
+            session.close()
+            other.close()
+            await sim.close()
+        return sim.commands
+
+    assert asyncio.run(scenario()) == 3
+
+
+def test_http_session_keep_alive_chunked_and_close(monitor):
+    async def scenario():
+        server = HttpStandIn(close_every=3)
+        port = await server.start()
+        try:
+            await round_trips(monitor.HttpSession(target("renewedvision-propresenter-api", port)), 7)
+        finally:
+            await server.stop()
+        return server.requests
+
+    assert asyncio.run(scenario()) == 7
+
+
+def test_obs_session_authenticates(monitor):
+    async def scenario():
+        server = ObsStandIn(password="s3cret")
+        port = await server.start()
+        try:
+            await round_trips(monitor.ObsSession(target("obs-studio", port, config={"pass": "s3cret"})), 3)
+        finally:
+            await server.stop()
+        return server.requests
+
+    assert asyncio.run(scenario()) == 3
+
+
+def test_obs_session_wrong_password_fails(monitor):
+    async def scenario():
+        server = ObsStandIn(password="s3cret")
+        port = await server.start()
+        session = monitor.ObsSession(target("obs-studio", port, config={"pass": "wrong"}))
+        try:
+            await asyncio.wait_for(session.connect(), 2)
+        finally:
+            session.close()
+            await server.stop()
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(scenario())
+
+
+def test_atem_session_handshake_and_keepalives(monitor):
+    async def scenario():
+        switcher = AtemStandIn()
+        port = await switcher.start()
+        session = monitor.AtemSession(target("bmd-atem", port))
+        try:
+            await round_trips(session, 5)
+        finally:
+            await switcher.stop()
+        return session.session_id, switcher.requests
+
+    session_id, requests = asyncio.run(scenario())
+    # The client moved to the switcher-assigned session id
+    assert session_id & 0x8000
+    assert requests == 5
+
+
+def test_atem_session_refused_when_full(monitor):
+    async def scenario():
+        switcher = AtemStandIn(full=True)
+        port = await switcher.start()
+        session = monitor.AtemSession(target("bmd-atem", port))
+        try:
+            await asyncio.wait_for(session.connect(), 2)
+        finally:
+            session.close()
+            await switcher.stop()
+
+    with pytest.raises(ConnectionError, match="client slots"):
+        asyncio.run(scenario())
+
+
+# =============================================================================
+# Metrics and reconnects
+# =============================================================================
+
+def test_latency_window_nearest_rank(monitor):
+    window = monitor.LatencyWindow(100)
+    assert window.quantile(0.5) is None
+    for ms in range(1, 101):
+        window.record(ms / 1000)
+    assert window.quantile(0.5) == 0.050
+    assert window.quantile(0.95) == 0.095
+    assert window.quantile(0.99) == 0.099
+    # The window is bounded; the counters are not
+    window.record(1.0)
+    assert len(window.samples) == 100 and window.count == 101
+    assert window.quantile(0.99) == 0.100
+
+
+def test_metrics_endpoint_reports_every_device(monitor, simulator):
+    async def scenario():
+        sim = simulator.RcpSimulator()
+        _host, rcp_port = await sim.start("127.0.0.1", 0)
+        http, obs, atem = HttpStandIn(), ObsStandIn(password="pw"), AtemStandIn()
+        targets = [
+            target("yamaha-rcp", rcp_port, "yamaha"),
+            target("renewedvision-propresenter-api", await http.start(), "propresenter"),
+            target("obs-studio", await obs.start(), "obs", {"pass": "pw"}),
+            target("bmd-atem", await atem.start(), "atem"),
+            target("generic-tcp", await HttpStandIn().start(), "other"),
+        ]
+        monitored = [(t, monitor.LatencyWindow(50)) for t in targets]
+        metrics = await monitor.serve_metrics(monitored, "127.0.0.1", 0)
+        tasks = [asyncio.ensure_future(monitor.monitor_device(t, w, 0.02, 1.0)) for t, w in monitored]
+        try:
+            await asyncio.sleep(0.3)
+            metrics_port = metrics.sockets[0].getsockname()[1]
+            result = await scrape(metrics_port), await scrape(metrics_port, "/"), await scrape(metrics_port, "/x")
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            metrics.close()
+            await metrics.wait_closed()
+            await sim.close()
+            for server in (http, obs, atem):
+                await server.stop()
+        return result
+
+    (status, body), (_, page), (missing, _) = asyncio.run(scenario())
+    assert status == "HTTP/1.1 200 OK"
+    assert "# TYPE church_device_rtt_seconds summary" in body
+    for conn_id in ("yamaha", "propresenter", "obs", "atem", "other"):
+        assert series(body, "church_device_up", conn_id) == 1
+        assert series(body, "church_device_rtt_seconds_count", conn_id) >= 3
+        for q in (0.5, 0.95, 0.99):
+            assert 0 < series(body, "church_device_rtt_seconds", conn_id, q) < 1
+        assert series(body, "church_device_probe_failures_total", conn_id) == 0
+        assert series(body, "church_device_connects_total", conn_id) == 1
+        assert f"{conn_id} " in page
+    assert missing == "HTTP/1.1 404 Not Found"
+
+
+def test_reconnect_and_backoff(monitor, simulator, monkeypatch):
+    """Down -> backoff doubling up to the cap -> up -> down again."""
+    real_sleep = asyncio.sleep
+    delays = []
+    monkeypatch.setattr(monitor, "MAX_BACKOFF_SECONDS", 8.0)
+
+    async def scenario():
+        sim = simulator.RcpSimulator()
+        _host, port = await sim.start("127.0.0.1", 0)
+        await sim.close()  # nothing listens on the port yet
+        window = monitor.LatencyWindow(10)
+        done = asyncio.get_running_loop().create_future()
+
+        async def fake_sleep(seconds):
+            # Sleeps are recorded, not waited; the device changes state
+            # at fixed points of the schedule
+            delays.append(seconds)
+            if len(delays) == 5:
+                snapshots.append(("down", window.up, window.failures, window.connects))
+                await sim.start("127.0.0.1", port)
+            elif len(delays) == 7:
+                snapshots.append(("up", window.up, window.failures, window.connects))
+                await sim.close()
+            elif len(delays) == 9:
+                done.set_result(None)
+            await real_sleep(0)
+
+        snapshots = []
+        monkeypatch.setattr(monitor.asyncio, "sleep", fake_sleep)
+        task = asyncio.ensure_future(monitor.monitor_device(target("yamaha-rcp", port), window, 1.0, 1.0))
+        try:
+            await asyncio.wait_for(done, 5)
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            monkeypatch.undo()
+        return snapshots, window
+
+    snapshots, window = asyncio.run(scenario())
+    # Refused: interval, then doubling up to MAX_BACKOFF_SECONDS
+    assert delays[:5] == [1.0, 2.0, 4.0, 8.0, 8.0]
+    assert snapshots[0] == ("down", False, 5, 0)
+    # Reconnected: the regular interval again (minus the time the sample took)
+    assert all(0.5 < d <= 1.0 for d in delays[5:7])
+    assert snapshots[1] == ("up", True, 5, 1)
+    # Dropped again: backoff restarts from the interval
+    assert delays[7:9] == [1.0, 2.0]
+    assert window.failures == 7 and window.connects == 1
+    assert window.last_error
@@ -0,0 +1,114 @@
+"""device-probe.py against local listeners and hand-written parameters."""
+
+import asyncio
+import socket
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def probe(load_script):
+    return load_script("device-probe.py")
+
+
+def free_port(kind=socket.SOCK_STREAM):
+    with socket.socket(socket.AF_INET, kind) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class _Echo(asyncio.DatagramProtocol):
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.transport.sendto(data, addr)
+
+
+def test_tcp_open_listener_and_closed_port(probe):
+    async def scenario():
+        server = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            open_result = await probe.tcp_open("127.0.0.1", port, 1.0)
+        finally:
+            server.close()
+            await server.wait_closed()
+        closed_result = await probe.tcp_open("127.0.0.1", free_port(), 1.0)
+        return open_result, closed_result
+
+    open_result, closed_result = asyncio.run(scenario())
+    assert open_result == (True, None)
+    assert closed_result == (False, "connection refused")
+
+
+def test_udp_reply_echo_and_silence(probe):
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        echo, _ = await loop.create_datagram_endpoint(_Echo, local_addr=("127.0.0.1", 0))
+        silent, _ = await loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol, local_addr=("127.0.0.1", 0)
+        )
+        try:
+            answered = await probe.udp_reply(
+                "127.0.0.1", echo.get_extra_info("sockname")[1], probe.ATEM_HELLO, 1.0
+            )
+            unanswered = await probe.udp_reply(
+                "127.0.0.1", silent.get_extra_info("sockname")[1], b"\0", 0.2
+            )
+        finally:
+            echo.close()
+            silent.close()
+        return answered, unanswered
+
+    answered, unanswered = asyncio.run(scenario())
+    assert answered == (True, None)
+    assert unanswered == (False, "no reply")
+
+
+def test_udp_reply_unresolvable_host_is_a_failed_probe(probe):
+    ok, detail = asyncio.run(probe.udp_reply("no-such-host.invalid", 9910, b"\0", 1.0))
+    assert ok is False
+    assert detail
+
+
+def test_invalid_port_is_reported_for_that_device_only(probe, load_script, tmp_path):
+    (tmp_path / "connections.yaml").write_text(
+        "connections:\n"
+        "  - id: obs\n"
+        "    module: obs-studio\n"
+        "    label: OBS\n"
+        "  - id: propresenter\n"
+        "    module: renewedvision-propresenter-api\n"
+        "    label: ProPresenter\n",
+        encoding="utf-8",
+    )
+    tcp_port = free_port()
+    (tmp_path / "parameters.yaml").write_text(
+        "machines:\n"
+        "  pc:\n"
+        "    ip: 127.0.0.1\n"
+        "assignments:\n"
+        "  obs: pc\n"
+        "  propresenter: pc\n"
+        "connection_settings:\n"
+        "  obs:\n"
+        f"    port: {tcp_port}\n"
+        "  propresenter:\n"
+        "    port: abc\n",
+        encoding="utf-8",
+    )
+    conv = load_script("yaml-to-companion.py")
+    hosts, ports = probe.resolve_targets(conv, tmp_path, tmp_path / "parameters.yaml")
+    by_id = {target["conn_id"]: target for target in ports}
+    assert by_id["obs"]["port"] == tcp_port and by_id["obs"]["error"] is None
+    assert "invalid port 'abc'" in by_id["propresenter"]["error"]
+
+    _host_results, port_results = asyncio.run(
+        probe.run_probes(hosts, ports, timeout=1.0, deadline=2.0, do_ping=False)
+    )
+    results = dict(zip((t["conn_id"] for t in ports), port_results))
+    assert results["propresenter"][0] == "fail"
+    assert "invalid port" in results["propresenter"][1]
+    # Nothing listens on the OBS port: an ordinary failed probe
+    assert results["obs"][:2] == ("fail", "connection refused")
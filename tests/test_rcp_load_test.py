@@ -0,0 +1,80 @@
+"""yamaha-simulator.py state handling and the rcp-load-test.py page replay."""
+
+import argparse
+import asyncio
+from pathlib import Path
+
+import pytest
+
+CONFIG_DIR = Path(__file__).resolve().parent.parent / "config"
+
+
+@pytest.fixture(scope="module")
+def simulator(load_script):
+    return load_script("yamaha-simulator.py")
+
+
+@pytest.fixture(scope="module")
+def load_test(load_script):
+    return load_script("rcp-load-test.py")
+
+
+def load_args(**overrides):
+    args = dict(host=None, port=49280, clients=2, rounds=3, timeout=1000.0,
+                latency=0.0, jitter=0.0, drop=0.0, seed=1)
+    args.update(overrides)
+    return argparse.Namespace(**args)
+
+
+def test_simulator_state_and_scenes(simulator):
+    sim = simulator.RcpSimulator()
+    assert sim.handle("get MIXER:Current/InCh/Fader/On 0 0")[0] == "OK get MIXER:Current/InCh/Fader/On 0 0 1"
+    reply, notify = sim.handle("set MIXER:Current/InCh/Fader/On 0 0 0")
+    assert reply == "OK set MIXER:Current/InCh/Fader/On 0 0 0"
+    assert notify == ["set MIXER:Current/InCh/Fader/On 0 0 0"]
+    assert sim.handle("ssupdate_ex scene_a 5")[0] == "OK ssupdate_ex scene_a 5"
+    sim.handle("set MIXER:Current/InCh/Fader/On 0 0 1")
+    reply, notify = sim.handle("ssrecall_ex scene_a 5")
+    assert reply == "OK ssrecall_ex scene_a 5"
+    assert "set MIXER:Current/InCh/Fader/On 0 0 0" in notify
+    assert sim.handle("get MIXER:Current/InCh/Fader/On 0 0")[0].endswith(" 0")
+    # The address the converter uses for scene_recall
+    assert sim.handle("set MIXER:Lib/Bank/Scene/Recall 0 0 5")[0].startswith("OK")
+
+
+@pytest.mark.parametrize("command, error", [
+    ("get MIXER:Current/Matrix/Fader/On 0 0", "ERROR get UnknownAddress"),
+    ("get MIXER:Current/InCh/Fader/On 40 0", "ERROR get InvalidArgument"),
+    ("set MIXER:Current/DCA/Fader/Level 9 0 0", "ERROR set InvalidArgument"),
+    ("ssrecall_ex scene_c 1", "ERROR ssrecall_ex InvalidArgument"),
+    ("bogus", "ERROR bogus UnknownCommand"),
+])
+def test_simulator_errors(simulator, command, error):
+    assert simulator.RcpSimulator().handle(command)[0] == error
+
+
+def test_page_replay_has_no_errors(load_script, load_test):
+    """Every Yamaha address the converter generates for the pages is one
+    the TF1 (as simulated) accepts."""
+    commands, skipped = load_test.page_commands(load_script("yaml-to-companion.py"), CONFIG_DIR)
+    assert commands
+    assert {c.kind for c in commands} >= {"set", "toggle", "ssrecall_ex", "ssupdate_ex"}
+    # recall_inc/recall_dec have no RCP command of their own
+    assert all("recall_" in line for line in skipped)
+
+    stats, elapsed, target = asyncio.run(load_test.run_load_test(load_args(), commands))
+    assert stats.errors == []
+    assert stats.timeouts == 0
+    toggles = sum(c.kind == "toggle" for c in commands)
+    assert stats.exchanges == 2 * 3 * (len(commands) + toggles)
+    result = load_test.report(stats, elapsed, target, load_args(), len(commands))
+    assert result["commands_per_second"] > 0
+    assert result["latency_ms"]["p50"] <= result["latency_ms"]["p99"] <= result["latency_ms"]["max"]
+
+
+def test_dropped_commands_time_out(load_script, load_test):
+    commands, _skipped = load_test.page_commands(load_script("yaml-to-companion.py"), CONFIG_DIR)
+    args = load_args(clients=1, rounds=1, drop=0.2, timeout=50.0)
+    stats, _elapsed, _target = asyncio.run(load_test.run_load_test(args, commands))
+    assert stats.timeouts > 0
+    assert stats.errors == []
@@ -0,0 +1,54 @@
+"""service-orchestrator.py run_command(): output, failures and cleanup."""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def orchestrator(load_script):
+    return load_script("service-orchestrator.py")
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def test_run_command_output_and_failure(orchestrator):
+    out = asyncio.run(orchestrator.run_command([sys.executable, "-c", "print(' ready ')"]))
+    assert out == "ready"
+    with pytest.raises(orchestrator.StepFailed, match="boom"):
+        asyncio.run(orchestrator.run_command(
+            [sys.executable, "-c", "import sys; print('working'); print('boom'); sys.exit(3)"]
+        ))
+    with pytest.raises(orchestrator.StepFailed, match="not available"):
+        asyncio.run(orchestrator.run_command(["no-such-command-xyz"]))
+
+
+@pytest.mark.parametrize("how", ["timeout", "cancel"])
+def test_run_command_kills_child_when_abandoned(orchestrator, tmp_path, how):
+    pid_file = tmp_path / "pid"
+    argv = [sys.executable, "-c",
+            f"import os, time; open({str(pid_file)!r}, 'w').write(str(os.getpid())); time.sleep(30)"]
+
+    async def scenario():
+        if how == "timeout":
+            with pytest.raises(asyncio.TimeoutError):
+                await orchestrator.run_command(argv, timeout=0.5)
+            return
+        task = asyncio.ensure_future(orchestrator.run_command(argv))
+        while not pid_file.exists() or not pid_file.read_text():
+            await asyncio.sleep(0.02)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    assert pid_file.read_text()
+    assert not pid_alive(int(pid_file.read_text()))